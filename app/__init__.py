@@ -1,7 +1,10 @@
 from flask import Flask
 from flask_cors import CORS
+from .logging_config import configure_logging
 
 def create_app():
+    configure_logging()
+    
     app = Flask(__name__)
     CORS(app)  # Enable CORS for all routes
     
@@ -1,15 +1,54 @@
-from flask import Blueprint, request, jsonify
+import time
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from ..services.nl_to_sql_service import NLToSQLConverter
-from ..services.query_service import QueryService
-from ..services.langchain_service import LangChainService
+from ..services.trace_store import TraceStore
+from ..database.registry import DatabaseRegistry, InvalidDatabaseKey
+from ..services.index_advisor import IndexAdvisor
+from ..services.workload_log import WorkloadLog
+from ..services.followup_service import FollowUpService
+from ..database.result_encoding import result_to_json
 
 # Create Blueprint
 api_bp = Blueprint('api', __name__)
 
 # Initialize services
 nl_to_sql_converter = NLToSQLConverter()
-query_service = QueryService()
-langchain_service = LangChainService()  # Add the new service
+database_registry = DatabaseRegistry(nl_to_sql_converter.example_index, TraceStore())  # Routes requests to per-database services
+query_service = database_registry.default.query_service
+langchain_service = database_registry.default.langchain_service  # Add the new service
+workload_log = WorkloadLog()  # Captures served requests for replay
+follow_up_service = FollowUpService(nl_to_sql_converter)  # Answers refinements from the previous result
+
+# Number of rows in a query service result, or None if the query failed
+def _row_count(result):
+    return result["data"].get("row_count") if result.get("data") else None
+
+# JSON response for a query result, with the records DataFrame encoded column by column
+def _query_response(result):
+    return Response(result_to_json(result), mimetype='application/json')
+
+# Resolves the database a request is routed to, from the X-Database header, a "database" field or ?database=
+def _database_target():
+    data = request.get_json(silent=True) or {}
+    key = request.headers.get('X-Database') or data.get('database') or request.args.get('database')
+    return database_registry.get(key)
+
+# Error response for a request routed to an unknown database
+def _unknown_database(error):
+    return jsonify({"status": "error", "message": error.args[0]}), 400 if isinstance(error, InvalidDatabaseKey) else 404
+
+# Streams an approximate result followed by the exact one, as newline-delimited JSON
+def _stream_exact_after(result, query_service, sql_query, extra):
+    def generate():
+        yield result_to_json(result) + "\n"
+        exact = query_service.execute_sql_query(sql_query)
+        exact.update(extra)
+        yield result_to_json(exact) + "\n"
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# True if the client asked for the exact answer after an approximate one that was actually sampled
+def _wants_exact_stream(data, result):
+    return bool(data.get('stream_exact')) and bool(result.get("data")) and "approximate" in result["data"]
 
 # API endpoint that converts natural language to SQL using the converter service
 @api_bp.route('/convert', methods=['POST'])
@@ -19,13 +58,21 @@ def convert_nl_to_sql():
         return jsonify({"status": "error", "message": "No query provided"}), 400
     
     natural_language_query = data['query']
+    try:
+        target = _database_target()
+    except KeyError as e:
+        return _unknown_database(e)
     
     # Convert to SQL
-    sql_query = nl_to_sql_converter.convert_to_sql(natural_language_query)
+    started = time.perf_counter()
+    sql_query = nl_to_sql_converter.convert_to_sql(natural_language_query, target.schema_text)
+    convert_ms = (time.perf_counter() - started) * 1000
     
     if sql_query is None:
+        workload_log.record('/convert', natural_language_query, status="error", database=target.key, convert_ms=convert_ms, total_ms=convert_ms)
         return jsonify({"status": "error", "message": "Failed to convert query"}), 500
     
+    workload_log.record('/convert', natural_language_query, sql_query, "success", database=target.key, convert_ms=convert_ms, total_ms=convert_ms)
     return jsonify({
         "status": "success",
         "sql_query": sql_query
@@ -39,11 +86,21 @@ def execute_sql():
         return jsonify({"status": "error", "message": "No SQL query provided"}), 400
     
     sql_query = data['sql_query']
+    try:
+        target = _database_target()
+    except KeyError as e:
+        return _unknown_database(e)
     
     # Execute SQL query
-    result = query_service.execute_sql_query(sql_query)
+    started = time.perf_counter()
+    result = target.query_service.execute_sql_query(sql_query, bool(data.get('approximate')))
+    execute_ms = (time.perf_counter() - started) * 1000
     
-    return jsonify(result)
+    workload_log.record('/execute', None, sql_query, result["status"], _row_count(result),
+                        database=target.key, execute_ms=execute_ms, total_ms=execute_ms)
+    if _wants_exact_stream(data, result):
+        return _stream_exact_after(result, target.query_service, sql_query, {})
+    return _query_response(result)
 
 # Combination endpoint that converts natural language to SQL and executes it in one step
 @api_bp.route('/query', methods=['POST'])
@@ -53,20 +110,47 @@ def process_natural_language_query():
         return jsonify({"status": "error", "message": "No query provided"}), 400
     
     natural_language_query = data['query']
+    session_id = data.get('session_id')
+    try:
+        target = _database_target()
+    except KeyError as e:
+        return _unknown_database(e)
+    started = time.perf_counter()
+    
+    # Refinements of the previous result in this session are answered locally, without Postgres
+    if session_id:
+        result = follow_up_service.answer(session_id, natural_language_query, data.get('refine'), target.key)
+        if result is not None:
+            total_ms = (time.perf_counter() - started) * 1000
+            result["session_id"] = session_id
+            workload_log.record('/query/follow-up', natural_language_query, None, result["status"], _row_count(result),
+                                database=target.key, total_ms=total_ms)
+            return _query_response(result)
+    else:
+        session_id = follow_up_service.new_session_id()
     
     # Convert to SQL
-    sql_query = nl_to_sql_converter.convert_to_sql(natural_language_query)
+    sql_query = nl_to_sql_converter.convert_to_sql(natural_language_query, target.schema_text)
+    convert_ms = (time.perf_counter() - started) * 1000
     
     if sql_query is None:
+        workload_log.record('/query', natural_language_query, status="error", database=target.key, convert_ms=convert_ms, total_ms=convert_ms)
         return jsonify({"status": "error", "message": "Failed to convert query"}), 500
     
     # Execute SQL query
-    result = query_service.execute_sql_query(sql_query)
+    result = target.query_service.execute_sql_query(sql_query, bool(data.get('approximate')))
+    total_ms = (time.perf_counter() - started) * 1000
+    follow_up_service.remember(session_id, natural_language_query, sql_query, result, target.key)
     
-    # Add the SQL query to the result
+    # Add the SQL query and session to the result
     result["sql_query"] = sql_query
+    result["session_id"] = session_id
     
-    return jsonify(result)
+    workload_log.record('/query', natural_language_query, sql_query, result["status"], _row_count(result),
+                        database=target.key, convert_ms=convert_ms, execute_ms=total_ms - convert_ms, total_ms=total_ms)
+    if _wants_exact_stream(data, result):
+        return _stream_exact_after(result, target.query_service, sql_query, {"sql_query": sql_query, "session_id": session_id})
+    return _query_response(result)
 
 # Uses LangChain's direct query method for simpler natural language database queries
 @api_bp.route('/langchain/direct', methods=['POST'])
@@ -76,10 +160,14 @@ def langchain_direct_query():
         return jsonify({"status": "error", "message": "No query provided"}), 400
     
     natural_language_query = data['query']
+    try:
+        target = _database_target()
+    except KeyError as e:
+        return _unknown_database(e)
     
     try:
         # Use direct query method from LangChain service
-        result = langchain_service.direct_query(natural_language_query)
+        result = target.langchain_service.direct_database_query(natural_language_query)
         return jsonify({
             "status": "success",
             "result": result
@@ -98,10 +186,14 @@ def langchain_agent_query():
         return jsonify({"status": "error", "message": "No query provided"}), 400
     
     natural_language_query = data['query']
+    try:
+        target = _database_target()
+    except KeyError as e:
+        return _unknown_database(e)
     
     try:
         # Use agent-based query method from LangChain service
-        result = langchain_service.agent_query(natural_language_query)
+        result = target.langchain_service.query_with_agent(natural_language_query)
         return jsonify({
             "status": "success",
             "result": result
@@ -110,4 +202,174 @@ def langchain_agent_query():
         return jsonify({
             "status": "error", 
             "message": f"Failed to process query: {str(e)}"
-        }), 500
\ No newline at end of file
+        }), 500
+
+# Returns the recorded steps of an agent run, referenced by the trace_id in agent responses
+# (the agents of every database share one trace store, so no database key is needed)
+@api_bp.route('/traces/<trace_id>', methods=['GET'])
+def get_agent_trace(trace_id):
+    trace = database_registry.trace_store.get(trace_id)
+    if trace is None:
+        return jsonify({"status": "error", "message": "Trace not found"}), 404
+    
+    return jsonify({
+        "status": "success",
+        "data": trace
+    })
+
+# Recommends indexes for the SQL statements executed so far by the query service
+@api_bp.route('/index-advisor', methods=['GET'])
+def index_advisor():
+    top_n = request.args.get('top', default=10, type=int)
+    try:
+        target = _database_target()
+    except KeyError as e:
+        return _unknown_database(e)
+    if target.connection.embedded:
+        return jsonify({"status": "error", "message": "The index advisor needs a PostgreSQL database"}), 400
+    
+    try:
+        advisor = IndexAdvisor(target.connection)
+        advice = advisor.recommend(target.query_service.statement_collector.statements(), top_n)
+        return jsonify({
+            "status": "success",
+            "data": advice
+        })
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Failed to compute index recommendations: {str(e)}"
+        }), 500
+
+# Registers a recurring dashboard query whose result is kept up to date incrementally
+@api_bp.route('/registered-queries', methods=['POST'])
+def register_query():
+    data = request.json
+    if not data or 'name' not in data or 'sql_query' not in data:
+        return jsonify({"status": "error", "message": "A name and sql_query are required"}), 400
+    try:
+        target = _database_target()
+    except KeyError as e:
+        return _unknown_database(e)
+    
+    result = target.registered_query_service.register(data['name'], data['sql_query'], data.get('watermark_column'))
+    return jsonify(result), 200 if result["status"] == "success" else 400
+
+# Lists the registered queries with their refresh mode and watermark
+@api_bp.route('/registered-queries', methods=['GET'])
+def list_registered_queries():
+    try:
+        target = _database_target()
+    except KeyError as e:
+        return _unknown_database(e)
+    
+    try:
+        return jsonify({
+            "status": "success",
+            "data": target.registered_query_service.list()
+        })
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Failed to list registered queries: {str(e)}"
+        }), 500
+
+# Returns the stored result of a registered query, refreshing it first with ?refresh=true
+@api_bp.route('/registered-queries/<name>', methods=['GET'])
+def get_registered_query(name):
+    try:
+        target = _database_target()
+    except KeyError as e:
+        return _unknown_database(e)
+    
+    if request.args.get('refresh', 'false').lower() == 'true':
+        result = target.registered_query_service.refresh(name)
+    else:
+        result = target.registered_query_service.get(name)
+    return jsonify(result), 200 if result["status"] == "success" else 404
+
+# Folds rows added since the last refresh into a registered query ({"full": true} recomputes it)
+@api_bp.route('/registered-queries/<name>/refresh', methods=['POST'])
+def refresh_registered_query(name):
+    data = request.json or {}
+    try:
+        target = _database_target()
+    except KeyError as e:
+        return _unknown_database(e)
+    
+    result = target.registered_query_service.refresh(name, bool(data.get('full', False)))
+    return jsonify(result), 200 if result["status"] == "success" else 404
+
+# Removes a registered query
+@api_bp.route('/registered-queries/<name>', methods=['DELETE'])
+def drop_registered_query(name):
+    try:
+        target = _database_target()
+    except KeyError as e:
+        return _unknown_database(e)
+    
+    if not target.registered_query_service.drop(name):
+        return jsonify({"status": "error", "message": "Registered query not found"}), 404
+    return jsonify({"status": "success"})
+
+# Lists the verified question/SQL examples used in prompts
+@api_bp.route('/examples', methods=['GET'])
+def list_examples():
+    return jsonify({
+        "status": "success",
+        "data": nl_to_sql_converter.example_index.list()
+    })
+
+# Adds a verified question/SQL pair to the example index
+@api_bp.route('/examples', methods=['POST'])
+def add_example():
+    data = request.json
+    if not data or 'question' not in data or 'sql_query' not in data:
+        return jsonify({"status": "error", "message": "A question and sql_query are required"}), 400
+    
+    example = nl_to_sql_converter.example_index.add(data['question'], data['sql_query'])
+    return jsonify({
+        "status": "success",
+        "data": example
+    })
+
+# Returns the examples that would be put into the prompt for a question
+@api_bp.route('/examples/search', methods=['GET'])
+def search_examples():
+    question = request.args.get('q')
+    if not question:
+        return jsonify({"status": "error", "message": "No question provided"}), 400
+    
+    top_k = request.args.get('top', default=3, type=int)
+    return jsonify({
+        "status": "success",
+        "data": nl_to_sql_converter.example_index.search(question, top_k)
+    })
+
+# Corrects the question or SQL of an example
+@api_bp.route('/examples/<example_id>', methods=['PUT'])
+def update_example(example_id):
+    data = request.json or {}
+    example = nl_to_sql_converter.example_index.update(example_id, data.get('question'), data.get('sql_query'))
+    if example is None:
+        return jsonify({"status": "error", "message": "Example not found"}), 404
+    
+    return jsonify({
+        "status": "success",
+        "data": example
+    })
+
+# Removes an example from the index
+@api_bp.route('/examples/<example_id>', methods=['DELETE'])
+def delete_example(example_id):
+    if not nl_to_sql_converter.example_index.remove(example_id):
+        return jsonify({"status": "error", "message": "Example not found"}), 404
+    return jsonify({"status": "success"})
+
+# Lists the databases requests can be routed to and the ones currently open
+@api_bp.route('/databases', methods=['GET'])
+def list_databases():
+    return jsonify({
+        "status": "success",
+        "data": database_registry.status()
+    })
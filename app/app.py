@@ -1,28 +1,22 @@
 import logging
 import traceback
 from flask import Flask, request, jsonify
-from app.services.langchain_service import LangchainService
+from app.services.langchain_service import LangChainService
 from app.services.nl_to_sql_service import NLToSQLConverter
+from app.logging_config import configure_logging, summarize
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("debug.log"),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging (queue-based, see app/logging_config.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
 
-# Initialize the LangchainService and NLToSQLConverter instances
-langchain_service = LangchainService()
+# Initialize the LangChainService and NLToSQLConverter instances
+langchain_service = LangChainService()
 nl_to_sql_converter = NLToSQLConverter()
 
-# API endpoint that processes natural language queries using the LangchainService agent
+# API endpoint that processes natural language queries using the LangChainService agent
 @app.route('/api/convert_query', methods=['POST'])
 def convert_query():
     try:
@@ -36,20 +30,20 @@ def convert_query():
             return jsonify({"status": "error", "message": "No data provided"}), 400
             
         query = data.get('query')
-        logger.debug(f"Received query: {query}")
+        logger.debug("Received query: %s", summarize(query))
         
         # Check if the query is valid
         if not query:
             logger.error("No query provided in request data")
             return jsonify({"status": "error", "message": "No query provided"}), 400
         
-        # Process the query using LangchainService
-        logger.debug("Processing query with LangchainService")
+        # Process the query using LangChainService
+        logger.debug("Processing query with LangChainService")
         result = langchain_service.query_with_agent(query)
-        logger.debug(f"Result: {result}")
+        logger.debug("Result: %s", summarize(result))
         
         if result.get("status") == "error":
-            logger.error(f"Error in query processing: {result.get('message')}")
+            logger.error("Error in query processing: %s", result.get('message'))
             return jsonify(result), 500
             
         return jsonify(result)
@@ -57,7 +51,7 @@ def convert_query():
     except Exception as e:
         # Log the full exception traceback
         error_traceback = traceback.format_exc()
-        logger.error(f"Error processing query: {str(e)}\n{error_traceback}")
+        logger.error("Error processing query: %s\n%s", e, error_traceback)
         
         # Return a more detailed error response
         return jsonify({
@@ -95,13 +89,13 @@ def get_tables():
     try:
         logger.debug("Received request to /api/get_tables")
         
-        tables = langchain_service.get_tables()
-        logger.debug(f"Retrieved tables: {tables}")
+        tables = langchain_service.db_connection.get_all_tables()
+        logger.debug("Retrieved tables: %s", summarize(tables))
         
         return jsonify({"status": "success", "tables": tables})
     except Exception as e:
         error_traceback = traceback.format_exc()
-        logger.error(f"Error retrieving tables: {str(e)}\n{error_traceback}")
+        logger.error("Error retrieving tables: %s\n%s", e, error_traceback)
         
         return jsonify({
             "status": "error",
@@ -110,5 +104,14 @@ def get_tables():
             "traceback": error_traceback
         }), 500
 
+# API endpoint that returns the recorded steps of an agent run by its trace id
+@app.route('/api/traces/<trace_id>', methods=['GET'])
+def get_trace(trace_id):
+    trace = langchain_service.trace_store.get(trace_id)
+    if trace is None:
+        return jsonify({"status": "error", "message": "Trace not found"}), 404
+    
+    return jsonify({"status": "success", "data": trace})
+
 if __name__ == '__main__':
     app.run(debug=True)
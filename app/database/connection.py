@@ -1,7 +1,14 @@
 import os
+import weakref
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, inspect, text
 from dotenv import load_dotenv
+try:
+    from app.database.result_encoding import TYPECAST_OPTION, register_typecasters, build_dataframe, build_dataframe_from_values
+    from app.database.dialect import EMBEDDED_DIALECTS, transpile
+except ImportError:  # Run as a script from this directory (test_connection.py)
+    from result_encoding import TYPECAST_OPTION, register_typecasters, build_dataframe, build_dataframe_from_values
+    from dialect import EMBEDDED_DIALECTS, transpile
 
 # Load environment variables
 load_dotenv()
@@ -16,17 +23,88 @@ DB_NAME = os.getenv("DB_NAME")
 # Create database connection string
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# In-process database used instead of PostgreSQL, e.g. duckdb:///bikestores.duckdb or sqlite:///bikestores.sqlite
+EMBEDDED_DATABASE_URL = os.getenv("EMBEDDED_DATABASE_URL", "")
+if EMBEDDED_DATABASE_URL:
+    DATABASE_URL = EMBEDDED_DATABASE_URL
+
+# Load the BikeStores CSV files into an embedded database that does not have the tables yet
+EMBEDDED_AUTOLOAD = os.getenv("EMBEDDED_AUTOLOAD", "true").lower() == "true"
+
+# Engines created in this process; a forked worker must not reuse their pooled connections
+_engines = weakref.WeakSet()
+
+
+# Tracks an engine so a forked worker process starts with an empty connection pool
+def dispose_after_fork(engine):
+    _engines.add(engine)
+    return engine
+
+
+def _reset_pools_in_child():
+    for engine in list(_engines):
+        # close=False leaves the parent's sockets alone; the child just forgets them
+        engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pools_in_child)
+
 class DatabaseConnection:
-    def __init__(self):
-        self.engine = create_engine(DATABASE_URL)
+    def __init__(self, database_url=None):
+        self.database_url = database_url or DATABASE_URL
+        self.engine = dispose_after_fork(create_engine(self.database_url))
+        self.dialect = self.engine.dialect.name
+        
+        # DuckDB and SQLite run in-process; generated PostgreSQL is translated before it reaches them
+        self.embedded = self.dialect in EMBEDDED_DIALECTS
+        self._date_columns = None
+        if self.embedded:
+            if EMBEDDED_AUTOLOAD:
+                self._load_dataset()
+        else:
+            register_typecasters(self.engine)
+    
+    # Fills an empty embedded database from the BikeStores CSV files
+    def _load_dataset(self):
+        from .embedded import has_dataset, load_dataset
+        try:
+            if not has_dataset(self.engine):
+                load_dataset(self.engine)
+        except Exception as e:
+            print(f"Error loading BikeStores dataset into {self.dialect}: {e}")
+    
+    # Rewrites a PostgreSQL query for this database's dialect
+    def transpile(self, query):
+        if self.dialect == "sqlite":
+            return transpile(query, self.dialect, self.date_columns)
+        return transpile(query, self.dialect)
+    
+    # Names of the DATE/TIMESTAMP columns, which SQLite stores as text and cannot subtract directly
+    @property
+    def date_columns(self):
+        if self._date_columns is None:
+            # Reading the schema runs queries through transpile(), which must not recurse into this property
+            self._date_columns = frozenset()
+            names = set()
+            for table in self.get_all_tables():
+                schema = self.get_table_schema(table)
+                if schema is not None and not schema.empty:
+                    types = schema["data_type"].astype(str).str.upper()
+                    names.update(schema.loc[types.str.startswith(("DATE", "TIMESTAMP")), "column_name"])
+            self._date_columns = frozenset(names)
+        return self._date_columns
     
     # Executes a SQL query against the database and returns results as a pandas DataFrame
     def execute_query(self, query):
         try:
             with self.engine.connect() as connection:
-                result = connection.execute(text(query))
+                result = connection.execute(text(self.transpile(query)).execution_options(**{TYPECAST_OPTION: True}))
                 if result.returns_rows:
-                    return pd.DataFrame(result.fetchall(), columns=result.keys())
+                    if self.embedded:
+                        return build_dataframe_from_values(list(result.keys()), result.fetchall())
+                    type_codes = [column[1] for column in result.cursor.description]
+                    return build_dataframe(list(result.keys()), type_codes, result.fetchall())
                 return pd.DataFrame()
         except Exception as e:
             print(f"Error executing query: {e}")
@@ -35,6 +113,12 @@ class DatabaseConnection:
 
     # Retrieves column names, data types, and nullable status for a specified table
     def get_table_schema(self, table_name):
+        if self.embedded:
+            # DuckDB and SQLite both describe a table's columns through pragma_table_info
+            return self.execute_query(f"""
+            SELECT name AS column_name, type AS data_type, CASE WHEN "notnull" THEN 'NO' ELSE 'YES' END AS is_nullable
+            FROM pragma_table_info('{table_name}')
+            """)
         query = f"""
         SELECT column_name, data_type, is_nullable
         FROM information_schema.columns
@@ -44,6 +128,8 @@ class DatabaseConnection:
     
     # Returns a list of all table names in the public schema of the database
     def get_all_tables(self):
+        if self.embedded:
+            return inspect(self.engine).get_table_names()
         query = """
         SELECT table_name
         FROM information_schema.tables
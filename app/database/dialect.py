@@ -0,0 +1,145 @@
+import os
+from functools import lru_cache
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Number of distinct statements whose translation is kept, so repeated questions are parsed once
+TRANSPILE_CACHE_SIZE = int(os.getenv("TRANSPILE_CACHE_SIZE", "512"))
+
+# Dialect the prompts ask the LLM to write
+SOURCE_DIALECT = "postgres"
+
+# Embedded engines queries can be translated for, by SQLAlchemy dialect name -> sqlglot dialect name
+EMBEDDED_DIALECTS = {
+    "duckdb": "duckdb",
+    "sqlite": "sqlite",
+}
+
+# STRFTIME formats for the EXTRACT/DATE_PART fields SQLite has no function for
+SQLITE_DATE_PARTS = {
+    "year": "%Y",
+    "month": "%m",
+    "day": "%d",
+    "hour": "%H",
+    "minute": "%M",
+    "second": "%S",
+    "dow": "%w",
+    "doy": "%j",
+    "week": "%W",
+    "epoch": "%s",
+}
+
+
+class UnsupportedDialectFeature(ValueError):
+    """Raised when a query uses PostgreSQL syntax the target engine would silently get wrong."""
+
+
+# Rewrites a PostgreSQL statement for the engine it will run on
+def transpile(sql_query, dialect, date_columns=frozenset()):
+    """
+    Translate generated PostgreSQL into the dialect of an embedded engine.
+
+    Functions and syntax with an equivalent (AGE, DATE_PART, ::casts,
+    ILIKE, TO_CHAR, STRING_AGG, ...) are rewritten; anything sqlglot
+    cannot parse is passed through unchanged so the engine reports the error.
+
+    SQLite stores dates as text, so subtracting two dates is rewritten to a
+    JULIANDAY difference in days. Other date arithmetic (adding days or
+    intervals) is rejected because SQLite would return a wrong number
+    instead of an error.
+
+    Args:
+        sql_query (str): The SQL query in PostgreSQL syntax
+        dialect (str): SQLAlchemy dialect name of the target engine
+        date_columns (frozenset): Names of DATE/TIMESTAMP columns, used to
+            recognise date arithmetic for SQLite (optional)
+
+    Returns:
+        str: The query for the target engine (unchanged for PostgreSQL)
+
+    Raises:
+        UnsupportedDialectFeature: If the query uses date arithmetic SQLite cannot express
+    """
+    if dialect not in EMBEDDED_DIALECTS:
+        return sql_query
+    return _transpile(sql_query, EMBEDDED_DIALECTS[dialect], frozenset(date_columns) if dialect == "sqlite" else frozenset())
+
+
+@lru_cache(maxsize=TRANSPILE_CACHE_SIZE)
+def _transpile(sql_query, target, date_columns):
+    import sqlglot
+
+    try:
+        statements = sqlglot.parse(sql_query, read=SOURCE_DIALECT)
+        if target == "sqlite":
+            statements = [
+                statement.transform(_sqlite_dates, date_columns) for statement in statements if statement is not None
+            ]
+        return ";\n".join(statement.sql(dialect=target) for statement in statements if statement is not None)
+    except sqlglot.errors.SqlglotError as e:
+        print(f"Error transpiling query to {target}: {e}")
+        return sql_query
+
+
+# Rewrites the date handling SQLite lacks: EXTRACT, date differences and timestamp casts
+def _sqlite_dates(node, date_columns):
+    from sqlglot import exp
+
+    if isinstance(node, exp.Extract):
+        field = node.this.name.lower()
+        operand = node.expression.unnest()
+        if _is_date_difference(operand, date_columns):
+            # EXTRACT(DAY FROM a - b) is the whole number of days between them
+            if field != "day":
+                raise UnsupportedDialectFeature(f"EXTRACT({field.upper()} FROM a date difference) is not supported on SQLite")
+            return _sqlite_days_between(operand, date_columns)
+        date_format = SQLITE_DATE_PARTS.get(field)
+        if date_format is None:
+            return node
+        return exp.cast(
+            exp.Anonymous(this="STRFTIME", expressions=[exp.Literal.string(date_format), _sqlite_dates(operand, date_columns)]),
+            "INTEGER",
+        )
+
+    if isinstance(node, exp.Sub) and _is_date_difference(node, date_columns):
+        return _sqlite_days_between(node, date_columns)
+
+    if isinstance(node, (exp.Add, exp.Sub)) and (
+        _is_date(node.this, date_columns) or _is_date(node.expression, date_columns)
+    ):
+        raise UnsupportedDialectFeature("adding days or intervals to a date is not supported on SQLite")
+
+    # CAST(x AS TIMESTAMP) would give x numeric affinity in SQLite and turn '2016-01-01' into 2016
+    if isinstance(node, exp.Cast) and node.to.is_type("timestamp", "timestamptz", "datetime"):
+        return exp.Anonymous(this="DATETIME", expressions=[_sqlite_dates(node.this, date_columns)])
+    return node
+
+
+def _is_date_difference(node, date_columns):
+    from sqlglot import exp
+
+    return isinstance(node, exp.Sub) and _is_date(node.this, date_columns) and _is_date(node.expression, date_columns)
+
+
+def _sqlite_days_between(node, date_columns):
+    from sqlglot import exp
+
+    later, earlier = (
+        exp.Anonymous(this="JULIANDAY", expressions=[_sqlite_dates(side, date_columns)])
+        for side in (node.this, node.expression)
+    )
+    return exp.cast(exp.Paren(this=exp.Sub(this=later, expression=earlier)), "INTEGER")
+
+
+# True for expressions PostgreSQL types as a date or timestamp
+def _is_date(node, date_columns):
+    from sqlglot import exp
+
+    node = node.unnest()
+    if isinstance(node, exp.Column):
+        return node.name in date_columns
+    if isinstance(node, exp.Cast):
+        return node.to.is_type("date", "timestamp", "timestamptz", "datetime")
+    return isinstance(node, (exp.CurrentDate, exp.CurrentTimestamp, exp.TsOrDsToDate, exp.StrToDate))
@@ -0,0 +1,101 @@
+import os
+import re
+import csv
+import time
+import argparse
+from sqlalchemy import create_engine, inspect, text
+from .dialect import transpile
+from .loader import CSV_DIR, parse_schema
+
+# Rows sent per INSERT batch when the engine has no native CSV reader
+INSERT_BATCH_SIZE = 5000
+
+
+# True if every BikeStores table already exists in the embedded database
+def has_dataset(engine, tables=None):
+    tables = tables or parse_schema()
+    existing = set(inspect(engine).get_table_names())
+    return all(table["name"] in existing for table in tables)
+
+
+# Creates the BikeStores tables in DuckDB or SQLite and fills them from the CSV files
+def load_dataset(engine, csv_dir=CSV_DIR, drop_existing=False):
+    """
+    Load the BikeStores CSV files into an embedded database.
+
+    The PostgreSQL table definitions are translated to the engine's dialect.
+    Primary keys and unique constraints are kept; foreign keys are left out
+    because DuckDB does not support their ON DELETE/ON UPDATE actions.
+
+    Args:
+        engine: SQLAlchemy engine of the DuckDB or SQLite database
+        csv_dir (str): Directory containing the BikeStores CSV files
+        drop_existing (bool): Drop the tables first if they already exist
+
+    Returns:
+        list: Per-table load statistics (table, rows, seconds)
+    """
+    dialect = engine.dialect.name
+    tables = parse_schema()
+    stats = []
+    with engine.begin() as connection:
+        for table in tables:
+            if drop_existing:
+                connection.execute(text(f"DROP TABLE IF EXISTS {table['name']}"))
+            definitions = [re.sub(r"\bserial\b", "int8", column, flags=re.IGNORECASE) for column in table["columns"]]
+            if table["primary_key"]:
+                definitions.append(f"PRIMARY KEY {table['primary_key']}")
+            definitions += [f"UNIQUE {columns}" for columns in table["unique"]]
+            connection.execute(text(transpile(f"CREATE TABLE {table['name']} ({', '.join(definitions)})", dialect)))
+
+        for table in tables:
+            path = os.path.abspath(os.path.join(csv_dir, f"{table['name']}.csv"))
+            start = time.perf_counter()
+            if dialect == "duckdb":
+                # DuckDB parses the file itself, far faster than binding rows one by one
+                connection.execute(
+                    text(f"INSERT INTO {table['name']} BY NAME SELECT * FROM read_csv(:path, header = true, nullstr = ['', 'NULL'])"),
+                    {"path": path},
+                )
+            else:
+                _insert_csv(connection, table["name"], path)
+            # DuckDB reports -1 as the rowcount of INSERT ... SELECT, so the table is counted instead
+            rows = connection.execute(text(f"SELECT COUNT(*) FROM {table['name']}")).scalar()
+            stats.append({"table": table["name"], "rows": rows, "seconds": round(time.perf_counter() - start, 3)})
+    return stats
+
+
+# Inserts a CSV file in batches of bound rows, with empty fields and NULL as SQL NULL
+def _insert_csv(connection, table_name, path):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        statement = text(
+            f"INSERT INTO {table_name} ({', '.join(header)}) VALUES ({', '.join(f':{column}' for column in header)})"
+        )
+        batch = []
+        for row in reader:
+            batch.append({column: None if value in ("", "NULL") else value for column, value in zip(header, row)})
+            if len(batch) >= INSERT_BATCH_SIZE:
+                connection.execute(statement, batch)
+                batch = []
+        if batch:
+            connection.execute(statement, batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the BikeStores dataset into an embedded DuckDB or SQLite database")
+    parser.add_argument("database_url", help="e.g. duckdb:///bikestores.duckdb or sqlite:///bikestores.sqlite")
+    parser.add_argument("--drop", action="store_true", help="Drop existing BikeStores tables before loading")
+    parser.add_argument("--csv-dir", default=CSV_DIR, help="Directory containing the BikeStores CSV files")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    started = time.perf_counter()
+    results = load_dataset(engine, csv_dir=args.csv_dir, drop_existing=args.drop)
+    engine.dispose()
+
+    print(f"{'table':<25}{'rows':>12}{'seconds':>10}")
+    for result in results:
+        print(f"{result['table']:<25}{result['rows']:>12}{result['seconds']:>10}")
+    print(f"Total time: {time.perf_counter() - started:.2f}s")
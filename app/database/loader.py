@@ -0,0 +1,296 @@
+import io
+import os
+import re
+import csv
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from app.database.connection import DatabaseConnection
+
+# Location of the BikeStores schema script and CSV files
+DATASET_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "dataset_resources")
+SCHEMA_FILE = os.path.join(DATASET_DIR, "sqlcreatetables.sql")
+CSV_DIR = os.path.join(DATASET_DIR, "BikeStores dataset")
+
+# Tables that are replicated when the dataset is synthetically scaled, with the key columns shifted per copy
+SCALED_TABLES = {
+    "sales_orders": ["order_id"],
+    "sales_order_items": ["order_id"],
+}
+
+# Bytes handed to COPY per read from a scaled CSV stream
+STREAM_CHUNK_SIZE = 1 << 20
+
+
+# Reads sqlcreatetables.sql and separates table definitions from their keys and constraints
+def parse_schema(schema_file=SCHEMA_FILE):
+    """
+    Parse the CREATE TABLE statements of the schema script.
+
+    Primary keys, unique constraints and foreign keys are split out of the
+    table definitions so they can be created after the data is loaded.
+
+    Args:
+        schema_file (str): Path to the schema script
+
+    Returns:
+        list: One dict per table with "name", "columns" (column definitions
+        without constraints), "primary_key", "unique" and "foreign_keys"
+    """
+    with open(schema_file, encoding="utf-8") as f:
+        script = re.sub(r"--[^\n]*", "", f.read())
+
+    tables = []
+    for statement in script.split(";"):
+        match = re.match(r"\s*CREATE TABLE\s+(\w+)\s*\((.*)\)\s*$", statement, re.IGNORECASE | re.DOTALL)
+        if not match:
+            continue
+        table = {"name": match.group(1), "columns": [], "primary_key": None, "unique": [], "foreign_keys": []}
+
+        for element in _split_definitions(match.group(2)):
+            upper = element.upper()
+            if upper.startswith("FOREIGN KEY"):
+                table["foreign_keys"].append(element)
+            elif upper.startswith("PRIMARY KEY"):
+                table["primary_key"] = element[len("PRIMARY KEY"):].strip()
+            else:
+                column = element.split()[0]
+                if re.search(r"\bPRIMARY KEY\b", upper):
+                    table["primary_key"] = f"({column})"
+                    element = re.sub(r"\s+PRIMARY KEY\b", "", element, flags=re.IGNORECASE)
+                if re.search(r"\bUNIQUE\b", upper):
+                    table["unique"].append(f"({column})")
+                    element = re.sub(r"\s+UNIQUE\b", "", element, flags=re.IGNORECASE)
+                table["columns"].append(element)
+        tables.append(table)
+    return tables
+
+
+# Splits the body of a CREATE TABLE statement on commas outside parentheses
+def _split_definitions(body):
+    elements = []
+    depth = 0
+    current = ""
+    for ch in body:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            elements.append(" ".join(current.split()))
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        elements.append(" ".join(current.split()))
+    return elements
+
+
+class ScaledCsvStream(io.RawIOBase):
+    """
+    File-like object that streams a CSV file ``scale`` times for COPY,
+    shifting key columns by ``key_span`` on each copy so the replicated
+    rows stay unique and keep referring to each other.
+    """
+
+    def __init__(self, path, scale, key_columns, key_span):
+        self.path = path
+        self.scale = scale
+        self.key_columns = key_columns
+        self.key_span = key_span
+        self._rows = self._generate()
+        self._buffer = b""
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def _generate(self):
+        for copy_index in range(self.scale):
+            offset = copy_index * self.key_span
+            with open(self.path, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                header = next(reader)
+                positions = [header.index(column) for column in self.key_columns]
+                out = io.StringIO()
+                writer = csv.writer(out, lineterminator="\n")
+                for row in reader:
+                    for position in positions:
+                        row[position] = str(int(row[position]) + offset)
+                    writer.writerow(row)
+                    if out.tell() >= STREAM_CHUNK_SIZE:
+                        yield out.getvalue().encode("utf-8")
+                        out.seek(0)
+                        out.truncate()
+                if out.tell():
+                    yield out.getvalue().encode("utf-8")
+
+    def read(self, size=-1):
+        if self._position >= len(self._buffer):
+            self._buffer = next(self._rows, b"")
+            self._position = 0
+        end = len(self._buffer) if size < 0 else self._position + size
+        data = self._buffer[self._position:end]
+        self._position += len(data)
+        return data
+
+
+class BulkLoader:
+    def __init__(self, csv_dir=CSV_DIR, schema_file=SCHEMA_FILE, scale=1, workers=4):
+        self.db_connection = DatabaseConnection()
+        self.csv_dir = csv_dir
+        self.tables = parse_schema(schema_file)
+        self.scale = scale
+        self.workers = workers
+
+    # Runs a list of statements in one transaction on a fresh raw connection
+    def _execute(self, statements):
+        connection = self.db_connection.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for statement in statements:
+                cursor.execute(statement)
+            connection.commit()
+        finally:
+            connection.close()
+
+    # Creates the tables without keys or constraints so COPY does not maintain indexes row by row
+    def create_tables(self, drop_existing=False):
+        statements = []
+        if drop_existing:
+            statements += [f"DROP TABLE IF EXISTS {table['name']} CASCADE" for table in reversed(self.tables)]
+        statements += [
+            f"CREATE TABLE {table['name']} ({', '.join(table['columns'])})"
+            for table in self.tables
+        ]
+        self._execute(statements)
+
+    # Streams one CSV file into its table with COPY FROM STDIN
+    def copy_table(self, table, key_span):
+        """
+        Load one table from its CSV file.
+
+        Args:
+            table (dict): Table definition from parse_schema()
+            key_span (int): Offset applied to key columns for each scaled copy
+
+        Returns:
+            dict: Table name, rows loaded, elapsed seconds and rows per second
+        """
+        path = os.path.join(self.csv_dir, f"{table['name']}.csv")
+        with open(path, encoding="utf-8") as f:
+            header = f.readline().strip()
+
+        connection = self.db_connection.engine.raw_connection()
+        start = time.perf_counter()
+        try:
+            cursor = connection.cursor()
+            if self.scale > 1 and table["name"] in SCALED_TABLES:
+                stream = ScaledCsvStream(path, self.scale, SCALED_TABLES[table["name"]], key_span)
+                cursor.copy_expert(f"COPY {table['name']} ({header}) FROM STDIN WITH (FORMAT csv)", stream, size=STREAM_CHUNK_SIZE)
+            else:
+                with open(path, "rb") as stream:
+                    cursor.copy_expert(
+                        f"COPY {table['name']} ({header}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+                        stream,
+                        size=STREAM_CHUNK_SIZE,
+                    )
+            rows = cursor.rowcount
+            connection.commit()
+        finally:
+            connection.close()
+
+        elapsed = time.perf_counter() - start
+        return {
+            "table": table["name"],
+            "rows": rows,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed) if elapsed > 0 else rows,
+        }
+
+    # Adds primary keys and unique constraints per table in parallel, then foreign keys
+    def create_constraints(self):
+        key_statements = []
+        for table in self.tables:
+            statements = [f"ALTER TABLE {table['name']} ADD UNIQUE {columns}" for columns in table["unique"]]
+            if table["primary_key"]:
+                statements.insert(0, f"ALTER TABLE {table['name']} ADD PRIMARY KEY {table['primary_key']}")
+            key_statements.append(statements)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(self._execute, key_statements))
+
+        # Foreign keys lock both tables, so they are added one at a time
+        self._execute([
+            f"ALTER TABLE {table['name']} ADD {foreign_key}"
+            for table in self.tables
+            for foreign_key in table["foreign_keys"]
+        ])
+
+    # Moves serial sequences past the loaded ids so later inserts do not collide
+    def reset_sequences(self):
+        statements = []
+        for table in self.tables:
+            for column in table["columns"]:
+                name, column_type = column.split()[:2]
+                if column_type.lower() == "serial":
+                    statements.append(
+                        f"SELECT setval(pg_get_serial_sequence('{table['name']}', '{name}'), "
+                        f"COALESCE((SELECT MAX({name}) FROM {table['name']}), 0) + 1, false)"
+                    )
+        self._execute(statements)
+
+    # Refreshes planner statistics for every loaded table
+    def analyze(self):
+        connection = self.db_connection.engine.raw_connection()
+        try:
+            connection.autocommit = True
+            cursor = connection.cursor()
+            for table in self.tables:
+                cursor.execute(f"ANALYZE {table['name']}")
+        finally:
+            connection.close()
+
+    # Largest value of the scaled key columns, used to offset each synthetic copy
+    def _key_span(self):
+        path = os.path.join(self.csv_dir, "sales_orders.csv")
+        with open(path, newline="", encoding="utf-8") as f:
+            return max(int(row["order_id"]) for row in csv.DictReader(f))
+
+    def load(self, drop_existing=False):
+        """
+        Create the BikeStores tables and bulk load every CSV file.
+
+        Args:
+            drop_existing (bool): Drop the tables first if they already exist
+
+        Returns:
+            list: Per-table load statistics from copy_table()
+        """
+        self.create_tables(drop_existing)
+
+        key_span = self._key_span()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            stats = list(pool.map(lambda table: self.copy_table(table, key_span), self.tables))
+
+        self.create_constraints()
+        self.reset_sequences()
+        self.analyze()
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the BikeStores tables and bulk load the CSV dataset")
+    parser.add_argument("--scale", type=int, default=1, help="Replicate orders and order items N times for load testing")
+    parser.add_argument("--workers", type=int, default=4, help="Number of tables loaded in parallel")
+    parser.add_argument("--drop", action="store_true", help="Drop existing BikeStores tables before loading")
+    parser.add_argument("--csv-dir", default=CSV_DIR, help="Directory containing the BikeStores CSV files")
+    args = parser.parse_args()
+
+    loader = BulkLoader(csv_dir=args.csv_dir, scale=args.scale, workers=args.workers)
+    started = time.perf_counter()
+    results = loader.load(drop_existing=args.drop)
+
+    print(f"{'table':<25}{'rows':>12}{'seconds':>10}{'rows/sec':>12}")
+    for result in results:
+        print(f"{result['table']:<25}{result['rows']:>12}{result['seconds']:>10}{result['rows_per_second']:>12}")
+    print(f"Total time including constraints and ANALYZE: {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,193 @@
+import os
+import json
+import uuid
+import datetime
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# How NUMERIC/DECIMAL values are returned: "float" (float64), "string" (fixed-point text) or "decimal" (exact Decimal objects)
+RESULT_DECIMAL_POLICY = os.getenv("RESULT_DECIMAL_POLICY", "float").lower()
+
+# How DATE values are returned: "iso" ('YYYY-MM-DD' strings) or "epoch_days" (int32 days since 1970-01-01)
+RESULT_DATE_POLICY = os.getenv("RESULT_DATE_POLICY", "iso").lower()
+
+# Execution option that turns the typecasters on for a statement; other queries on the engine get the driver's usual types
+TYPECAST_OPTION = "result_typecasts"
+
+# PostgreSQL type OIDs reported in cursor.description
+INT2_OID = 21
+INT4_OID = 23
+INT8_OID = 20
+FLOAT4_OID = 700
+FLOAT8_OID = 701
+NUMERIC_OID = 1700
+DATE_OID = 1082
+
+# Target dtype for columns without NULLs, by type OID
+_COLUMN_DTYPES = {
+    INT2_OID: np.int32,
+    INT4_OID: np.int32,
+    INT8_OID: np.int64,
+    FLOAT4_OID: np.float64,
+    FLOAT8_OID: np.float64,
+}
+
+
+def _cast_numeric_to_float(value, cursor):
+    return None if value is None else float(value)
+
+
+def _cast_raw_text(value, cursor):
+    return value
+
+
+# Installs driver-level casts so NUMERIC and DATE values of fetched results are never boxed as Decimal/date objects
+def register_typecasters(engine):
+    """
+    Register psycopg2 typecasters for statements run with the TYPECAST_OPTION.
+
+    NUMERIC values are parsed straight into floats (or kept as the
+    fixed-point text PostgreSQL sends) and DATE values are kept as their
+    ISO text, instead of building a Decimal or date object per cell. The
+    casts are set on the cursor of each such statement only, so rollups,
+    registered queries and the index advisor still get Decimal and date values.
+
+    Args:
+        engine: The SQLAlchemy engine to configure
+    """
+    import psycopg2.extensions
+    from sqlalchemy import event
+
+    casters = []
+    if RESULT_DECIMAL_POLICY == "float":
+        casters.append(psycopg2.extensions.new_type((NUMERIC_OID,), "NUMERIC_AS_FLOAT", _cast_numeric_to_float))
+    elif RESULT_DECIMAL_POLICY == "string":
+        casters.append(psycopg2.extensions.new_type((NUMERIC_OID,), "NUMERIC_AS_TEXT", _cast_raw_text))
+    casters.append(psycopg2.extensions.new_type((DATE_OID,), "DATE_AS_TEXT", _cast_raw_text))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _register(connection, cursor, statement, parameters, context, executemany):
+        if context is not None and context.execution_options.get(TYPECAST_OPTION):
+            for caster in casters:
+                psycopg2.extensions.register_type(caster, cursor)
+
+
+# Serializes a QueryService result, encoding a DataFrame of records column by column instead of cell by cell
+def result_to_json(result):
+    """
+    Serialize a query result to JSON.
+
+    When data.records is a DataFrame it is written with DataFrame.to_json,
+    which encodes each typed column in one pass, and spliced into the rest
+    of the result. Dates and timestamps are written as ISO 8601 strings and
+    Decimal values as strings.
+
+    Args:
+        result (dict): A QueryService or FollowUpService result
+
+    Returns:
+        str: The JSON text
+    """
+    data = result.get("data")
+    if not isinstance(data, dict) or not isinstance(data.get("records"), pd.DataFrame):
+        return json.dumps(result, default=str)
+
+    frame = data["records"]
+    if frame.columns.is_unique:
+        records = frame.to_json(orient="records", date_format="iso")
+    else:
+        # Records are keyed by column name, so duplicate names collapse to the last one as they would in a dict
+        values = frame.astype(object).where(frame.notna(), None)
+        records = json.dumps([dict(zip(frame.columns, row)) for row in values.itertuples(index=False, name=None)], default=str)
+    marker = f"records-{uuid.uuid4().hex}"
+    text = json.dumps({**result, "data": {**data, "records": marker}}, default=str)
+    return text.replace(json.dumps(marker), records, 1)
+
+
+# Builds a DataFrame one column at a time, choosing each column's representation from its PostgreSQL type
+def build_dataframe(columns, type_codes, rows):
+    """
+    Convert fetched rows into a DataFrame with compact, typed columns.
+
+    Each column is converted once as a whole: integers become int32/int64
+    arrays, NUMERIC (under the "float" policy) and floating point columns
+    become float64 arrays and DATE columns become ISO strings or int32
+    epoch days. Columns containing NULLs keep None values so they serialize
+    as JSON null.
+
+    Args:
+        columns (list): Column names
+        type_codes (list): PostgreSQL type OIDs from cursor.description
+        rows (list): Rows returned by fetchall()
+
+    Returns:
+        pd.DataFrame: The result set
+    """
+    if not rows:
+        return pd.DataFrame(columns=columns)
+
+    data = {}
+    for name, type_code, values in zip(columns, type_codes, zip(*rows)):
+        has_nulls = None in values
+        if type_code == DATE_OID and RESULT_DATE_POLICY == "epoch_days":
+            days = np.array(values, dtype="datetime64[D]").astype(np.int64)
+            if has_nulls:
+                data[name] = pd.Series([None if value is None else int(day) for value, day in zip(values, days)], dtype=object)
+            else:
+                data[name] = days.astype(np.int32)
+        elif not has_nulls and (type_code in _COLUMN_DTYPES or (type_code == NUMERIC_OID and RESULT_DECIMAL_POLICY == "float")):
+            data[name] = np.array(values, dtype=_COLUMN_DTYPES.get(type_code, np.float64))
+        else:
+            data[name] = pd.Series(values, dtype=object)
+
+    # Duplicate column names (e.g. two unaliased COUNT(*)) cannot go through a dict
+    if len(data) != len(columns):
+        return pd.DataFrame(rows, columns=columns)
+    return pd.DataFrame(data, columns=columns)
+
+
+# Builds a DataFrame from rows of an embedded engine, whose driver returns Decimal and date objects
+def build_dataframe_from_values(columns, rows):
+    """
+    Convert rows fetched from DuckDB or SQLite like build_dataframe().
+
+    Without type OIDs each column's type is read from its values; Decimal
+    and date values are converted the way the PostgreSQL typecasters would
+    have returned them, so results look the same on every backend.
+
+    Args:
+        columns (list): Column names
+        rows (list): Rows returned by fetchall()
+
+    Returns:
+        pd.DataFrame: The result set
+    """
+    if not rows:
+        return pd.DataFrame(columns=columns)
+
+    type_codes = []
+    converted = []
+    for values in zip(*rows):
+        kinds = {type(value) for value in values if value is not None}
+        type_code = None
+        if kinds and kinds <= {int}:
+            type_code = INT8_OID
+        elif kinds and kinds <= {int, float}:
+            type_code = FLOAT8_OID
+        elif kinds and kinds <= {int, Decimal}:
+            type_code = NUMERIC_OID
+            if RESULT_DECIMAL_POLICY == "float":
+                values = [None if value is None else float(value) for value in values]
+            elif RESULT_DECIMAL_POLICY == "string":
+                values = [None if value is None else str(value) for value in values]
+        elif kinds == {datetime.date}:
+            type_code = DATE_OID
+            values = [None if value is None else value.isoformat() for value in values]
+        type_codes.append(type_code)
+        converted.append(values)
+    return build_dataframe(columns, type_codes, list(zip(*converted)))
@@ -1,3 +1,4 @@
+import pandas as pd
 from app.database.connection import DatabaseConnection
 
 def get_schema_as_text():
@@ -123,4 +124,89 @@ def get_schema_as_text():
     - Stores maintain Stock of Products
     """
     
-    return schema_text
\ No newline at end of file
+    return schema_text
+
+
+# Tables created by the service itself (rollups, registered queries), left out of introspected schemas
+SERVICE_TABLE_PREFIXES = ("rollup_", "registered_queries")
+
+# Builds schema text for any database from information_schema, in the same layout as the BikeStores text
+def introspect_schema_text(db_connection):
+    """
+    Describe the tables of a database for the LLM by reading its catalog.
+
+    Used for routed databases, whose tables may differ from the hand-written
+    BikeStores description.
+
+    Args:
+        db_connection: The DatabaseConnection to introspect
+
+    Returns:
+        str: The schema text, or None if the catalog could not be read
+    """
+    if getattr(db_connection, "embedded", False):
+        return _format_schema_text(_embedded_columns(db_connection), {}, {})
+
+    columns = db_connection.execute_query("""
+        SELECT c.table_name, c.column_name, c.data_type, c.is_nullable
+        FROM information_schema.columns c
+        JOIN information_schema.tables t ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+        WHERE c.table_schema = 'public' AND t.table_type = 'BASE TABLE'
+        ORDER BY c.table_name, c.ordinal_position
+    """)
+    constraints = db_connection.execute_query("""
+        SELECT tc.table_name, tc.constraint_type, kcu.column_name,
+               ccu.table_name AS foreign_table, ccu.column_name AS foreign_column
+        FROM information_schema.table_constraints tc
+        JOIN information_schema.key_column_usage kcu
+          ON kcu.constraint_name = tc.constraint_name AND kcu.table_schema = tc.table_schema
+        LEFT JOIN information_schema.constraint_column_usage ccu
+          ON ccu.constraint_name = tc.constraint_name AND ccu.table_schema = tc.table_schema
+         AND tc.constraint_type = 'FOREIGN KEY'
+        WHERE tc.table_schema = 'public' AND tc.constraint_type IN ('PRIMARY KEY', 'FOREIGN KEY')
+        ORDER BY tc.table_name, kcu.ordinal_position
+    """)
+    if columns is None or constraints is None or columns.empty:
+        return None
+
+    primary_keys = {}
+    foreign_keys = {}
+    for row in constraints.itertuples():
+        if row.constraint_type == "PRIMARY KEY":
+            primary_keys.setdefault(row.table_name, []).append(row.column_name)
+        elif row.foreign_table:
+            foreign_keys.setdefault(row.table_name, []).append(f"{row.column_name} references {row.foreign_table}({row.foreign_column})")
+    return _format_schema_text(columns, primary_keys, foreign_keys)
+
+
+# DuckDB and SQLite have no "public" information_schema, so their columns come from the connection's own catalog lookups
+def _embedded_columns(db_connection):
+    frames = []
+    for table_name in db_connection.get_all_tables():
+        table_columns = db_connection.get_table_schema(table_name)
+        if table_columns is not None and not table_columns.empty:
+            frames.append(table_columns.assign(table_name=table_name))
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+def _format_schema_text(columns, primary_keys, foreign_keys):
+    if columns is None or columns.empty:
+        return None
+    lines = ["", "    Database Schema:", ""]
+    for table_name, table_columns in columns.groupby("table_name", sort=True):
+        if table_name.startswith(SERVICE_TABLE_PREFIXES):
+            continue
+        keys = primary_keys.get(table_name, [])
+        lines.append(f"    Table: {table_name}")
+        lines.append("    Columns:")
+        for row in table_columns.itertuples():
+            flags = " PRIMARY KEY" if keys == [row.column_name] else ""
+            flags += " NOT NULL" if row.is_nullable == "NO" and not flags else ""
+            lines.append(f"      - {row.column_name} ({row.data_type.upper()}){flags}")
+        if len(keys) > 1:
+            lines.append(f"    Primary Key: ({', '.join(keys)})")
+        if table_name in foreign_keys:
+            lines.append("    Foreign Keys:")
+            lines.extend(f"      - {foreign_key}" for foreign_key in foreign_keys[table_name])
+        lines.append("    ")
+    return "\n".join(lines)
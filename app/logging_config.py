@@ -0,0 +1,201 @@
+import os
+import copy
+import json
+import queue
+import atexit
+import random
+import logging
+import reprlib
+import logging.handlers
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Logging settings
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # "text" or "json"
+LOG_FILE = os.getenv("LOG_FILE", "debug.log")
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+
+# Per-route sampling of DEBUG/INFO records, e.g. "/api/convert_query=0.1,/api/query=0.5"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener = None
+_queue_handler = None
+
+
+# Bounded repr used for request/result payloads so large results are never rendered in full
+_payload_repr = reprlib.Repr()
+_payload_repr.maxstring = 200
+_payload_repr.maxother = 200
+_payload_repr.maxlist = 10
+_payload_repr.maxdict = 10
+_payload_repr.maxlevel = 4
+
+
+class LogPayload:
+    """
+    Lazy, size-bounded view of a payload for log messages.
+
+    Nothing is rendered unless the record is actually emitted, and then
+    only a truncated representation is produced.
+    """
+
+    __slots__ = ("payload",)
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __str__(self):
+        if isinstance(self.payload, str):
+            return _truncate(self.payload)
+        return _payload_repr.repr(self.payload)
+
+
+# Wraps a request or result payload for logging, e.g. logger.debug("Result: %s", summarize(result))
+def summarize(payload):
+    return LogPayload(payload)
+
+
+def _truncate(message, limit=None):
+    limit = limit or LOG_MAX_MESSAGE_CHARS
+    if len(message) <= limit:
+        return message
+    return f"{message[:limit]}... [{len(message) - limit} chars truncated]"
+
+
+def _parse_sample_rates(spec):
+    rates = {}
+    for item in spec.split(","):
+        route, _, rate = item.partition("=")
+        if route.strip() and rate.strip():
+            rates[route.strip()] = float(rate)
+    return rates
+
+
+class RouteSamplingFilter(logging.Filter):
+    """
+    Keeps a sampled fraction of DEBUG/INFO records per Flask route.
+
+    The decision is made once per request, so a sampled request keeps all
+    of its records. Warnings and errors are never dropped.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        try:
+            from flask import g, has_request_context, request
+        except ImportError:
+            return True
+        if not has_request_context():
+            return True
+        if "log_sampled" not in g:
+            rate = self.rates.get(request.path, 1.0)
+            g.log_sampled = rate >= 1.0 or random.random() < rate
+        return g.log_sampled
+
+
+_exception_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        route = getattr(record, "route", None)
+        if route:
+            entry["route"] = route
+        # The queue handler has already rendered the traceback into exc_text
+        exc_text = record.exc_text or (self.formatException(record.exc_info) if record.exc_info else None)
+        if exc_text:
+            entry["exc_info"] = exc_text
+        return json.dumps(entry, default=str)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    # Renders the message once, truncated, and attaches the route before handing the record to the listener thread
+    def prepare(self, record):
+        # QueueHandler.prepare() would fold the traceback into the message and drop exc_info,
+        # so the traceback is kept as exc_text for the formatters instead
+        record = copy.copy(record)
+        message = record.getMessage()
+        record.msg = message if record.levelno >= logging.ERROR else _truncate(message)
+        record.message = record.msg
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            # Traceback objects hold frames alive and cannot cross to the listener thread safely
+            record.exc_info = None
+        try:
+            from flask import has_request_context, request
+            if has_request_context():
+                record.route = request.path
+        except ImportError:
+            pass
+        return record
+
+
+# Installs queue-based root logging once for whichever Flask app starts first
+def configure_logging():
+    """
+    Configure root logging for the service.
+
+    Records are put on an in-memory queue by the calling thread and written
+    to the console and log file by a background listener, so request threads
+    never wait on disk I/O.
+
+    Returns:
+        logging.handlers.QueueListener: The running listener
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if LOG_FILE:
+        handlers.append(logging.FileHandler(LOG_FILE))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RouteSamplingFilter(_parse_sample_rates(LOG_SAMPLE_RATES)))
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    _queue_handler = queue_handler
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_restart_listener)
+    return _listener
+
+
+# Gives a forked worker its own queue and listener thread; the parent's thread does not exist in the child
+def _restart_listener():
+    log_queue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener.queue = log_queue
+    _listener._thread = None
+    _listener.start()
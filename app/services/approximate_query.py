@@ -0,0 +1,230 @@
+import os
+import time
+import threading
+from sqlalchemy import text
+from dotenv import load_dotenv
+from .sql_parsing import (
+    IDENT, NUMBER, OP,
+    tokenize, render, is_keyword, split_clauses, split_top_level,
+    find_closing_paren, parse_inner_joins, strip_alias, contains_aggregate, unwrap_round,
+)
+
+# Load environment variables
+load_dotenv()
+
+# Share of the fact table read in approximate mode, and the sampling method ("system" reads whole pages, "bernoulli" single rows)
+APPROX_SAMPLE_PERCENT = float(os.getenv("APPROX_SAMPLE_PERCENT", "10"))
+APPROX_SAMPLE_METHOD = os.getenv("APPROX_SAMPLE_METHOD", "system").lower()
+
+# Tables smaller than this are answered exactly; sampling them saves little and costs accuracy
+APPROX_MIN_ROWS = int(os.getenv("APPROX_MIN_ROWS", "100000"))
+
+# Fixed sampling seed so the same question gives the same estimate
+APPROX_SEED = int(os.getenv("APPROX_SEED", "42"))
+
+# Normal quantile of the reported error bounds (95% confidence)
+CONFIDENCE = 0.95
+Z_SCORE = 1.96
+
+# Tables that may be sampled, in order of preference (the largest first)
+FACT_TABLES = ["sales_order_items", "sales_orders"]
+
+# Aggregates that have an unbiased estimate from a uniform sample; any other aggregate makes a query ineligible
+ESTIMABLE_AGGREGATES = {"sum", "count", "avg"}
+
+# Seconds a table's row estimate is reused before pg_class is read again
+TABLE_SIZE_TTL_SECONDS = 300
+
+
+class _NotApproximable(Exception):
+    """Raised internally when a query cannot be answered from a sample."""
+
+
+class ApproximateQueryService:
+    def __init__(self, db_connection):
+        self.db_connection = db_connection
+        self.engine = db_connection.engine
+        self._lock = threading.Lock()
+        self._table_rows = {}
+
+    # Returns PostgreSQL's row estimate for a table, cached for a few minutes
+    def table_rows(self, table):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._table_rows.get(table)
+            if cached is not None and now - cached[1] < TABLE_SIZE_TTL_SECONDS:
+                return cached[0]
+        try:
+            with self.engine.connect() as connection:
+                rows = connection.execute(
+                    text("SELECT COALESCE(MAX(reltuples), 0)::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+                    {"table": table},
+                ).scalar()
+        except Exception as e:
+            print(f"Error reading size of {table}: {e}")
+            rows = 0
+        with self._lock:
+            self._table_rows[table] = (rows, now)
+        return rows
+
+    # Rewrites an aggregate query to read a sample of its fact table
+    def rewrite(self, sql_query, sample_percent=APPROX_SAMPLE_PERCENT):
+        """
+        Rewrite an eligible aggregate query to run over a TABLESAMPLE.
+
+        Args:
+            sql_query (str): The SQL query
+            sample_percent (float): Percentage of the fact table to read
+
+        Returns:
+            tuple: (sampled_sql, info) where info describes the sample and the
+            error columns, or None if the query should run exactly
+        """
+        plan = plan_approximate_query(sql_query, sample_percent)
+        if plan is None:
+            return None
+        sampled_sql, info = plan
+        if self.table_rows(info["sampled_table"]) < APPROX_MIN_ROWS:
+            return None
+        return sampled_sql, info
+
+
+# Plans the sampled version of a query without touching the database
+def plan_approximate_query(sql_query, sample_percent=APPROX_SAMPLE_PERCENT, method=APPROX_SAMPLE_METHOD):
+    """
+    Work out the sampled SQL for an aggregate query.
+
+    SUM and COUNT are scaled up by the sampling rate and AVG is estimated
+    directly; each estimate gets an extra "<column>_error" output with the
+    half-width of its 95% confidence interval. The bounds assume rows are
+    sampled independently, so with SYSTEM (page) sampling they are
+    indicative rather than exact.
+
+    Args:
+        sql_query (str): The SQL query
+        sample_percent (float): Percentage of the fact table to read
+        method (str): "system" or "bernoulli"
+
+    Returns:
+        tuple: (sampled_sql, info), or None if the query is not eligible
+    """
+    if not 0 < sample_percent < 100 or method not in ("system", "bernoulli"):
+        return None
+    try:
+        return _SampleRewriter(sql_query, sample_percent, method).rewrite()
+    except _NotApproximable:
+        return None
+
+
+class _SampleRewriter:
+    def __init__(self, sql_query, sample_percent, method):
+        tokens = tokenize(sql_query)
+        if not tokens or sum(1 for token in tokens if is_keyword(token, "select")) != 1:
+            raise _NotApproximable()
+        if any(is_keyword(token, "over") for token in tokens):
+            raise _NotApproximable()
+        self.clauses = split_clauses(tokens)
+        if self.clauses is None or "from" not in self.clauses or "having" in self.clauses:
+            raise _NotApproximable()
+        self.sample_percent = sample_percent
+        self.method = method
+        self.fraction = sample_percent / 100
+        self.factor = repr(100 / sample_percent)
+
+    def rewrite(self):
+        tables = parse_inner_joins(self.clauses["from"])
+        if not tables:
+            raise _NotApproximable()
+        sampled_table = next((table for table in FACT_TABLES if any(entry["table"] == table for entry in tables)), None)
+        if sampled_table is None or sum(1 for entry in tables if entry["table"] == sampled_table) > 1:
+            raise _NotApproximable()
+
+        select_items = split_top_level(self.clauses["select"])
+        if not select_items[0] or is_keyword(select_items[0][0], "distinct"):
+            raise _NotApproximable()
+
+        estimates = []
+        errors = []
+        error_columns = {}
+        for item in select_items:
+            expression, alias = strip_alias(item)
+            if not contains_aggregate(expression):
+                estimates.append(render(item))
+                continue
+            name, estimate, error = self._estimate(expression, alias)
+            # Two unaliased aggregates would share an output name and their error bounds could not be told apart
+            if name.strip('"') in error_columns:
+                raise _NotApproximable()
+            estimates.append(f"{estimate} AS {name}")
+            errors.append(f"{error} AS {_error_column(name)}")
+            error_columns[name.strip('"')] = _error_column(name).strip('"')
+        if not errors:
+            raise _NotApproximable()
+
+        # Error columns go last so GROUP BY/ORDER BY positions keep pointing at the same outputs
+        sql = f"SELECT {', '.join(estimates + errors)} FROM {render(self._sample_from(sampled_table))}"
+        for clause in ("where", "group by", "order by", "limit", "offset"):
+            if clause in self.clauses:
+                sql += f" {clause.upper()} {render(self.clauses[clause])}"
+        return sql, {
+            "sampled_table": sampled_table,
+            "sample_percent": self.sample_percent,
+            "method": self.method,
+            "confidence": CONFIDENCE,
+            "error_columns": error_columns,
+        }
+
+    # Adds TABLESAMPLE after the fact table (and its alias) in the FROM clause
+    def _sample_from(self, table):
+        tokens = list(self.clauses["from"])
+        index = next(position for position, token in enumerate(tokens) if token == (IDENT, table))
+        index += 1
+        if index < len(tokens) and is_keyword(tokens[index], "as"):
+            index += 1
+        if index < len(tokens) and tokens[index][0] == IDENT and tokens[index][1] not in ("join", "inner", "on"):
+            index += 1
+        sample = [
+            (IDENT, "tablesample"), (IDENT, self.method), (OP, "("), (NUMBER, repr(self.sample_percent)), (OP, ")"),
+            (IDENT, "repeatable"), (OP, "("), (NUMBER, str(APPROX_SEED)), (OP, ")"),
+        ]
+        return tokens[:index] + sample + tokens[index:]
+
+    # Builds the estimate and error-bound expressions for SUM/COUNT/AVG, optionally inside ROUND
+    def _estimate(self, expression, alias):
+        unwrapped = unwrap_round(expression)
+        if unwrapped is None:
+            raise _NotApproximable()
+        expression, digits = unwrapped
+
+        if not (len(expression) > 3 and expression[0][0] == IDENT and expression[0][1] in ESTIMABLE_AGGREGATES
+                and expression[1] == (OP, "(") and find_closing_paren(expression, 1) == len(expression) - 1):
+            raise _NotApproximable()
+        function = expression[0][1]
+        arguments = expression[2:-1]
+        if is_keyword(arguments[0], "distinct") or contains_aggregate(arguments):
+            raise _NotApproximable()
+        argument = render(arguments)
+        value = f"(({argument})::float8)"
+        keep = repr(round(1 - self.fraction, 6))
+
+        # Horvitz-Thompson estimates: each sampled row stands for 1/fraction rows
+        if function == "count":
+            estimate = f"ROUND(COUNT({argument}) * {self.factor})::bigint"
+            error = f"{Z_SCORE} * SQRT({keep} * COUNT({argument})) * {self.factor}"
+        elif function == "sum":
+            estimate = f"SUM({argument}) * {self.factor}"
+            error = f"{Z_SCORE} * SQRT({keep} * SUM({value} * {value})) * {self.factor}"
+        else:
+            estimate = f"AVG({argument})"
+            error = f"{Z_SCORE} * STDDEV_SAMP({value}) / SQRT(NULLIF(COUNT({argument}), 0))"
+
+        if digits is not None:
+            estimate = f"ROUND(({estimate})::numeric, {digits})"
+            error = f"ROUND(({error})::numeric, {digits})"
+        return alias[1] if alias else function if digits is None else "round", estimate, error
+
+
+def _error_column(name):
+    if name.startswith('"'):
+        return f'"{name[1:-1]}_error"'
+    return f"{name}_error"
@@ -0,0 +1,343 @@
+import os
+import re
+import json
+import math
+import time
+import uuid
+import hashlib
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+from collections import Counter
+import numpy as np
+from dotenv import load_dotenv
+from .workload_log import WORKLOAD_LOG_PATH, read_workload
+
+try:
+    import fcntl
+except ImportError:  # Windows runs the single-process development server only
+    fcntl = None
+
+# Load environment variables
+load_dotenv()
+
+# Where the verified question/SQL pairs are stored
+EXAMPLE_INDEX_PATH = os.getenv("EXAMPLE_INDEX_PATH", "examples.json")
+
+# Number of examples put into the prompt (0 disables retrieval) and the minimum score an example needs
+EXAMPLE_TOP_K = int(os.getenv("EXAMPLE_TOP_K", "3"))
+EXAMPLE_MIN_SCORE = float(os.getenv("EXAMPLE_MIN_SCORE", "0.35"))
+
+# Share of the score that comes from keyword (BM25) matching; the rest is vector similarity
+EXAMPLE_LEXICAL_WEIGHT = float(os.getenv("EXAMPLE_LEXICAL_WEIGHT", "0.5"))
+
+# Size of the hashed feature vectors used for similarity
+EMBEDDING_DIMENSIONS = 1024
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Words that carry no meaning for matching questions
+STOP_WORDS = {"a", "an", "the", "of", "to", "is", "are", "me", "please", "show", "give", "list", "what", "which", "in", "for"}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _words(text):
+    return _WORD.findall(text.lower())
+
+
+def _terms(text):
+    return [word for word in _words(text) if word not in STOP_WORDS]
+
+
+# Maps a question to a unit vector of hashed word, word pair and character trigram features
+def embed(text, dimensions=EMBEDDING_DIMENSIONS):
+    """
+    Compute a local embedding of a question.
+
+    Features are hashed into a fixed number of signed buckets, so similar
+    wording (shared words, word pairs, and character trigrams for plurals
+    and typos) gives a high cosine similarity without any model download.
+
+    Args:
+        text (str): The question
+        dimensions (int): Vector size
+
+    Returns:
+        np.ndarray: An L2-normalized float32 vector
+    """
+    words = _words(text)
+    features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+    padded = f" {' '.join(words)} "
+    features += [padded[index:index + 3] for index in range(len(padded) - 2)]
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature in features:
+        value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        vector[value % dimensions] += 1.0 if value >> 63 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class ExampleIndex:
+    """
+    Local, file-backed index of verified question/SQL pairs.
+
+    Questions are matched with a blend of BM25 keyword scoring and cosine
+    similarity of hashed feature vectors, both computed in-process.
+    """
+
+    def __init__(self, path=EXAMPLE_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._version = None
+        self._examples = self._load() or []
+        self._build()
+
+    # Returns the stored examples, or None if the file cannot be read
+    def _load(self):
+        if not self.path:
+            return []
+        self._version = self._file_version()
+        if self._version is None:
+            return []
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading example index {self.path}: {e}")
+            return None
+
+    # Writes the examples atomically under a per-process temporary name, so a crash never leaves a truncated file
+    def _save(self):
+        if not self.path:
+            return
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+                json.dump(self._examples, f, indent=2)
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+        self._version = self._file_version()
+
+    # Serializes read-merge-write cycles between processes sharing the file
+    @contextmanager
+    def _file_lock(self):
+        if not self.path or fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # Every save replaces the file, so the inode tells saves apart even within one mtime tick
+    def _file_version(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    # Reloads the examples if another process (e.g. another gunicorn worker) changed the file; call with the lock held
+    def _refresh(self):
+        if self.path and self._file_version() != self._version:
+            examples = self._load()
+            # An unreadable file keeps the examples already loaded; the next change writes them back
+            if examples is not None:
+                self._examples = examples
+                self._build()
+
+    # Rebuilds the vector matrix and keyword statistics after a change
+    def _build(self):
+        self._vectors = (
+            np.vstack([embed(example["question"]) for example in self._examples])
+            if self._examples else np.zeros((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+        )
+        self._term_counts = [Counter(_terms(example["question"])) for example in self._examples]
+        self._document_frequency = Counter(term for counts in self._term_counts for term in counts)
+        lengths = [sum(counts.values()) for counts in self._term_counts]
+        self._average_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+    # Returns all examples
+    def list(self):
+        with self._lock:
+            self._refresh()
+            return [dict(example) for example in self._examples]
+
+    # Returns one example by id, or None
+    def get(self, example_id):
+        with self._lock:
+            self._refresh()
+            example = next((example for example in self._examples if example["id"] == example_id), None)
+            return dict(example) if example else None
+
+    # Adds a verified pair, replacing the SQL of an existing example with the same question
+    def add(self, question, sql_query, source="api"):
+        """
+        Add a verified question/SQL pair.
+
+        Args:
+            question (str): The natural language question
+            sql_query (str): SQL known to answer it correctly
+            source (str): Where the pair came from ("api", "workload", ...)
+
+        Returns:
+            dict: The stored example
+        """
+        key = " ".join(_words(question))
+        with self._lock, self._file_lock():
+            self._refresh()
+            example = next((example for example in self._examples if " ".join(_words(example["question"])) == key), None)
+            if example is None:
+                example = {"id": uuid.uuid4().hex[:12], "question": question, "source": source, "created_at": time.time()}
+                self._examples.append(example)
+            example["sql_query"] = sql_query.strip()
+            example["updated_at"] = time.time()
+            self._build()
+            self._save()
+            return dict(example)
+
+    # Changes the question and/or SQL of an example
+    def update(self, example_id, question=None, sql_query=None):
+        with self._lock, self._file_lock():
+            self._refresh()
+            example = next((example for example in self._examples if example["id"] == example_id), None)
+            if example is None:
+                return None
+            if question:
+                example["question"] = question
+            if sql_query:
+                example["sql_query"] = sql_query.strip()
+            example["updated_at"] = time.time()
+            self._build()
+            self._save()
+            return dict(example)
+
+    # Deletes an example; returns False if it does not exist
+    def remove(self, example_id):
+        with self._lock, self._file_lock():
+            self._refresh()
+            remaining = [example for example in self._examples if example["id"] != example_id]
+            if len(remaining) == len(self._examples):
+                return False
+            self._examples = remaining
+            self._build()
+            self._save()
+            return True
+
+    # Finds the verified examples closest to a question
+    def search(self, question, top_k=EXAMPLE_TOP_K, min_score=EXAMPLE_MIN_SCORE):
+        """
+        Find the examples most similar to a question.
+
+        Args:
+            question (str): The new question
+            top_k (int): Maximum number of examples to return
+            min_score (float): Minimum blended score (0-1) an example needs
+
+        Returns:
+            list: Examples with a "score" key, best first
+        """
+        if top_k <= 0:
+            return []
+        with self._lock:
+            self._refresh()
+            if not self._examples:
+                return []
+            examples = self._examples
+            vectors = self._vectors
+            term_counts = self._term_counts
+            document_frequency = self._document_frequency
+            average_length = self._average_length
+
+        vector_scores = np.clip(vectors @ embed(question), 0.0, 1.0)
+
+        lexical_scores = np.zeros(len(examples), dtype=np.float32)
+        self_score = 0.0
+        for term in set(_terms(question)):
+            frequency = document_frequency.get(term, 0)
+            idf = math.log(1 + (len(examples) - frequency + 0.5) / (frequency + 0.5))
+            # An example containing every question term once, at average length, scores the sum of the idfs
+            self_score += idf
+            if not frequency:
+                continue
+            for position, counts in enumerate(term_counts):
+                count = counts.get(term)
+                if count:
+                    length = sum(counts.values())
+                    lexical_scores[position] += idf * count * (BM25_K1 + 1) / (
+                        count + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    )
+        # Normalised by the question's own score rather than the best match, so unmatched terms keep scores low
+        if self_score > 0:
+            lexical_scores = np.minimum(lexical_scores / self_score, 1.0)
+
+        scores = EXAMPLE_LEXICAL_WEIGHT * lexical_scores + (1 - EXAMPLE_LEXICAL_WEIGHT) * vector_scores
+        matches = []
+        for position in np.argsort(-scores)[:top_k]:
+            if scores[position] < min_score:
+                break
+            matches.append({**examples[position], "score": round(float(scores[position]), 3)})
+        return matches
+
+    # Adds the questions that were answered successfully in a captured workload
+    def seed_from_workload(self, path=WORKLOAD_LOG_PATH):
+        """
+        Seed the index with question/SQL pairs from the workload log.
+
+        Only /query requests whose SQL executed successfully are used; the
+        latest SQL wins when a question was asked more than once.
+
+        Args:
+            path (str): Workload log written by the API
+
+        Returns:
+            int: Number of pairs added or updated
+        """
+        pairs = {}
+        for entry in read_workload(path):
+            if entry.get("route") == "/query" and entry.get("status") == "success" and entry.get("question") and entry.get("sql"):
+                pairs[" ".join(_words(entry["question"]))] = (entry["question"], entry["sql"])
+        for question, sql_query in pairs.values():
+            self.add(question, sql_query, source="workload")
+        return len(pairs)
+
+
+# Formats examples for inclusion in an LLM prompt
+def format_examples(examples):
+    return "\n\n".join(f"Question: {example['question']}\nSQL: {example['sql_query']}" for example in examples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the verified question/SQL examples used in prompts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    seed_parser = subparsers.add_parser("seed", help="Add successful questions from a workload log")
+    seed_parser.add_argument("workload_file", nargs="?", default=WORKLOAD_LOG_PATH)
+    add_parser = subparsers.add_parser("add")
+    add_parser.add_argument("question")
+    add_parser.add_argument("sql_query")
+    search_parser = subparsers.add_parser("search")
+    search_parser.add_argument("question")
+    search_parser.add_argument("--top", type=int, default=EXAMPLE_TOP_K)
+    subparsers.add_parser("list")
+    args = parser.parse_args()
+
+    index = ExampleIndex()
+    if args.command == "seed":
+        print(f"Seeded {index.seed_from_workload(args.workload_file)} example(s) into {index.path}")
+    elif args.command == "add":
+        print(index.add(args.question, args.sql_query))
+    elif args.command == "search":
+        for example in index.search(args.question, args.top, min_score=0.0):
+            print(f"{example['score']:.3f}  {example['question']}\n       {example['sql_query']}")
+    else:
+        for example in index.list():
+            print(f"{example['id']}  {example['question']}")
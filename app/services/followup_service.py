@@ -0,0 +1,229 @@
+import os
+import re
+import time
+import uuid
+import threading
+from collections import OrderedDict
+import pandas as pd
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Conversation session limits
+FOLLOW_UP_MAX_SESSIONS = int(os.getenv("FOLLOW_UP_MAX_SESSIONS", "200"))
+FOLLOW_UP_SESSION_TTL = int(os.getenv("FOLLOW_UP_SESSION_TTL", "1800"))  # seconds
+
+# Results larger than this are not kept for follow-ups
+FOLLOW_UP_MAX_ROWS = int(os.getenv("FOLLOW_UP_MAX_ROWS", "100000"))
+
+# Name of the cached result inside the embedded engine
+PREVIOUS_RESULT_TABLE = "previous_result"
+
+# Number of records shown to the LLM when writing a follow-up query
+SAMPLE_ROWS = 3
+
+# Questions longer than this are treated as new questions unless the client asks for a refinement
+FOLLOW_UP_MAX_WORDS = int(os.getenv("FOLLOW_UP_MAX_WORDS", "12"))
+
+# Words that mark a question as a refinement of the previous result
+REFINEMENT_WORDS = {
+    "only", "just", "sort", "sorted", "filter", "exclude", "excluding", "without", "except",
+    "instead", "those", "these", "them", "same", "top", "bottom", "highest", "lowest",
+    "ascending", "descending", "asc", "desc", "limit", "also", "now",
+}
+
+# Phrases at the start of a question that continue the previous one ("and for 2017?", "what about Trek?")
+REFINEMENT_OPENERS = ("and ", "but ", "what about ", "how about ", "same ", "now ")
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_WORD = re.compile(r"[a-z0-9_]+")
+
+
+class FollowUpService:
+    """
+    Keeps the last database result of each conversation and answers
+    refinements of it ("only 2018", "sort by revenue") with an in-process
+    DuckDB query over that result instead of a new PostgreSQL query.
+    """
+
+    def __init__(self, nl_to_sql_converter):
+        self.nl_to_sql_converter = nl_to_sql_converter
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+
+    # Creates an id for a new conversation
+    def new_session_id(self):
+        return uuid.uuid4().hex
+
+    def _get(self, session_id, database=None):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            # A result from one database must not answer a question routed to another
+            if session["database"] != database:
+                return None
+            if time.time() - session["updated_at"] > FOLLOW_UP_SESSION_TTL:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+    # Keeps a database result as the base for follow-up questions in this session
+    def remember(self, session_id, question, sql_query, result, database=None):
+        """
+        Store a database result for later follow-ups.
+
+        Args:
+            session_id (str): The conversation id
+            question (str): The question the result answers
+            sql_query (str): The SQL that produced it
+            result (dict): The QueryService result
+            database (str): Key of the database the result came from (optional)
+        """
+        data = result.get("data") or {}
+        if result.get("status") != "success" or not data.get("columns") or data.get("row_count", 0) > FOLLOW_UP_MAX_ROWS:
+            return
+        session = {
+            "question": question,
+            "sql_query": sql_query,
+            "records": pd.DataFrame(data["records"], columns=data["columns"]),
+            "columns": data["columns"],
+            "refinement_sql": None,
+            "database": database,
+            "updated_at": time.time(),
+        }
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > FOLLOW_UP_MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+
+    # Answers a follow-up from the session's previous result, or returns None if it needs the database
+    def answer(self, session_id, question, refine=None, database=None):
+        """
+        Try to answer a follow-up question from the previous result.
+
+        Unless the client says whether the question refines the previous
+        result, a cheap word check decides whether the follow-up LLM call is
+        worth making, so new questions in a session go straight to the database.
+
+        Args:
+            session_id (str): The conversation id
+            question (str): The follow-up question
+            refine (bool): True to always try the previous result, False to
+                never try it (optional, guessed from the wording if None)
+            database (str): Key of the database the question is routed to (optional)
+
+        Returns:
+            dict: A /query-style result including the follow-up SQL, or None
+            if there is no previous result or the question cannot be
+            answered from it
+        """
+        if refine is False:
+            return None
+        session = self._get(session_id, database)
+        if session is None:
+            return None
+        if refine is None and not looks_like_refinement(question, session["columns"]):
+            return None
+
+        with self._lock:
+            refinement_sql = session["refinement_sql"]
+        sql_query = self.nl_to_sql_converter.convert_follow_up(
+            question,
+            session["columns"],
+            session["records"].head(SAMPLE_ROWS).to_dict(orient="records"),
+            session["question"],
+            refinement_sql,
+        )
+        if sql_query is None:
+            return None
+
+        try:
+            result_df = run_over_previous_result(sql_query, session["records"], session["columns"])
+        except Exception as e:
+            print(f"Error answering follow-up locally: {e}")
+            return None
+
+        with self._lock:
+            session["refinement_sql"] = sql_query
+            session["updated_at"] = time.time()
+        return {
+            "status": "success",
+            "message": "Query answered from the previous result",
+            "data": {
+                "records": result_df,
+                "columns": result_df.columns.tolist(),
+                "row_count": len(result_df),
+                "answered_from": PREVIOUS_RESULT_TABLE
+            },
+            "sql_query": sql_query
+        }
+
+
+# Guesses from the wording whether a question refines the previous result
+def looks_like_refinement(question, columns):
+    """
+    Decide whether a question is worth trying against the previous result.
+
+    Short questions that use a refinement word ("only", "sort", "top", ...),
+    continue the previous one ("and for 2017?", "what about Trek?") or name
+    one of the previous result's columns qualify.
+
+    Args:
+        question (str): The new question
+        columns (list): Columns of the previous result
+
+    Returns:
+        bool: True if the follow-up LLM call should be tried
+    """
+    text = question.strip().lower()
+    words = _WORD.findall(text)
+    if not words or len(words) > FOLLOW_UP_MAX_WORDS:
+        return False
+    if text.startswith(REFINEMENT_OPENERS) or REFINEMENT_WORDS.intersection(words):
+        return True
+    column_words = {word for column in columns for word in _WORD.findall(str(column).lower()) if len(word) > 2}
+    return bool(column_words.intersection(words))
+
+
+# Runs a query over cached records with an embedded DuckDB engine
+def run_over_previous_result(sql_query, records, columns):
+    """
+    Execute SQL over a cached result with DuckDB.
+
+    The engine runs with external access disabled, so the query can only
+    read the registered previous_result table.
+
+    Args:
+        sql_query (str): SQL reading from previous_result
+        records (pd.DataFrame): The cached records
+        columns (list): Column names of the cached records
+
+    Returns:
+        pd.DataFrame: The query result, with NULLs as None and dates as ISO strings
+    """
+    import duckdb
+
+    frame = pd.DataFrame(records, columns=columns)
+    # ISO date strings become real dates so EXTRACT/date comparisons work in follow-ups
+    for column in frame.columns:
+        if pd.api.types.is_object_dtype(frame[column]) or pd.api.types.is_string_dtype(frame[column]):
+            values = frame[column].dropna()
+            if len(values) and values.map(lambda value: isinstance(value, str) and bool(_ISO_DATE.match(value))).all():
+                frame[column] = pd.to_datetime(frame[column], format="%Y-%m-%d")
+
+    connection = duckdb.connect()
+    try:
+        connection.execute("SET enable_external_access = false")
+        connection.register(PREVIOUS_RESULT_TABLE, frame)
+        result_df = connection.execute(sql_query).df()
+    finally:
+        connection.close()
+
+    for column in result_df.columns:
+        if pd.api.types.is_datetime64_any_dtype(result_df[column]):
+            result_df[column] = result_df[column].dt.strftime("%Y-%m-%d")
+    return result_df.astype(object).where(result_df.notna(), None)
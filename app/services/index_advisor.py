@@ -0,0 +1,339 @@
+import os
+import re
+import time
+import argparse
+import threading
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+from ..database.connection import DatabaseConnection
+from .sql_parsing import IDENT, NUMBER, OP, STRING, tokenize, render, is_keyword, split_identifier
+
+# Load environment variables
+load_dotenv()
+
+# Scratch copy of the database used to cost candidate indexes when HypoPG is not installed
+INDEX_ADVISOR_SCRATCH_URL = os.getenv("INDEX_ADVISOR_SCRATCH_URL")
+
+# Number of distinct statement shapes kept by the collector
+MAX_COLLECTED_STATEMENTS = 500
+
+# Keywords that can follow a table name in FROM/JOIN instead of an alias
+_NON_ALIAS_KEYWORDS = {
+    "where", "join", "inner", "left", "right", "full", "cross", "natural", "on", "using",
+    "group", "order", "having", "limit", "offset", "union", "intersect", "except", "window",
+}
+
+_RANGE_OPERATORS = {"<", ">", "<=", ">=", "between", "like", "ilike"}
+_EQUALITY_OPERATORS = {"=", "in", "is"}
+
+
+class StatementCollector:
+    """
+    Thread-safe, bounded record of the SQL statements the service executes.
+
+    Statements are grouped by shape (literals replaced with placeholders);
+    one concrete example is kept per shape so it can be passed to EXPLAIN.
+    """
+
+    def __init__(self, max_statements=MAX_COLLECTED_STATEMENTS):
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._statements = {}
+
+    # Records one execution of a statement and how long it took
+    def record(self, sql_query, elapsed_ms):
+        fingerprint = fingerprint_statement(sql_query)
+        if fingerprint is None:
+            return
+        with self._lock:
+            entry = self._statements.get(fingerprint)
+            if entry is None:
+                if len(self._statements) >= self.max_statements:
+                    # Make room by forgetting the least frequent statement shape
+                    rarest = min(self._statements, key=lambda key: self._statements[key]["count"])
+                    del self._statements[rarest]
+                entry = self._statements[fingerprint] = {"sql_query": sql_query, "count": 0, "total_ms": 0.0}
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+
+    # Returns a snapshot of the collected statements
+    def statements(self):
+        with self._lock:
+            return [dict(entry) for entry in self._statements.values()]
+
+
+# Replaces literals in a SELECT statement so executions with different values group together
+def fingerprint_statement(sql_query):
+    tokens = tokenize(sql_query)
+    if not tokens or not is_keyword(tokens[0], "select"):
+        return None
+    return render([(kind, "?") if kind in (STRING, NUMBER) else (kind, value) for kind, value in tokens])
+
+
+class IndexAdvisor:
+    def __init__(self, db_connection=None, scratch_url=INDEX_ADVISOR_SCRATCH_URL):
+        self.db_connection = db_connection or DatabaseConnection()
+        self.engine = self.db_connection.engine
+        self.scratch_engine = create_engine(scratch_url) if scratch_url else None
+
+    # Loads column names per table for resolving unqualified column references
+    def _load_columns(self, connection):
+        rows = connection.execute(text("""
+            SELECT table_name, column_name
+            FROM information_schema.columns
+            WHERE table_schema = 'public'
+        """)).fetchall()
+        columns = {}
+        for row in rows:
+            columns.setdefault(row.table_name, set()).add(row.column_name)
+        return columns
+
+    # Loads the column lists of existing indexes so covered candidates can be skipped
+    def _load_existing_indexes(self, connection):
+        rows = connection.execute(text("SELECT tablename, indexdef FROM pg_indexes WHERE schemaname = 'public'")).fetchall()
+        indexes = {}
+        for row in rows:
+            match = re.search(r"\(([^()]*)\)\s*$", row.indexdef)
+            if match:
+                columns = tuple(column.strip().strip('"') for column in match.group(1).split(","))
+                indexes.setdefault(row.tablename, []).append(columns)
+        return indexes
+
+    # Only reads the catalog; installing the extension is left to the operator
+    def _has_hypopg(self, connection):
+        try:
+            return bool(connection.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")).scalar())
+        except Exception:
+            connection.rollback()
+            return False
+
+    # Estimates the planner cost of a statement
+    def _explain_cost(self, connection, sql_query):
+        try:
+            # A savepoint keeps a failing statement from aborting the candidate index under test
+            with connection.begin_nested():
+                plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql_query}")).scalar()
+            return plan[0]["Plan"]["Total Cost"]
+        except Exception:
+            return None
+
+    def recommend(self, statements, top_n=10):
+        """
+        Rank candidate indexes for a workload by estimated planner cost savings.
+
+        Candidate columns come from the join conditions, filters and
+        GROUP BY/ORDER BY clauses of the statements. Each candidate is costed
+        with a HypoPG hypothetical index when the extension is available,
+        otherwise by building it inside a rolled-back transaction on the
+        scratch database.
+
+        Args:
+            statements (list): Dicts with "sql_query" and "count" keys, as
+                returned by StatementCollector.statements()
+            top_n (int): Maximum number of recommendations to return
+
+        Returns:
+            dict: A dictionary with the costing "method" used and the ranked
+            "recommendations", or an "error" message
+        """
+        with self.engine.connect() as connection:
+            columns = self._load_columns(connection)
+            existing = self._load_existing_indexes(connection)
+            use_hypopg = self._has_hypopg(connection)
+
+        if not use_hypopg and self.scratch_engine is None:
+            return {
+                "method": None,
+                "error": (
+                    "HypoPG is not installed; run CREATE EXTENSION hypopg as a database owner, "
+                    "or set INDEX_ADVISOR_SCRATCH_URL to cost candidates with real indexes"
+                ),
+                "recommendations": [],
+            }
+
+        candidates = {}
+        for statement in statements:
+            for candidate in extract_index_candidates(statement["sql_query"], columns):
+                table, index_columns = candidate
+                if any(existing_columns[:len(index_columns)] == index_columns for existing_columns in existing.get(table, [])):
+                    continue
+                candidates.setdefault(candidate, []).append(statement)
+
+        engine = self.engine if use_hypopg else self.scratch_engine
+        recommendations = []
+        with engine.connect() as connection:
+            baseline = {}
+            for statement in statements:
+                baseline[statement["sql_query"]] = self._explain_cost(connection, statement["sql_query"])
+
+            for (table, index_columns), affected in candidates.items():
+                ddl = f"CREATE INDEX ON {table} ({', '.join(index_columns)})"
+                if use_hypopg:
+                    connection.execute(text("SELECT * FROM hypopg_create_index(:ddl)"), {"ddl": ddl})
+                else:
+                    connection.execute(text(ddl))
+
+                before = after = 0.0
+                best_speedup = 1.0
+                for statement in affected:
+                    old_cost = baseline.get(statement["sql_query"])
+                    new_cost = self._explain_cost(connection, statement["sql_query"]) if old_cost else None
+                    if not old_cost or new_cost is None:
+                        continue
+                    before += old_cost * statement["count"]
+                    after += new_cost * statement["count"]
+                    best_speedup = max(best_speedup, old_cost / max(new_cost, 0.01))
+
+                if use_hypopg:
+                    connection.execute(text("SELECT hypopg_reset()"))
+                else:
+                    connection.rollback()
+
+                if after < before:
+                    name = f"idx_{table}_{'_'.join(index_columns)}"
+                    recommendations.append({
+                        "create_index": f"CREATE INDEX {name} ON {table} ({', '.join(index_columns)});",
+                        "table": table,
+                        "columns": list(index_columns),
+                        "statements": len(affected),
+                        "workload_cost_before": round(before, 2),
+                        "workload_cost_after": round(after, 2),
+                        "expected_speedup": round(before / max(after, 0.01), 2),
+                        "best_statement_speedup": round(best_speedup, 2),
+                    })
+
+        recommendations.sort(key=lambda item: item["workload_cost_before"] - item["workload_cost_after"], reverse=True)
+        return {
+            "method": "hypopg" if use_hypopg else "scratch",
+            "recommendations": recommendations[:top_n],
+        }
+
+
+# Maps the aliases used in a statement to table names
+def _table_aliases(tokens, columns):
+    aliases = {}
+    for index, token in enumerate(tokens[:-1]):
+        if not (is_keyword(token, "from") or is_keyword(token, "join") or token == (OP, ",")):
+            continue
+        table_token = tokens[index + 1]
+        if table_token[0] != IDENT or table_token[1] not in columns:
+            continue
+        alias = table_token[1]
+        position = index + 2
+        if position < len(tokens) and is_keyword(tokens[position], "as"):
+            position += 1
+        if position < len(tokens) and tokens[position][0] == IDENT and tokens[position][1] not in _NON_ALIAS_KEYWORDS:
+            alias = tokens[position][1]
+        aliases[alias] = table_token[1]
+    return aliases
+
+
+# Finds the columns a statement joins, filters, groups and sorts on and turns them into index candidates
+def extract_index_candidates(sql_query, columns):
+    """
+    Derive candidate indexes from a statement's predicates and join columns.
+
+    Args:
+        sql_query (str): The SQL statement
+        columns (dict): Table name mapped to its set of column names
+
+    Returns:
+        set: (table, columns tuple) pairs
+    """
+    tokens = tokenize(sql_query)
+    if not tokens:
+        return set()
+    aliases = _table_aliases(tokens, columns)
+
+    def resolve(value):
+        qualifier, column = split_identifier(value)
+        if qualifier is not None:
+            table = aliases.get(qualifier)
+            return (table, column) if table and column in columns.get(table, ()) else None
+        tables = {table for table in aliases.values() if column in columns.get(table, ())}
+        return (tables.pop(), column) if len(tables) == 1 else None
+
+    usage = {}
+    clause = None
+    functions = []
+    for index, (kind, value) in enumerate(tokens):
+        if value == "(" and kind == OP:
+            functions.append(tokens[index - 1][1] if index > 0 else None)
+        elif value == ")" and kind == OP and functions:
+            functions.pop()
+        # FROM inside EXTRACT(... FROM col) and similar does not start a clause
+        if kind == IDENT and value == "from" and functions and functions[-1] in ("extract", "substring", "trim", "overlay", "position"):
+            continue
+        if kind == IDENT and value in ("select", "from", "where", "on", "having"):
+            clause = value
+            continue
+        if kind == IDENT and value in ("group", "order") and index + 1 < len(tokens) and is_keyword(tokens[index + 1], "by"):
+            clause = "sort"
+            continue
+        if kind != IDENT or clause not in ("where", "on", "having", "sort"):
+            continue
+        resolved = resolve(value)
+        if resolved is None:
+            continue
+
+        previous = tokens[index - 1][1] if index > 0 else None
+        following = tokens[index + 1][1] if index + 1 < len(tokens) else None
+        other = None
+        if following == "=" and index + 2 < len(tokens):
+            other = tokens[index + 2]
+        elif previous == "=" and index >= 2:
+            other = tokens[index - 2]
+        if clause == "sort":
+            role = "sort"
+        elif clause == "on" or (other is not None and other[0] == IDENT and resolve(other[1]) is not None):
+            role = "join"
+        elif following in _EQUALITY_OPERATORS or previous in _EQUALITY_OPERATORS:
+            role = "equality"
+        elif following in _RANGE_OPERATORS or previous in _RANGE_OPERATORS:
+            role = "range"
+        else:
+            continue
+        usage.setdefault(resolved[0], {}).setdefault(role, [])
+        if resolved[1] not in usage[resolved[0]][role]:
+            usage[resolved[0]][role].append(resolved[1])
+
+    candidates = set()
+    for table, roles in usage.items():
+        for role_columns in roles.values():
+            candidates.update((table, (column,)) for column in role_columns)
+        # Equality columns first, then one range column, matches how a B-tree can be used
+        equality = sorted(roles.get("equality", []))
+        composite = equality + roles.get("range", [])[:1]
+        if len(composite) > 1:
+            candidates.add((table, tuple(composite)))
+    return candidates
+
+
+# Reads statements from a file, one per line or separated by semicolons
+def read_statements(path):
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+    separator = ";" if ";" in content else "\n"
+    counts = {}
+    for statement in content.split(separator):
+        statement = " ".join(statement.split())
+        if statement:
+            counts[statement] = counts.get(statement, 0) + 1
+    return [{"sql_query": statement, "count": count} for statement, count in counts.items()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recommend indexes for a workload of SQL statements")
+    parser.add_argument("statements_file", help="File with the SQL statements to analyse")
+    parser.add_argument("--scratch-url", default=INDEX_ADVISOR_SCRATCH_URL, help="Database URL of a scratch copy used when HypoPG is not available")
+    parser.add_argument("--top", type=int, default=10, help="Number of recommendations to print")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    advice = IndexAdvisor(scratch_url=args.scratch_url).recommend(read_statements(args.statements_file), args.top)
+    if advice.get("error"):
+        print(advice["error"])
+    for recommendation in advice["recommendations"]:
+        print(f"{recommendation['create_index']}  -- expected speedup {recommendation['expected_speedup']}x "
+              f"over {recommendation['statements']} statement(s)")
+    print(f"Costed with {advice['method']} in {time.perf_counter() - started:.2f}s")
@@ -1,12 +1,16 @@
 import os
+import time
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_community.utilities import SQLDatabase
 from langchain_community.agent_toolkits.sql.base import create_sql_agent
 from langchain_community.agent_toolkits.sql.toolkit import SQLDatabaseToolkit
 from langchain.agents.agent_types import AgentType
-from ..database.connection import DatabaseConnection
+from langchain_core.callbacks import BaseCallbackHandler
+from ..database.connection import DatabaseConnection, dispose_after_fork
 from ..database.schema import get_schema_as_text
+from .trace_store import TraceStore
+from .example_index import ExampleIndex, format_examples
 
 # Load environment variables
 load_dotenv()
@@ -14,22 +18,89 @@ load_dotenv()
 # OpenAI API key
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-class LangChainService:
+# Print every agent chain step to stdout (slow for multi-step runs, meant for debugging)
+LANGCHAIN_VERBOSE = os.getenv("LANGCHAIN_VERBOSE", "false").lower() == "true"
+
+# Name of the toolkit tool that executes SQL against the database
+SQL_QUERY_TOOL = "sql_db_query"
+
+# Characters of each tool output kept in a trace
+TRACE_OUTPUT_PREVIEW_CHARS = 200
+
+class AgentTraceRecorder(BaseCallbackHandler):
+    """
+    Callback handler that records each tool call of an agent run as a
+    compact step: tool name, input, output size and duration.
+    """
+
     def __init__(self):
-        self.db_connection = DatabaseConnection()
+        self.steps = []
+        self._pending = {}
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name")
+        self._pending[run_id] = (name, input_str, time.perf_counter())
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish(run_id, str(output), None)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, "", str(error))
+
+    def _finish(self, run_id, output, error):
+        name, input_str, started = self._pending.pop(run_id, (None, None, time.perf_counter()))
+        step = {
+            "tool": name,
+            "input": input_str,
+            "output_chars": len(output),
+            "output_preview": output[:TRACE_OUTPUT_PREVIEW_CHARS],
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+        if error is not None:
+            step["error"] = error
+        self.steps.append(step)
+
+    # Returns the last SQL statement the agent executed
+    def last_sql_query(self):
+        for step in reversed(self.steps):
+            if step["tool"] == SQL_QUERY_TOOL and step.get("error") is None:
+                return step["input"]
+        return None
+
+class LangChainService:
+    def __init__(self, example_index=None, db_connection=None, schema_text=None, trace_store=None):
+        # Without a connection the service talks to the database in DATABASE_URI
+        self.db_connection = db_connection or DatabaseConnection()
+        
+        # Agent steps are kept out of responses and fetched by trace id
+        self.trace_store = trace_store or TraceStore()
+        
+        # Verified question/SQL pairs given to the agent as a starting point
+        self.example_index = example_index or ExampleIndex()
         
         # Setup for LangChain SQL interaction
         self.db_uri = os.getenv("DATABASE_URI")  # Make sure this is set in your .env file
-        self.schema_text = get_schema_as_text()
+        self.schema_text = schema_text or get_schema_as_text()
 
         try:
-            if self.db_uri:
+            if db_connection is not None or self.db_connection.embedded:
+                # Share the routed (or embedded) database's engine instead of opening a second pool
+                self.db = SQLDatabase(
+                    self.db_connection.engine,
+                    include_tables=None,
+                    sample_rows_in_table_info=3,
+                )
+            elif self.db_uri:
                 self.db = SQLDatabase.from_uri(
                     self.db_uri,
                     include_tables=None,  # Include all tables
                     sample_rows_in_table_info=3,  # Number of sample rows to include in table info
                 )
-                
+                dispose_after_fork(self.db._engine)
+            else:
+                self.db = None
+            
+            if self.db is not None:
                 self.llm = ChatOpenAI(
                     api_key=OPENAI_API_KEY,
                     model="gpt-4-turbo-preview",
@@ -46,7 +117,7 @@ class LangChainService:
                 self.agent = create_sql_agent(
                     llm=self.llm,
                     toolkit=self.toolkit,
-                    verbose=True,
+                    verbose=LANGCHAIN_VERBOSE,
                     agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
                     top_k=10  # Show only top-k tables for in case of many tables
                 )
@@ -80,6 +151,15 @@ class LangChainService:
             }
         
         try:
+            # Record tool calls as they happen instead of stringifying the intermediate steps afterwards
+            recorder = AgentTraceRecorder()
+            
+            # Similar verified queries let the agent start from known-good SQL instead of exploring the schema
+            examples = self.example_index.search(natural_language_query)
+            example_text = ""
+            if examples:
+                example_text = "Verified SQL for similar questions (adapt it rather than exploring the schema):\n\n" + format_examples(examples)
+            
             # Execute the query with the agent
             result = self.agent.invoke({
                 "input": f"""
@@ -90,27 +170,20 @@ class LangChainService:
                     - EXTRACT(YEAR FROM order_date)
                     - DATE_PART('day', ship_date - order_date)
                     
+                    {example_text}
+                    
                     Generate and execute an efficient SQL query to answer the following question:
                     
                     Question: {natural_language_query}
                     
                     Return only the SQL query and the results, without additional explanations.
                     """
-            })
+            }, config={"callbacks": [recorder]})
             
-            # Extract the result and any intermediate SQL queries
+            # Extract the result and the SQL the agent last executed
             output = result.get("output", "No output")
-            
-            # Try to extract the SQL query from the agent's thoughts
-            sql_query = "SQL query not visible in agent's output"
-            for action in result.get("intermediate_steps", []):
-                if "query" in str(action).lower() or "select" in str(action).lower():
-                    try:
-                        sql_parts = str(action).split("```sql")
-                        if len(sql_parts) > 1:
-                            sql_query = sql_parts[1].split("```")[0].strip()
-                    except:
-                        pass
+            sql_query = recorder.last_sql_query() or "SQL query not visible in agent's output"
+            trace_id = self.trace_store.add(natural_language_query, recorder.steps)
             
             return {
                 "status": "success",
@@ -118,7 +191,8 @@ class LangChainService:
                 "data": {
                     "result": output,
                     "sql_query": sql_query,
-                    "full_trace": str(result.get("intermediate_steps", "No trace available"))
+                    "trace_id": trace_id,
+                    "trace_steps": len(recorder.steps)
                 }
             }
         
@@ -150,7 +224,7 @@ class LangChainService:
         
         try:
             # Get the schema
-            schema = get_schema_as_text()
+            schema = self.schema_text
             
             # Create a prompt
             prompt = f"""
@@ -184,8 +258,8 @@ class LangChainService:
             
             sql_query = sql_query.strip()
             
-            # Execute the query
-            result = self.db.run(sql_query)
+            # Execute the query, translated for DuckDB/SQLite when the database is embedded (the agent then shares its engine)
+            result = self.db.run(self.db_connection.transpile(sql_query) if self.db_connection.embedded else sql_query)
             
             return {
                 "status": "success",
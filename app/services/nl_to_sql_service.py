@@ -5,6 +5,7 @@ from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 from dotenv import load_dotenv
 from app.database.schema import get_schema_as_text
+from app.services.example_index import ExampleIndex, format_examples
 
 # Load environment variables
 load_dotenv()
@@ -13,7 +14,7 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 class NLToSQLConverter:
-    def __init__(self):
+    def __init__(self, example_index=None):
         # Initialize the LangChain LLM
         self.llm = ChatOpenAI(
             api_key=OPENAI_API_KEY,
@@ -89,26 +90,89 @@ class NLToSQLConverter:
         
         # Create the chain
         self.chain = (
-            RunnablePassthrough.assign(schema=lambda _: self.schema_text)
+            RunnablePassthrough.assign(schema=lambda inputs: inputs.get("schema_text") or self.schema_text)
             | self.prompt
             | self.llm
             | StrOutputParser()
         )
+        
+        # Verified question/SQL pairs retrieved for each question
+        self.example_index = example_index or ExampleIndex()
+        
+        # Compact prompt used when similar verified examples exist; the examples replace the generic guidelines
+        self.few_shot_template = """
+            You are an expert PostgreSQL engineer. Convert the question into a PostgreSQL query for the BikeStores database:
+
+            {schema}
+
+            Verified examples of questions and their correct SQL for this database:
+
+            {examples}
+
+            Question: "{question}"
+
+            - Use only tables and columns from the schema; table names use underscores, e.g. production_products
+            - Follow the examples for joins, date handling and aggregation
+            - If the requested information is not in the schema, return: "ERROR: The requested information about [topic] is not available in this database schema."
+            - If the input is not related to the BikeStores database, return: "ERROR: This input is not related to the BikeStores database."
+
+            Output ONLY the SQL query, without explanations, comments or markdown.
+            """
+        self.few_shot_chain = (
+            RunnablePassthrough.assign(schema=lambda inputs: inputs.get("schema_text") or self.schema_text)
+            | ChatPromptTemplate.from_template(self.few_shot_template)
+            | self.llm
+            | StrOutputParser()
+        )
+        
+        # Short prompt for refining a previous result; it only needs that result's columns, not the whole schema
+        self.follow_up_template = """
+            You are refining the result of a previous query. That result is available as a table named previous_result with these columns:
+
+            {columns}
+
+            Sample rows:
+            {sample_rows}
+
+            The result answered the question: "{previous_question}"
+            {previous_refinement}
+
+            Write a DuckDB SQL query that reads only from previous_result and answers this follow-up request:
+
+            "{question}"
+
+            If the request needs data that is not in previous_result, return exactly: NOT_POSSIBLE
+            Only return the SQL query without any explanations, comments, or additional text.
+            """
+        self.follow_up_chain = (
+            ChatPromptTemplate.from_template(self.follow_up_template)
+            | self.llm
+            | StrOutputParser()
+        )
     
     # Transforms natural language queries into SQL queries using a language model chain
-    def convert_to_sql(self, natural_language_query):
+    def convert_to_sql(self, natural_language_query, schema_text=None):
         """
         Convert a natural language query to SQL.
         
         Args:
             natural_language_query (str): The natural language query to convert
+            schema_text (str): Schema of the database the query is routed to (optional, BikeStores by default)
             
         Returns:
             str: The SQL query
         """
         try:
-            # Run the chain
-            sql_query = self.chain.invoke({"question": natural_language_query})
+            # Run the chain, with the closest verified examples when there are any
+            examples = self.example_index.search(natural_language_query)
+            if examples:
+                sql_query = self.few_shot_chain.invoke({
+                    "question": natural_language_query,
+                    "examples": format_examples(examples),
+                    "schema_text": schema_text
+                })
+            else:
+                sql_query = self.chain.invoke({"question": natural_language_query, "schema_text": schema_text})
             
             # Extract and clean the SQL query
             # sql_query = sql_query.strip()
@@ -118,4 +182,41 @@ class NLToSQLConverter:
         
         except Exception as e:
             print(f"Error converting to SQL: {e}")
-            return f"ERROR: Failed to convert query: {str(e)}"
\ No newline at end of file
+            return f"ERROR: Failed to convert query: {str(e)}"
+    
+    # Turns a follow-up request into SQL over the previous result, if it can be answered from it
+    def convert_follow_up(self, natural_language_query, columns, sample_rows, previous_question, previous_refinement_sql=None):
+        """
+        Convert a follow-up request into SQL over the previous result set.
+        
+        Args:
+            natural_language_query (str): The follow-up request
+            columns (list): Column names of the previous result
+            sample_rows (list): A few records of the previous result
+            previous_question (str): The question the previous result answered
+            previous_refinement_sql (str): The last follow-up SQL run over that result (optional)
+            
+        Returns:
+            str: SQL over the previous_result table, or None if the request needs the database
+        """
+        previous_refinement = ""
+        if previous_refinement_sql:
+            previous_refinement = f"The last refinement applied to it was: {previous_refinement_sql}\nBuild on it if the new request refines it further."
+        
+        try:
+            sql_query = self.follow_up_chain.invoke({
+                "columns": ", ".join(columns),
+                "sample_rows": "\n".join(str(row) for row in sample_rows),
+                "previous_question": previous_question,
+                "previous_refinement": previous_refinement,
+                "question": natural_language_query
+            })
+            sql_query = sql_query.strip().strip("```sql").strip("```").strip()
+            
+            if not sql_query or "NOT_POSSIBLE" in sql_query:
+                return None
+            return sql_query
+        
+        except Exception as e:
+            print(f"Error converting follow-up to SQL: {e}")
+            return None
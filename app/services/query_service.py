@@ -1,8 +1,12 @@
 import os
+import time
 from dotenv import load_dotenv
 # from langchain_openai import ChatOpenAI
 # from langchain_community.utilities import SQLDatabase
 from ..database.connection import DatabaseConnection
+from .rollup_service import RollupService
+from .index_advisor import StatementCollector
+from .approximate_query import ApproximateQueryService
 
 # Load environment variables
 load_dotenv()
@@ -11,11 +15,20 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 class QueryService:
-    def __init__(self):
-        self.db_connection = DatabaseConnection()
+    def __init__(self, db_connection=None):
+        self.db_connection = db_connection or DatabaseConnection()
         
         # Setup for direct SQL execution
         self.db_uri = os.getenv("DATABASE_URI")  # Make sure this is set in your .env file
+        
+        # Pre-aggregated sales rollups that matching aggregate queries are redirected to
+        self.rollup_service = RollupService(self.db_connection)
+        
+        # Executed statements, kept for the index advisor
+        self.statement_collector = StatementCollector()
+        
+        # Sampled execution of aggregate queries for approximate answers
+        self.approximate_service = ApproximateQueryService(self.db_connection)
     
     # Processes natural language queries by converting them to SQL and executing them against the database
     def execute_nl_query(self, natural_language_query, nl_to_sql_service=None):
@@ -68,19 +81,46 @@ class QueryService:
             }
     
     # Executes SQL queries and returns the results in a structured format with metadata
-    def execute_sql_query(self, sql_query):
+    def execute_sql_query(self, sql_query, approximate=False):
         """
         Execute a SQL query and return the results.
         
         Args:
             sql_query (str): The SQL query to execute
+            approximate (bool): Answer eligible aggregate queries over large
+                tables from a sample, with error bounds (optional)
             
         Returns:
-            dict: A dictionary containing the query results and metadata
+            dict: A dictionary containing the query results and metadata; the
+            records are a DataFrame, serialized with result_to_json()
         """
         try:
+            started = time.perf_counter()
+            
+            # Answer aggregate queries from a rollup table when it gives the same result
+            # (rollups and table samples rely on PostgreSQL, so embedded databases always run the query as written)
+            rollup = None
+            rewrite = None if self.db_connection.embedded else self.rollup_service.rewrite(sql_query)
+            if rewrite is not None:
+                rewritten_sql, rollup = rewrite
+                result_df = self.db_connection.execute_query(rewritten_sql)
+                if result_df is None:
+                    # Fall back to the original query if the rollup could not be read
+                    rollup = None
+            
+            # A rollup answer is exact and fast, so sampling is only tried without one
+            sample = None
+            if rollup is None and approximate and not self.db_connection.embedded:
+                sample = self.approximate_service.rewrite(sql_query)
+                if sample is not None:
+                    sampled_sql, sample_info = sample
+                    result_df = self.db_connection.execute_query(sampled_sql)
+                    if result_df is None:
+                        sample = None
+            
             # Execute the query
-            result_df = self.db_connection.execute_query(sql_query)
+            if rollup is None and sample is None:
+                result_df = self.db_connection.execute_query(sql_query)
             
             if result_df is None:
                 return {
@@ -89,6 +129,8 @@ class QueryService:
                     "data": None
                 }
             
+            self.statement_collector.record(sql_query, (time.perf_counter() - started) * 1000)
+            
             if result_df.empty and sql_query.strip().lower().startswith(("select", "show")):
                 return {
                     "status": "success",
@@ -100,22 +142,31 @@ class QueryService:
                     }
                 }
             
-            # Convert the DataFrame to a dictionary
+            # The DataFrame is kept as is, so the response encodes its typed columns directly
             if not result_df.empty:
-                records = result_df.to_dict(orient="records")
+                records = result_df
                 columns = result_df.columns.tolist()
             else:
                 records = []
                 columns = []
             
+            data = {
+                "records": records,
+                "columns": columns,
+                "row_count": len(records)
+            }
+            if rollup is not None:
+                data["rollup"] = {"table": rollup, "sql_query": rewritten_sql}
+            if sample is not None:
+                data["approximate"] = dict(sample_info, sql_query=sampled_sql)
+            
             return {
                 "status": "success",
-                "message": "Query executed successfully",
-                "data": {
-                    "records": records,
-                    "columns": columns,
-                    "row_count": len(records)
-                }
+                "message": (
+                    f"Approximate result from a {sample_info['sample_percent']:g}% sample of {sample_info['sampled_table']}"
+                    if sample is not None else "Query executed successfully"
+                ),
+                "data": data
             }
             
         except Exception as e:
@@ -0,0 +1,703 @@
+import json
+import argparse
+from decimal import Decimal, ROUND_HALF_UP
+import pandas as pd
+from sqlalchemy import text
+from dotenv import load_dotenv
+from ..database.connection import DatabaseConnection
+from .sql_parsing import (
+    IDENT, NUMBER, OP, QUOTED_IDENT,
+    tokenize, render, is_keyword, split_clauses, split_top_level,
+    find_closing_paren, parse_inner_joins, strip_terminators, strip_alias, contains_aggregate, unwrap_round,
+)
+
+# Load environment variables
+load_dotenv()
+
+REGISTRY_TABLE = "registered_queries"
+
+# The registry relies on PostgreSQL (row locks, to_regclass, ALTER ... IF NOT EXISTS)
+EMBEDDED_MESSAGE = "Registered queries need a PostgreSQL database"
+
+# Columns that only grow as rows are added, per base table, in order of preference
+WATERMARK_COLUMNS = {
+    "sales_orders": ["order_id", "order_date"],
+    "sales_order_items": ["order_id"],
+}
+
+# Aggregates whose partial results over disjoint row sets can be combined
+MERGEABLE_AGGREGATES = {"sum", "count", "min", "max", "avg"}
+
+# How the partial results of each mergeable aggregate are combined
+MERGE_FUNCTIONS = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+
+# Aggregates that cannot be computed from partial results
+NON_MERGEABLE_AGGREGATES = {
+    "string_agg", "array_agg", "json_agg", "jsonb_agg", "json_object_agg", "jsonb_object_agg",
+    "stddev", "stddev_pop", "stddev_samp", "variance", "var_pop", "var_samp",
+    "bit_and", "bit_or", "bool_and", "bool_or", "every", "percentile_cont",
+    "percentile_disc", "mode",
+}
+
+# Functions whose value depends on when the query runs
+VOLATILE_FUNCTIONS = {
+    "now", "current_date", "current_time", "current_timestamp", "localtime", "localtimestamp",
+    "clock_timestamp", "statement_timestamp", "transaction_timestamp", "random", "age",
+}
+
+
+class _NotIncremental(Exception):
+    """Raised internally when a query cannot be refreshed incrementally."""
+
+
+class RegisteredQueryService:
+    """
+    Keeps the result of recurring dashboard queries up to date.
+
+    Aggregate queries over the order tables are stored as merged partial
+    aggregates together with a watermark (the highest order_id or
+    order_date seen). A refresh only aggregates rows above the watermark
+    and merges them into the stored result, so its cost follows the amount
+    of new data. Queries that cannot be merged are re-run in full.
+    """
+
+    def __init__(self, db_connection=None):
+        self.db_connection = db_connection or DatabaseConnection()
+        self.engine = self.db_connection.engine
+
+    # Creates the registry table if needed
+    def create_table(self):
+        with self.engine.begin() as connection:
+            connection.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {REGISTRY_TABLE} (
+                    name VARCHAR(128) PRIMARY KEY,
+                    sql_query TEXT NOT NULL,
+                    watermark_column VARCHAR(64),
+                    watermark TEXT,
+                    columns TEXT,
+                    state TEXT,
+                    settled_state TEXT,
+                    refreshed_at TIMESTAMP
+                )
+            """))
+            # Registries created before boundary re-aggregation lack the partials below the watermark
+            connection.execute(text(f"ALTER TABLE {REGISTRY_TABLE} ADD COLUMN IF NOT EXISTS settled_state TEXT"))
+
+    # Registers (or replaces) a query and computes its first result
+    def register(self, name, sql_query, watermark_column=None):
+        """
+        Register a recurring query and compute its result.
+
+        Args:
+            name (str): Name the query is refreshed and fetched by
+            sql_query (str): The SELECT statement to keep up to date
+            watermark_column (str): Monotonic column to track, e.g. "order_date"
+                (optional, order_id is used by default)
+
+        Returns:
+            dict: The query result and how it will be refreshed
+        """
+        if self.db_connection.embedded:
+            return {"status": "error", "message": EMBEDDED_MESSAGE, "data": None}
+        # The query is later wrapped in a subquery, where a terminator is a syntax error
+        sql_query = strip_terminators(sql_query)
+        tokens = tokenize(sql_query)
+        if not tokens or not is_keyword(tokens[0], "select"):
+            return {"status": "error", "message": "Only SELECT statements can be registered", "data": None}
+        if watermark_column is not None and not any(watermark_column in columns for columns in WATERMARK_COLUMNS.values()):
+            return {"status": "error", "message": f"Unsupported watermark column: {watermark_column}", "data": None}
+
+        try:
+            self.create_table()
+            with self.engine.begin() as connection:
+                connection.execute(
+                    text(f"""
+                        INSERT INTO {REGISTRY_TABLE} (name, sql_query, watermark_column)
+                        VALUES (:name, :sql_query, :watermark_column)
+                        ON CONFLICT (name) DO UPDATE SET
+                            sql_query = EXCLUDED.sql_query,
+                            watermark_column = EXCLUDED.watermark_column,
+                            watermark = NULL, columns = NULL, state = NULL, settled_state = NULL, refreshed_at = NULL
+                    """),
+                    {"name": name, "sql_query": sql_query, "watermark_column": watermark_column},
+                )
+        except Exception as e:
+            print(f"Error registering query {name}: {e}")
+            return {"status": "error", "message": f"Error registering query: {str(e)}", "data": None}
+        return self.refresh(name, full=True)
+
+    # Brings a registered query up to date, aggregating only rows above its watermark
+    def refresh(self, name, full=False):
+        """
+        Refresh a registered query.
+
+        The registry row is locked for the duration of the refresh so
+        concurrent refreshes never merge the same rows twice. Rows at the
+        watermark value itself are re-aggregated on every refresh, so a
+        non-unique watermark such as order_date still picks up rows added
+        later with the same value. Rows added below the watermark (late
+        inserts), updates and deletes are only picked up by a full refresh.
+
+        Args:
+            name (str): The registered query
+            full (bool): Recompute the result from all rows
+
+        Returns:
+            dict: The refreshed result with its watermark
+        """
+        if self.db_connection.embedded:
+            return {"status": "error", "message": EMBEDDED_MESSAGE, "data": None}
+        try:
+            with self.engine.begin() as connection:
+                row = connection.execute(
+                    text(f"SELECT sql_query, watermark_column, watermark, columns, settled_state FROM {REGISTRY_TABLE} WHERE name = :name FOR UPDATE"),
+                    {"name": name},
+                ).fetchone()
+                if row is None:
+                    return {"status": "error", "message": f"No registered query named {name}", "data": None}
+
+                columns = json.loads(row.columns) if row.columns and not full else None
+                plan = plan_incremental_refresh(row.sql_query, row.watermark_column)
+                if "reason" not in plan and columns is None:
+                    columns = _output_columns(connection, row.sql_query)
+                plan = _check_columns(plan, columns)
+
+                new_groups = None
+                settled_state = None
+                if "reason" in plan:
+                    result_df = _fetch_frame(connection, row.sql_query)
+                    columns = result_df.columns.tolist()
+                    state = _to_records(result_df)
+                    watermark = None
+                else:
+                    watermark = connection.execute(
+                        text(f"SELECT MAX({plan['watermark_column']}) FROM {plan['watermark_table']}")
+                    ).scalar()
+                    watermark = None if watermark is None else str(watermark)
+
+                    stored_watermark = None
+                    settled = None
+                    if not full and row.watermark is not None and row.settled_state is not None:
+                        stored_watermark = row.watermark
+                        settled = pd.DataFrame(_load_json(row.settled_state), columns=plan["state_columns"])
+                        if watermark is None:
+                            watermark = stored_watermark
+
+                    settled, merged, new_groups = advance_partials(
+                        plan, lambda sql, parameters: _fetch_frame(connection, sql, parameters), watermark, stored_watermark, settled
+                    )
+                    settled_state = json.dumps(_to_records(settled), default=_json_value)
+                    state = _to_records(merged)
+
+                connection.execute(
+                    text(f"""
+                        UPDATE {REGISTRY_TABLE}
+                        SET watermark = :watermark, columns = :columns, state = :state, settled_state = :settled_state,
+                            refreshed_at = NOW()
+                        WHERE name = :name
+                    """),
+                    {
+                        "watermark": watermark, "columns": json.dumps(columns), "state": json.dumps(state, default=_json_value),
+                        "settled_state": settled_state, "name": name,
+                    },
+                )
+        except Exception as e:
+            print(f"Error refreshing registered query {name}: {e}")
+            return {"status": "error", "message": f"Error refreshing registered query: {str(e)}", "data": None}
+
+        result = self.get(name)
+        if result["status"] == "success":
+            result["data"]["registered_query"]["new_groups"] = new_groups
+        return result
+
+    # Refreshes every registered query, e.g. from a scheduled job
+    def refresh_all(self, full=False):
+        return {entry["name"]: self.refresh(entry["name"], full)["status"] for entry in self.list()}
+
+    # Returns the stored result of a registered query without touching the base tables
+    def get(self, name):
+        """
+        Fetch the stored result of a registered query.
+
+        Args:
+            name (str): The registered query
+
+        Returns:
+            dict: The query results and metadata
+        """
+        if self.db_connection.embedded:
+            return {"status": "error", "message": EMBEDDED_MESSAGE, "data": None}
+        try:
+            with self.engine.connect() as connection:
+                row = connection.execute(
+                    text(f"""
+                        SELECT sql_query, watermark_column, watermark, columns, state, refreshed_at
+                        FROM {REGISTRY_TABLE} WHERE name = :name
+                    """),
+                    {"name": name},
+                ).fetchone()
+        except Exception as e:
+            print(f"Error reading registered query {name}: {e}")
+            return {"status": "error", "message": f"Error reading registered query: {str(e)}", "data": None}
+        if row is None:
+            return {"status": "error", "message": f"No registered query named {name}", "data": None}
+        if row.state is None:
+            return {"status": "error", "message": f"Registered query {name} has not been refreshed yet", "data": None}
+
+        columns = json.loads(row.columns)
+        plan = _check_columns(plan_incremental_refresh(row.sql_query, row.watermark_column), columns)
+        records = _load_json(row.state)
+        if "reason" not in plan:
+            records = present_result(plan, pd.DataFrame(records, columns=plan["state_columns"]), columns)
+
+        return {
+            "status": "success",
+            "message": "Query executed successfully",
+            "data": {
+                "records": records,
+                "columns": columns,
+                "row_count": len(records),
+                "registered_query": {
+                    "name": name,
+                    "mode": "full" if "reason" in plan else "incremental",
+                    "reason": plan.get("reason"),
+                    "watermark_column": plan.get("watermark_column"),
+                    "watermark": row.watermark,
+                    "refreshed_at": str(row.refreshed_at) if row.refreshed_at else None,
+                },
+            },
+        }
+
+    # Lists the registered queries with their refresh mode and watermark
+    def list(self):
+        if self.db_connection.embedded:
+            return []
+        with self.engine.connect() as connection:
+            if not connection.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": REGISTRY_TABLE}).scalar():
+                return []
+            rows = connection.execute(
+                text(f"SELECT name, sql_query, watermark_column, watermark, columns, refreshed_at FROM {REGISTRY_TABLE} ORDER BY name")
+            ).fetchall()
+        entries = []
+        for row in rows:
+            plan = plan_incremental_refresh(row.sql_query, row.watermark_column)
+            if row.columns:
+                plan = _check_columns(plan, json.loads(row.columns))
+            entries.append({
+                "name": row.name,
+                "sql_query": row.sql_query,
+                "mode": "full" if "reason" in plan else "incremental",
+                "reason": plan.get("reason"),
+                "watermark_column": plan.get("watermark_column"),
+                "watermark": row.watermark,
+                "refreshed_at": str(row.refreshed_at) if row.refreshed_at else None,
+            })
+        return entries
+
+    # Removes a registered query and its stored result
+    def drop(self, name):
+        if self.db_connection.embedded:
+            return False
+        with self.engine.begin() as connection:
+            return connection.execute(text(f"DELETE FROM {REGISTRY_TABLE} WHERE name = :name"), {"name": name}).rowcount > 0
+
+
+# Works out how a query can be refreshed from new rows only
+def plan_incremental_refresh(sql_query, watermark_column=None):
+    """
+    Plan the incremental refresh of an aggregate query.
+
+    A query qualifies when it is a single SELECT over inner joins that
+    include an order table, every output column is either a GROUP BY key
+    or a SUM/COUNT/MIN/MAX/AVG aggregate (optionally wrapped in ROUND), and
+    ORDER BY/LIMIT only refer to output columns.
+
+    Args:
+        sql_query (str): The registered SQL query
+        watermark_column (str): Preferred watermark column (optional)
+
+    Returns:
+        dict: The plan, or {"reason": ...} explaining why the query has to be
+        re-run in full
+    """
+    try:
+        return _IncrementalPlanner(sql_query, watermark_column).plan()
+    except _NotIncremental as e:
+        return {"reason": str(e)}
+
+
+class _IncrementalPlanner:
+    def __init__(self, sql_query, watermark_column=None):
+        tokens = tokenize(sql_query)
+        if not tokens:
+            raise _NotIncremental("the query could not be parsed")
+        if sum(1 for token in tokens if is_keyword(token, "select")) != 1:
+            raise _NotIncremental("subqueries are not supported")
+        for index, token in enumerate(tokens):
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+            if token[0] == IDENT and token[1] in VOLATILE_FUNCTIONS:
+                raise _NotIncremental(f"the result depends on when it runs ({token[1]})")
+            if token[0] == IDENT and token[1] in NON_MERGEABLE_AGGREGATES and following == (OP, "("):
+                raise _NotIncremental(f"{token[1]}() cannot be merged")
+            if is_keyword(token, "over"):
+                raise _NotIncremental("window functions are not supported")
+        self.clauses = split_clauses(tokens)
+        if self.clauses is None or "from" not in self.clauses:
+            raise _NotIncremental("only a single SELECT ... FROM statement is supported")
+        if "having" in self.clauses:
+            raise _NotIncremental("HAVING is not supported")
+        self.watermark_column = watermark_column
+
+    def plan(self):
+        tables = parse_inner_joins(self.clauses["from"])
+        if not tables:
+            raise _NotIncremental("only tables combined with inner joins are supported")
+        watermark_table, watermark_alias, watermark_column = self._choose_watermark(tables)
+
+        items = [strip_alias(item) for item in split_top_level(self.clauses["select"])]
+        if not items[0][0] or is_keyword(items[0][0][0], "distinct"):
+            raise _NotIncremental("SELECT DISTINCT is not supported")
+
+        keys = []
+        components = []
+        outputs = []
+        for position, (expression, alias) in enumerate(items):
+            if not expression:
+                raise _NotIncremental("empty select item")
+            if contains_aggregate(expression):
+                outputs.append(self._aggregate_output(position, expression, components))
+            else:
+                key = f"_k{position}"
+                keys.append((key, expression))
+                outputs.append({"key": key})
+        if not components:
+            raise _NotIncremental("the query has no aggregates")
+
+        group_by = [self._resolve_output_reference(item, items) for item in split_top_level(self.clauses.get("group by", []))]
+        group_by = [item for item in group_by if item]
+        if sorted(render(expression) for _, expression in keys) != sorted(render(item) for item in group_by):
+            raise _NotIncremental("every GROUP BY expression must be an output column and vice versa")
+
+        select = [f"{render(expression)} AS {key}" for key, expression in keys]
+        select += [f"{component['sql']} AS {component['column']}" for component in components]
+        watermark = f"{watermark_alias}.{watermark_column}"
+
+        def component_sql(condition):
+            where = self.clauses.get("where")
+            sql = f"SELECT {', '.join(select)} FROM {render(self.clauses['from'])} WHERE "
+            sql += f"({render(where)}) AND {condition}" if where else condition
+            if keys:
+                sql += " GROUP BY " + ", ".join(render(expression) for _, expression in keys)
+            return sql
+
+        return {
+            "watermark_table": watermark_table,
+            "watermark_column": watermark_column,
+            # Rows below the watermark are settled; rows at it may still grow and are re-aggregated each refresh
+            "initial_sql": component_sql(f"{watermark} < :high"),
+            "delta_sql": component_sql(f"{watermark} >= :low AND {watermark} < :high"),
+            "boundary_sql": component_sql(f"{watermark} = :high"),
+            "keys": [key for key, _ in keys],
+            "components": [{key: component[key] for key in ("column", "merge", "empty")} for component in components],
+            "state_columns": [key for key, _ in keys] + [component["column"] for component in components],
+            "outputs": outputs,
+            "order_by": self._order_by(items),
+            "limit": self._count_clause("limit"),
+            "offset": self._count_clause("offset"),
+        }
+
+    def _choose_watermark(self, tables):
+        for table, columns in WATERMARK_COLUMNS.items():
+            entries = [entry for entry in tables if entry["table"] == table]
+            if len(entries) > 1:
+                raise _NotIncremental(f"{table} is joined more than once")
+            if not entries:
+                continue
+            if self.watermark_column is None:
+                return table, entries[0]["alias"], columns[0]
+            if self.watermark_column in columns:
+                return table, entries[0]["alias"], self.watermark_column
+        raise _NotIncremental("no joined table has a usable watermark column")
+
+    # Splits SUM/COUNT/MIN/MAX/AVG (optionally inside ROUND) into mergeable partial aggregates
+    def _aggregate_output(self, position, expression, components):
+        unwrapped = unwrap_round(expression)
+        if unwrapped is None:
+            raise _NotIncremental(f"unsupported aggregate expression: {render(expression)}")
+        expression, digits = unwrapped
+
+        if not (len(expression) > 3 and expression[0][0] == IDENT and expression[0][1] in MERGEABLE_AGGREGATES
+                and expression[1] == (OP, "(") and find_closing_paren(expression, 1) == len(expression) - 1):
+            raise _NotIncremental(f"unsupported aggregate expression: {render(expression)}")
+        function = expression[0][1]
+        arguments = expression[2:-1]
+        if is_keyword(arguments[0], "distinct") or contains_aggregate(arguments):
+            raise _NotIncremental(f"{render(expression)} cannot be merged")
+
+        parts = ["sum", "count"] if function == "avg" else [function]
+        columns = []
+        for part in parts:
+            column = f"_a{position}_{part}"
+            components.append({
+                "column": column,
+                "merge": MERGE_FUNCTIONS[part],
+                "sql": f"{part}({render(arguments)})",
+                # COUNT() over no rows is 0, every other aggregate is NULL
+                "empty": 0 if part == "count" else None,
+            })
+            columns.append(column)
+        return {"aggregate": function, "columns": columns, "round": digits}
+
+    # Replaces GROUP BY/ORDER BY ordinals and output aliases with the select expression they name
+    def _resolve_output_reference(self, tokens, items):
+        if len(tokens) == 1 and tokens[0][0] == NUMBER and tokens[0][1].isdigit():
+            index = int(tokens[0][1]) - 1
+            if not 0 <= index < len(items):
+                raise _NotIncremental("output column position out of range")
+            return items[index][0]
+        if len(tokens) == 1 and tokens[0][0] in (IDENT, QUOTED_IDENT):
+            for expression, alias in items:
+                if alias == tokens[0]:
+                    return expression
+        return tokens
+
+    # Maps ORDER BY items to output column positions so sorting can happen after the merge
+    def _order_by(self, items):
+        order_by = []
+        for tokens in split_top_level(self.clauses.get("order by", [])):
+            if not tokens:
+                continue
+            nulls_first = None
+            if len(tokens) > 2 and is_keyword(tokens[-2], "nulls") and tokens[-1][0] == IDENT and tokens[-1][1] in ("first", "last"):
+                nulls_first = tokens[-1][1] == "first"
+                tokens = tokens[:-2]
+            ascending = True
+            if tokens and tokens[-1][0] == IDENT and tokens[-1][1] in ("asc", "desc"):
+                ascending = tokens[-1][1] == "asc"
+                tokens = tokens[:-1]
+            expression = render(self._resolve_output_reference(tokens, items))
+            positions = [index for index, (item, _) in enumerate(items) if render(item) == expression]
+            if not positions:
+                raise _NotIncremental("ORDER BY must refer to output columns")
+            # PostgreSQL puts NULLs last in ascending order and first in descending order
+            order_by.append((positions[0], ascending, (not ascending) if nulls_first is None else nulls_first))
+        return order_by
+
+    def _count_clause(self, clause):
+        tokens = self.clauses.get(clause)
+        if tokens is None or (len(tokens) == 1 and is_keyword(tokens[0], "all")):
+            return None
+        if len(tokens) == 1 and tokens[0][0] == NUMBER and tokens[0][1].isdigit():
+            return int(tokens[0][1])
+        raise _NotIncremental(f"{clause.upper()} must be a constant")
+
+
+# Records merged by output column name cannot be told apart when two columns share a name
+def _check_columns(plan, columns):
+    if "reason" not in plan and columns is not None and len(set(columns)) != len(columns):
+        return {"reason": "the query has duplicate output column names"}
+    return plan
+
+
+# Combines stored partial aggregates with the partial aggregates of new rows
+def merge_partials(plan, stored, delta):
+    """
+    Merge two sets of partial aggregates group by group.
+
+    Args:
+        plan (dict): Plan from plan_incremental_refresh()
+        stored (pd.DataFrame): Previously merged partials (optional)
+        delta (pd.DataFrame): Partials of the new rows (optional)
+
+    Returns:
+        pd.DataFrame: The merged partials, one row per group
+    """
+    frames = [frame for frame in (stored, delta) if frame is not None and not frame.empty]
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=plan["state_columns"])
+
+    merges = {}
+    for component in plan["components"]:
+        merges.setdefault(component["merge"], []).append(component["column"])
+        if component["merge"] == "sum":
+            frame[component["column"]] = _numeric(frame[component["column"]])
+
+    # Without GROUP BY the query always returns exactly one row
+    if not plan["keys"]:
+        merged = {}
+        for component in plan["components"]:
+            values = frame[component["column"]].dropna()
+            value = getattr(values, component["merge"])() if len(values) else None
+            merged[component["column"]] = component["empty"] if value is None else value
+        return pd.DataFrame([merged], columns=plan["state_columns"])
+
+    grouped = frame.groupby(plan["keys"], dropna=False, sort=False)
+    parts = [
+        grouped[columns].sum(min_count=1) if merge == "sum" else getattr(grouped[columns], merge)()
+        for merge, columns in merges.items()
+    ]
+    return pd.concat(parts, axis=1).reset_index()[plan["state_columns"]]
+
+
+# Moves stored partials up to a new watermark and adds the rows at the watermark itself
+def advance_partials(plan, fetch, watermark, stored_watermark=None, settled=None):
+    """
+    Bring the partial aggregates of a registered query up to a watermark.
+
+    Partials of rows strictly below the watermark ("settled") are kept
+    between refreshes. Rows at the watermark value are aggregated again on
+    every refresh and merged on top. A watermark shared by several rows,
+    like a date, can gain rows after a refresh, so those rows cannot be settled yet.
+
+    Args:
+        plan (dict): Plan from plan_incremental_refresh()
+        fetch (callable): Runs (sql, parameters) and returns a DataFrame
+        watermark (str): Current highest watermark value (None if no rows)
+        stored_watermark (str): Watermark of the settled partials (optional)
+        settled (pd.DataFrame): Partials of rows below stored_watermark (optional)
+
+    Returns:
+        tuple: (settled, merged, new_groups) where merged is the full result
+        state and new_groups the number of partial rows aggregated
+    """
+    delta = None
+    boundary = None
+    if watermark is not None:
+        if settled is None or stored_watermark is None:
+            settled = None
+            delta = fetch(plan["initial_sql"], {"high": watermark})
+        elif watermark != stored_watermark:
+            delta = fetch(plan["delta_sql"], {"low": stored_watermark, "high": watermark})
+        boundary = fetch(plan["boundary_sql"], {"high": watermark})
+    settled = merge_partials(plan, settled, delta)
+    merged = merge_partials(plan, settled, boundary)
+    new_groups = sum(len(frame) for frame in (delta, boundary) if frame is not None)
+    return settled, merged, new_groups
+
+
+# Computes the query's output columns from merged partials, then applies ORDER BY/LIMIT/OFFSET
+def present_result(plan, merged, columns):
+    """
+    Turn merged partial aggregates into the rows the original query returns.
+
+    Args:
+        plan (dict): Plan from plan_incremental_refresh()
+        merged (pd.DataFrame): Merged partials
+        columns (list): Output column names of the original query
+
+    Returns:
+        list: The result records
+    """
+    values = []
+    for output in plan["outputs"]:
+        if "key" in output:
+            series = merged[output["key"]]
+        elif output["aggregate"] == "avg":
+            total, count = _numeric(merged[output["columns"][0]]), pd.to_numeric(merged[output["columns"][1]])
+            if total.dtype == object:
+                series = pd.Series([_divide(value, rows) for value, rows in zip(total, count)], dtype=object)
+            else:
+                series = total / count.where(count != 0)
+        else:
+            series = merged[output["columns"][0]]
+        if output.get("round") is not None:
+            series = series.map(lambda value, digits=output["round"]: _round_half_up(value, digits))
+        values.append(series.reset_index(drop=True))
+
+    result_df = pd.concat(values, axis=1, ignore_index=True) if values else pd.DataFrame()
+    result_df.columns = columns
+    # Stable sorts from the last key to the first give a multi-key order with per-key NULL placement
+    for position, ascending, nulls_first in reversed(plan["order_by"]):
+        result_df = result_df.sort_values(
+            columns[position], ascending=ascending, na_position="first" if nulls_first else "last", kind="mergesort"
+        )
+    start = plan["offset"] or 0
+    stop = start + plan["limit"] if plan["limit"] is not None else None
+    return _to_records(result_df.iloc[start:stop])
+
+
+# Rounds like PostgreSQL's ROUND(numeric, n): half away from zero
+def _round_half_up(value, digits):
+    if value is None or pd.isna(value):
+        return None
+    rounded = Decimal(str(value)).quantize(Decimal(1).scaleb(-digits), rounding=ROUND_HALF_UP)
+    if isinstance(value, Decimal):
+        return rounded
+    return int(rounded) if digits == 0 else float(rounded)
+
+
+# Converts partial sums to numbers, keeping NUMERIC values as exact Decimals
+def _numeric(series):
+    if not any(isinstance(value, Decimal) for value in series):
+        return pd.to_numeric(series)
+    return series.map(
+        lambda value: None if pd.isna(value) else Decimal(str(value)) if isinstance(value, float) else value
+    ).astype(object)
+
+
+def _divide(total, count):
+    if total is None or pd.isna(total) or pd.isna(count) or count == 0:
+        return None
+    return total / int(count)
+
+
+def _output_columns(connection, sql_query):
+    return list(connection.execute(text(f"SELECT * FROM ({strip_terminators(sql_query)}) AS registered_query LIMIT 0")).keys())
+
+
+def _fetch_frame(connection, sql_query, parameters=None):
+    result = connection.execute(text(sql_query), parameters or {})
+    # A JSON round trip gives new rows the same value types as the stored state
+    records = _load_json(json.dumps([dict(row._mapping) for row in result], default=_json_value))
+    return pd.DataFrame(records, columns=list(result.keys()))
+
+
+# Reads stored records, turning tagged NUMERIC values back into Decimals
+def _load_json(value):
+    return json.loads(value, object_hook=lambda obj: Decimal(obj["__decimal__"]) if obj.keys() == {"__decimal__"} else obj)
+
+
+def _to_records(frame):
+    return frame.astype(object).where(frame.notna(), None).to_dict(orient="records")
+
+
+def _json_value(value):
+    # Stored as text so partial sums stay exact across refreshes instead of drifting as floats
+    if isinstance(value, Decimal):
+        return {"__decimal__": str(value)}
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Register and refresh recurring dashboard queries")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    register_parser = subparsers.add_parser("register")
+    register_parser.add_argument("name")
+    register_parser.add_argument("sql_query")
+    register_parser.add_argument("--watermark-column")
+    refresh_parser = subparsers.add_parser("refresh")
+    refresh_parser.add_argument("names", nargs="*", help="Queries to refresh (default: all)")
+    refresh_parser.add_argument("--full", action="store_true", help="Recompute from all rows")
+    subparsers.add_parser("list")
+    drop_parser = subparsers.add_parser("drop")
+    drop_parser.add_argument("name")
+    args = parser.parse_args()
+
+    service = RegisteredQueryService()
+    if args.command == "register":
+        result = service.register(args.name, args.sql_query, args.watermark_column)
+        print(result["message"], result["data"]["registered_query"] if result["data"] else "")
+    elif args.command == "refresh":
+        if args.names:
+            print({name: service.refresh(name, args.full)["status"] for name in args.names})
+        else:
+            print(service.refresh_all(args.full))
+    elif args.command == "list":
+        for entry in service.list():
+            print(f"{entry['name']}: {entry['mode']}, watermark {entry['watermark_column']}={entry['watermark']}"
+                  + (f" ({entry['reason']})" if entry["reason"] else ""))
+    else:
+        print(service.drop(args.name))
@@ -0,0 +1,695 @@
+import os
+import time
+import argparse
+from sqlalchemy import text
+from dotenv import load_dotenv
+from ..database.connection import DatabaseConnection
+from .sql_parsing import (
+    IDENT, NUMBER, OP, STRING,
+    tokenize, render, is_keyword, split_clauses, split_top_level,
+    find_closing_paren, split_identifier, parse_inner_joins,
+)
+
+# Load environment variables
+load_dotenv()
+
+# Rollup rewriting can be switched off without dropping the rollup tables
+ROLLUP_REWRITE_ENABLED = os.getenv("ROLLUP_REWRITE_ENABLED", "true").lower() == "true"
+
+# Refresh a stale rollup on the request path instead of falling back to the base tables
+ROLLUP_AUTO_REFRESH = os.getenv("ROLLUP_AUTO_REFRESH", "true").lower() == "true"
+
+# Seconds to wait before checking again whether the rollup tables have been built
+ROLLUP_READY_RETRY_SECONDS = 60
+
+STATE_TABLE = "rollup_state"
+STORE_ROLLUP = "rollup_sales_store_month"
+PRODUCT_ROLLUP = "rollup_sales_product_month"
+
+# Alias given to the rollup table in rewritten queries
+ROLLUP_ALIAS = "rollup_src"
+
+# Base tables the rollups are derived from, keyed by their role in a query
+BASE_TABLES = {
+    "sales_orders": "orders",
+    "sales_order_items": "items",
+    "production_products": "products",
+    "production_brands": "brands",
+    "production_categories": "categories",
+    "sales_stores": "stores",
+}
+
+# Columns of the base tables, used to resolve unqualified column references
+TABLE_COLUMNS = {
+    "orders": {"order_id", "customer_id", "order_status", "order_date", "required_date", "shipped_date", "store_id", "staff_id"},
+    "items": {"order_id", "item_id", "product_id", "quantity", "list_price", "discount"},
+    "products": {"product_id", "product_name", "brand_id", "category_id", "model_year", "list_price"},
+    "brands": {"brand_id", "brand_name"},
+    "categories": {"category_id", "category_name"},
+    "stores": {"store_id", "store_name", "phone", "email", "street", "city", "state", "zip_code"},
+}
+
+# Join conditions the rollups preserve: role -> ((role, column), (role, column))
+JOIN_EDGES = {
+    "items": (("orders", "order_id"), ("items", "order_id")),
+    "products": (("products", "product_id"), ("items", "product_id")),
+    "brands": (("brands", "brand_id"), ("products", "brand_id")),
+    "categories": (("categories", "category_id"), ("products", "category_id")),
+    "stores": (("stores", "store_id"), ("orders", "store_id")),
+}
+
+# Canonical SUM() arguments mapped to the rollup measure that stores them
+SUM_MEASURES = {
+    "quantity": "units",
+    "list_price*quantity": "gross_revenue",
+    "1-discount*list_price*quantity": "revenue",
+}
+
+# Aggregates that cannot be answered from pre-summed rows
+NON_ADDITIVE_AGGREGATES = {
+    "sum", "avg", "count", "string_agg", "array_agg", "json_agg", "jsonb_agg",
+    "stddev", "stddev_pop", "stddev_samp", "variance", "var_pop", "var_samp",
+    "bit_and", "bit_or", "bool_and", "bool_or", "every", "percentile_cont",
+    "percentile_disc", "mode",
+}
+
+# Date parts that are exact at month granularity
+MONTH_GRAIN_PARTS = {"month", "quarter", "year"}
+
+ROLLUP_DEFINITIONS = {
+    STORE_ROLLUP: {
+        "create": f"""
+            CREATE TABLE IF NOT EXISTS {STORE_ROLLUP} (
+                order_month DATE NOT NULL,
+                store_id INT NOT NULL,
+                order_count BIGINT NOT NULL,
+                orders_with_items BIGINT NOT NULL,
+                item_count BIGINT NOT NULL,
+                units BIGINT NOT NULL,
+                gross_revenue NUMERIC NOT NULL,
+                revenue NUMERIC NOT NULL,
+                PRIMARY KEY (order_month, store_id)
+            )
+        """,
+        "refresh": f"""
+            INSERT INTO {STORE_ROLLUP} AS t
+                (order_month, store_id, order_count, orders_with_items, item_count, units, gross_revenue, revenue)
+            SELECT DATE_TRUNC('month', o.order_date)::date,
+                   o.store_id,
+                   COUNT(*),
+                   COUNT(i.order_id),
+                   COALESCE(SUM(i.item_count), 0),
+                   COALESCE(SUM(i.units), 0),
+                   COALESCE(SUM(i.gross_revenue), 0),
+                   COALESCE(SUM(i.revenue), 0)
+            FROM sales_orders o
+            LEFT JOIN (
+                SELECT order_id,
+                       COUNT(*) AS item_count,
+                       SUM(quantity) AS units,
+                       SUM(quantity * list_price) AS gross_revenue,
+                       SUM(quantity * list_price * (1 - discount)) AS revenue
+                FROM sales_order_items
+                WHERE order_id > :low AND order_id <= :high
+                GROUP BY order_id
+            ) i ON i.order_id = o.order_id
+            WHERE o.order_id > :low AND o.order_id <= :high
+            GROUP BY 1, 2
+            ON CONFLICT (order_month, store_id) DO UPDATE SET
+                order_count = t.order_count + EXCLUDED.order_count,
+                orders_with_items = t.orders_with_items + EXCLUDED.orders_with_items,
+                item_count = t.item_count + EXCLUDED.item_count,
+                units = t.units + EXCLUDED.units,
+                gross_revenue = t.gross_revenue + EXCLUDED.gross_revenue,
+                revenue = t.revenue + EXCLUDED.revenue
+        """,
+        "measures": {"order_count", "orders_with_items", "item_count", "units", "gross_revenue", "revenue"},
+    },
+    PRODUCT_ROLLUP: {
+        "create": f"""
+            CREATE TABLE IF NOT EXISTS {PRODUCT_ROLLUP} (
+                order_month DATE NOT NULL,
+                store_id INT NOT NULL,
+                product_id INT NOT NULL,
+                item_count BIGINT NOT NULL,
+                units BIGINT NOT NULL,
+                gross_revenue NUMERIC NOT NULL,
+                revenue NUMERIC NOT NULL,
+                PRIMARY KEY (order_month, store_id, product_id)
+            )
+        """,
+        "refresh": f"""
+            INSERT INTO {PRODUCT_ROLLUP} AS t
+                (order_month, store_id, product_id, item_count, units, gross_revenue, revenue)
+            SELECT DATE_TRUNC('month', o.order_date)::date,
+                   o.store_id,
+                   oi.product_id,
+                   COUNT(*),
+                   SUM(oi.quantity),
+                   SUM(oi.quantity * oi.list_price),
+                   SUM(oi.quantity * oi.list_price * (1 - oi.discount))
+            FROM sales_orders o
+            JOIN sales_order_items oi ON o.order_id = oi.order_id
+            WHERE o.order_id > :low AND o.order_id <= :high
+            GROUP BY 1, 2, 3
+            ON CONFLICT (order_month, store_id, product_id) DO UPDATE SET
+                item_count = t.item_count + EXCLUDED.item_count,
+                units = t.units + EXCLUDED.units,
+                gross_revenue = t.gross_revenue + EXCLUDED.gross_revenue,
+                revenue = t.revenue + EXCLUDED.revenue
+        """,
+        "measures": {"item_count", "units", "gross_revenue", "revenue"},
+    },
+}
+
+
+class _NotRewritable(Exception):
+    """Raised internally when a query cannot be answered from a rollup."""
+
+
+class RollupService:
+    def __init__(self, db_connection=None):
+        self.db_connection = db_connection or DatabaseConnection()
+        self.engine = self.db_connection.engine
+        self._ready = None
+        self._ready_checked_at = 0.0
+
+    # Creates the rollup tables and loads them from the full order history
+    def build(self):
+        """
+        Create the rollup tables if needed and bring them up to date.
+
+        Returns:
+            dict: Rollup name mapped to the highest order_id it now covers
+        """
+        with self.engine.begin() as connection:
+            connection.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+                    rollup_name VARCHAR(64) PRIMARY KEY,
+                    last_order_id BIGINT NOT NULL DEFAULT 0,
+                    refreshed_at TIMESTAMP
+                )
+            """))
+            for name, definition in ROLLUP_DEFINITIONS.items():
+                connection.execute(text(definition["create"]))
+                connection.execute(
+                    text(f"INSERT INTO {STATE_TABLE} (rollup_name) VALUES (:name) ON CONFLICT DO NOTHING"),
+                    {"name": name},
+                )
+            connection.execute(text(f"CREATE INDEX IF NOT EXISTS {PRODUCT_ROLLUP}_product_idx ON {PRODUCT_ROLLUP} (product_id)"))
+
+        self._ready = True
+        return self.refresh()
+
+    # Drops all rollup rows and rebuilds them, picking up updates to existing orders
+    def rebuild(self):
+        """
+        Rebuild the rollups from scratch.
+
+        Incremental refreshes only see orders with an order_id above the stored
+        watermark, so updates or deletes of existing orders, and items added to
+        existing orders, require a rebuild.
+
+        Returns:
+            dict: Rollup name mapped to the highest order_id it now covers
+        """
+        self.build()
+        with self.engine.begin() as connection:
+            for name in ROLLUP_DEFINITIONS:
+                connection.execute(text(f"SELECT 1 FROM {STATE_TABLE} WHERE rollup_name = :name FOR UPDATE"), {"name": name})
+                connection.execute(text(f"TRUNCATE {name}"))
+                connection.execute(
+                    text(f"UPDATE {STATE_TABLE} SET last_order_id = 0, refreshed_at = NULL WHERE rollup_name = :name"),
+                    {"name": name},
+                )
+        return self.refresh()
+
+    # Folds orders added since the last refresh into the rollups
+    def refresh(self, names=None):
+        """
+        Incrementally refresh rollups with orders above their watermark.
+
+        The watermark row is locked for the duration of the refresh so
+        concurrent refreshes never add the same orders twice.
+
+        Args:
+            names (list): Rollups to refresh (optional, defaults to all)
+
+        Returns:
+            dict: Rollup name mapped to the highest order_id it now covers
+        """
+        watermarks = {}
+        for name in names or ROLLUP_DEFINITIONS:
+            with self.engine.begin() as connection:
+                low = connection.execute(
+                    text(f"SELECT last_order_id FROM {STATE_TABLE} WHERE rollup_name = :name FOR UPDATE"),
+                    {"name": name},
+                ).scalar()
+                high = connection.execute(text("SELECT COALESCE(MAX(order_id), 0) FROM sales_orders")).scalar()
+                if high > low:
+                    connection.execute(text(ROLLUP_DEFINITIONS[name]["refresh"]), {"low": low, "high": high})
+                    connection.execute(
+                        text(f"UPDATE {STATE_TABLE} SET last_order_id = :high, refreshed_at = NOW() WHERE rollup_name = :name"),
+                        {"high": high, "name": name},
+                    )
+                watermarks[name] = max(low, high)
+        return watermarks
+
+    # Reports the watermark and row count of each rollup
+    def status(self):
+        with self.engine.connect() as connection:
+            rows = connection.execute(text(f"SELECT rollup_name, last_order_id, refreshed_at FROM {STATE_TABLE}")).fetchall()
+            latest = connection.execute(text("SELECT COALESCE(MAX(order_id), 0) FROM sales_orders")).scalar()
+            return {
+                row.rollup_name: {
+                    "last_order_id": row.last_order_id,
+                    "latest_order_id": latest,
+                    "refreshed_at": str(row.refreshed_at) if row.refreshed_at else None,
+                    "rows": connection.execute(text(f"SELECT COUNT(*) FROM {row.rollup_name}")).scalar(),
+                }
+                for row in rows
+            }
+
+    # Checks (and caches) whether the rollup tables have been built
+    def is_ready(self):
+        now = time.monotonic()
+        if self._ready is None or (not self._ready and now - self._ready_checked_at > ROLLUP_READY_RETRY_SECONDS):
+            self._ready_checked_at = now
+            try:
+                with self.engine.connect() as connection:
+                    self._ready = connection.execute(
+                        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": STATE_TABLE}
+                    ).scalar()
+            except Exception as e:
+                print(f"Error checking rollup tables: {e}")
+                self._ready = False
+        return self._ready
+
+    # Makes sure a rollup covers every order before it is used to answer a query
+    def ensure_fresh(self, name):
+        try:
+            with self.engine.connect() as connection:
+                low = connection.execute(
+                    text(f"SELECT last_order_id FROM {STATE_TABLE} WHERE rollup_name = :name"), {"name": name}
+                ).scalar()
+                high = connection.execute(text("SELECT COALESCE(MAX(order_id), 0) FROM sales_orders")).scalar()
+            if low is None:
+                return False
+            if high <= low:
+                return True
+            if not ROLLUP_AUTO_REFRESH:
+                return False
+            self.refresh([name])
+            return True
+        except Exception as e:
+            print(f"Error refreshing rollup {name}: {e}")
+            return False
+
+    # Redirects an aggregate query onto a rollup table when the answer is guaranteed to be identical
+    def rewrite(self, sql_query):
+        """
+        Rewrite an aggregate query over the order tables onto a rollup.
+
+        Only queries whose answer is provably the same are rewritten: inner
+        joins along the BikeStores foreign keys, additive aggregates of
+        quantity and price, and order_date used at month, quarter or year
+        granularity. Everything else is left untouched.
+
+        Args:
+            sql_query (str): The SQL query to rewrite
+
+        Returns:
+            tuple: (rewritten_sql, rollup_name), or None if the query cannot be
+            answered from a fresh rollup
+        """
+        if not ROLLUP_REWRITE_ENABLED:
+            return None
+        plan = plan_rollup_rewrite(sql_query)
+        if plan is None:
+            return None
+        rewritten_sql, rollup_name = plan
+        if not self.is_ready() or not self.ensure_fresh(rollup_name):
+            return None
+        return rewritten_sql, rollup_name
+
+
+# Plans the rollup rewrite of a query without touching the database
+def plan_rollup_rewrite(sql_query):
+    """
+    Work out which rollup can answer a query and the equivalent SQL.
+
+    Args:
+        sql_query (str): The SQL query to rewrite
+
+    Returns:
+        tuple: (rewritten_sql, rollup_name), or None if no rollup applies
+    """
+    try:
+        return _RollupRewriter(sql_query).rewrite()
+    except (_NotRewritable, IndexError, ValueError):
+        # A malformed generated query is simply not rewritten; the database reports its error
+        return None
+
+
+class _RollupRewriter:
+    def __init__(self, sql_query):
+        tokens = tokenize(sql_query)
+        if not tokens:
+            raise _NotRewritable()
+        if sum(1 for token in tokens if is_keyword(token, "select")) != 1:
+            raise _NotRewritable()
+        if any(token[0] not in (IDENT, NUMBER, OP, STRING) for token in tokens):
+            raise _NotRewritable()
+        # Window aggregates keep one row per base row and FILTER sees columns the rollup no longer has
+        if any(is_keyword(token, "over") or is_keyword(token, "filter") for token in tokens):
+            raise _NotRewritable()
+        self.clauses = split_clauses(tokens)
+        if self.clauses is None or "from" not in self.clauses:
+            raise _NotRewritable()
+        self.measures_used = False
+
+    def rewrite(self):
+        self._resolve_tables()
+        self._choose_rollup()
+
+        select_items = split_top_level(self.clauses["select"])
+        if select_items and select_items[0] and is_keyword(select_items[0][0], "distinct"):
+            raise _NotRewritable()
+
+        rewritten = {"select": []}
+        for position, item in enumerate(select_items):
+            if not item:
+                raise _NotRewritable()
+            if position:
+                rewritten["select"].append((OP, ","))
+            new_item = self._rewrite_expression(item)
+            # Keep the output column name when a COUNT() became a SUM() over the rollup
+            if item[0][1] == "count" and find_closing_paren(item, 1) == len(item) - 1:
+                new_item = new_item + [(IDENT, "as"), (IDENT, "count")]
+            rewritten["select"].extend(new_item)
+
+        for clause in ("where", "group by", "having"):
+            if clause in self.clauses:
+                rewritten[clause] = self._rewrite_expression(self.clauses[clause])
+        if "order by" in self.clauses:
+            rewritten["order by"] = self._rewrite_expression(self.clauses["order by"], output_aliases=self._output_aliases())
+
+        if not self.measures_used:
+            raise _NotRewritable()
+
+        # Groups with only item-less orders exist in the store rollup but not in an inner join with items
+        if self.rollup == STORE_ROLLUP and "items" in self.roles:
+            condition = [(IDENT, f"{ROLLUP_ALIAS}.item_count"), (OP, ">"), (NUMBER, "0")]
+            if "where" in rewritten:
+                rewritten["where"] = [(OP, "(")] + rewritten["where"] + [(OP, ")"), (IDENT, "and")] + condition
+            else:
+                rewritten["where"] = condition
+
+        tokens = [(IDENT, "select")] + rewritten["select"] + [(IDENT, "from")] + self._rewrite_from()
+        for clause in ("where", "group by", "having", "order by", "limit", "offset"):
+            source = rewritten.get(clause, self.clauses.get(clause))
+            if source is not None:
+                tokens += [(IDENT, word) for word in clause.split()] + source
+        return render(tokens), self.rollup
+
+    # Builds the FROM clause over the rollup, re-joining the dimension tables the query used
+    def _rewrite_from(self):
+        tokens = [(IDENT, self.rollup), (IDENT, ROLLUP_ALIAS)]
+        joins = [
+            ("stores", "sales_stores", "store_id", ROLLUP_ALIAS),
+            ("products", "production_products", "product_id", ROLLUP_ALIAS),
+            ("brands", "production_brands", "brand_id", self.roles.get("products")),
+            ("categories", "production_categories", "category_id", self.roles.get("products")),
+        ]
+        for role, table, column, parent in joins:
+            if role in self.roles:
+                alias = self.roles[role]
+                tokens += [
+                    (IDENT, "join"), (IDENT, table), (IDENT, alias), (IDENT, "on"),
+                    (IDENT, f"{alias}.{column}"), (OP, "="), (IDENT, f"{parent}.{column}"),
+                ]
+        return tokens
+
+    # Maps every table alias to its role and checks the joins follow the foreign keys
+    def _resolve_tables(self):
+        tables = parse_inner_joins(self.clauses["from"])
+        if not tables:
+            raise _NotRewritable()
+
+        self.roles = {}
+        self.aliases = {}
+        for entry in tables:
+            role = BASE_TABLES.get(entry["table"])
+            if role is None or role in self.roles or entry["alias"] in self.aliases or entry["alias"] == ROLLUP_ALIAS:
+                raise _NotRewritable()
+            self.roles[role] = entry["alias"]
+            self.aliases[entry["alias"]] = role
+
+        if "orders" not in self.roles and "items" not in self.roles:
+            raise _NotRewritable()
+
+        edges = set()
+        for entry in tables[1:]:
+            (left_alias, left_column), (right_alias, right_column) = entry["on"]
+            if left_alias not in self.aliases or right_alias not in self.aliases:
+                raise _NotRewritable()
+            edges.add(frozenset([(self.aliases[left_alias], left_column), (self.aliases[right_alias], right_column)]))
+        expected = {
+            frozenset(edge) for role, edge in JOIN_EDGES.items()
+            if role in self.roles and all(part[0] in self.roles for part in edge)
+        }
+        if edges != expected or len(expected) != len(tables) - 1:
+            raise _NotRewritable()
+
+    def _choose_rollup(self):
+        product_roles = {"products", "brands", "categories"}
+        uses_product = bool(product_roles & set(self.roles))
+        if not uses_product and "items" in self.roles:
+            uses_product = any(
+                token[0] == IDENT and self._resolve(token[1]) == ("items", "product_id")
+                for clause, tokens in self.clauses.items() if clause != "from"
+                for token in tokens
+            )
+        self.rollup = PRODUCT_ROLLUP if uses_product else STORE_ROLLUP
+
+    # Resolves a column reference to (role, column) for the base tables, or None for anything else
+    def _resolve(self, value):
+        qualifier, column = split_identifier(value)
+        if qualifier is not None:
+            role = self.aliases.get(qualifier)
+            return (role, column) if role else None
+        matches = [role for role in self.roles if column in TABLE_COLUMNS[role]]
+        if len(matches) > 1:
+            raise _NotRewritable()
+        return (matches[0], column) if matches else None
+
+    def _output_aliases(self):
+        tokens = self.clauses["select"]
+        return {tokens[i + 1][1] for i, token in enumerate(tokens[:-1]) if is_keyword(token, "as")}
+
+    # Rewrites column references and aggregates in an expression to read from the rollup
+    def _rewrite_expression(self, tokens, output_aliases=()):
+        result = []
+        index = 0
+        while index < len(tokens):
+            kind, value = tokens[index]
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+
+            if kind == IDENT and following == (OP, "(") and value in NON_ADDITIVE_AGGREGATES:
+                close = find_closing_paren(tokens, index + 1)
+                result.extend(self._rewrite_aggregate(value, tokens[index + 2:close]))
+                index = close + 1
+                continue
+
+            if kind == IDENT and following == (OP, "(") and value in ("date_trunc", "extract", "date_part", "to_char"):
+                close = find_closing_paren(tokens, index + 1)
+                date_call = self._rewrite_date_call(value, tokens[index + 2:close])
+                if date_call is not None:
+                    result.extend([(IDENT, value), (OP, "(")] + date_call + [(OP, ")")])
+                    index = close + 1
+                    continue
+
+            if kind == IDENT and index > 0 and is_keyword(tokens[index - 1], "as"):
+                result.append((kind, value))
+            elif kind == IDENT and "." not in value and value in output_aliases:
+                result.append((kind, value))
+            elif kind == IDENT:
+                result.append((IDENT, self._rewrite_column(value)))
+            else:
+                result.append((kind, value))
+            index += 1
+        return result
+
+    def _rewrite_column(self, value):
+        resolved = self._resolve(value)
+        if resolved is None:
+            return value
+        role, column = resolved
+        if role not in ("orders", "items"):
+            return value
+        if column == "store_id" and role == "orders":
+            return f"{ROLLUP_ALIAS}.store_id"
+        if column == "product_id" and role == "items" and self.rollup == PRODUCT_ROLLUP:
+            return f"{ROLLUP_ALIAS}.product_id"
+        raise _NotRewritable()
+
+    # Handles DATE_TRUNC/EXTRACT/DATE_PART/TO_CHAR over order_date at month granularity or coarser
+    def _rewrite_date_call(self, function, arguments):
+        if function == "extract":
+            if (len(arguments) == 3 and arguments[0][0] == IDENT and arguments[0][1] in MONTH_GRAIN_PARTS
+                    and is_keyword(arguments[1], "from") and self._is_order_date(arguments[2])):
+                return [arguments[0], arguments[1], (IDENT, f"{ROLLUP_ALIAS}.order_month")]
+            return None
+
+        parts = split_top_level(arguments)
+        if len(parts) != 2 or len(parts[0]) != 1 or len(parts[1]) != 1:
+            return None
+        if function == "to_char":
+            date_argument, format_argument = parts[0][0], parts[1][0]
+            if format_argument[0] != STRING or not self._is_order_date(date_argument):
+                return None
+            pattern = format_argument[1].strip("'")
+            for code in ("YYYY", "YY", "MM", "Month", "Mon", "Q"):
+                pattern = pattern.replace(code, "")
+            if any(ch.isalnum() for ch in pattern):
+                return None
+            return [(IDENT, f"{ROLLUP_ALIAS}.order_month"), (OP, ","), format_argument]
+
+        part_argument, date_argument = parts[0][0], parts[1][0]
+        if part_argument[0] != STRING or part_argument[1].strip("'").lower() not in MONTH_GRAIN_PARTS:
+            return None
+        if not self._is_order_date(date_argument):
+            return None
+        return [part_argument, (OP, ","), (IDENT, f"{ROLLUP_ALIAS}.order_month")]
+
+    def _is_order_date(self, token):
+        return token[0] == IDENT and self._resolve(token[1]) == ("orders", "order_date")
+
+    # Replaces an additive aggregate with the SUM() of the matching rollup measure
+    def _rewrite_aggregate(self, function, arguments):
+        measure = None
+        if function == "count":
+            if arguments and is_keyword(arguments[0], "distinct"):
+                measure = self._count_distinct_measure(arguments[1:])
+                if measure is None:
+                    # COUNT(DISTINCT dimension) sees the same set of values in the rollup
+                    return [(IDENT, "count"), (OP, "(")] + self._rewrite_expression(arguments) + [(OP, ")")]
+            elif arguments == [(OP, "*")] or (
+                len(arguments) == 1 and arguments[0][0] == IDENT
+                and (self._resolve(arguments[0][1]) or (None, None))[1] == "order_id"
+            ):
+                measure = "item_count" if "items" in self.roles else "order_count"
+            if measure is None:
+                raise _NotRewritable()
+            self._use_measure(measure)
+            return [(IDENT, "coalesce"), (OP, "("), (IDENT, "sum"), (OP, "("), (IDENT, f"{ROLLUP_ALIAS}.{measure}"),
+                    (OP, ")"), (OP, ","), (NUMBER, "0"), (OP, ")"), (OP, "::"), (IDENT, "bigint")]
+
+        if function == "sum" and "items" in self.roles:
+            measure = SUM_MEASURES.get(self._canonical_product(arguments))
+            if measure is not None:
+                self._use_measure(measure)
+                aggregate = [(IDENT, "sum"), (OP, "("), (IDENT, f"{ROLLUP_ALIAS}.{measure}"), (OP, ")")]
+                if measure == "units":
+                    aggregate += [(OP, "::"), (IDENT, "bigint")]
+                return aggregate
+        raise _NotRewritable()
+
+    def _count_distinct_measure(self, arguments):
+        if len(arguments) != 1 or arguments[0][0] != IDENT:
+            return None
+        resolved = self._resolve(arguments[0][1])
+        if resolved is None or resolved[0] not in ("orders", "items"):
+            return None
+        if resolved[1] != "order_id":
+            raise _NotRewritable()
+        return "orders_with_items" if "items" in self.roles else "order_count"
+
+    def _use_measure(self, measure):
+        if measure not in ROLLUP_DEFINITIONS[self.rollup]["measures"]:
+            raise _NotRewritable()
+        self.measures_used = True
+
+    # Normalises a product of item columns so operand order and parentheses do not matter
+    def _canonical_product(self, arguments):
+        text_parts = []
+        for kind, value in arguments:
+            if kind == IDENT:
+                resolved = self._resolve(value)
+                if resolved is None or resolved[0] != "items":
+                    return None
+                text_parts.append(resolved[1])
+            elif kind == NUMBER:
+                number = float(value)
+                text_parts.append(str(int(number)) if number.is_integer() else value)
+            elif kind == OP:
+                text_parts.append(value)
+            else:
+                return None
+        expression = "".join(text_parts)
+
+        return _canonical_factors(expression)
+
+
+# Splits an expression on top-level "*" and sorts the (recursively flattened) factors
+def _canonical_factors(expression):
+    # "*" binds tighter than "+"/"-", so a factor with an unparenthesized sum is not a factor of the whole product
+    if _has_top_level_additive(expression):
+        raise _NotRewritable()
+    factors = []
+    depth = 0
+    current = ""
+    for ch in expression:
+        depth += ch == "("
+        depth -= ch == ")"
+        if ch == "*" and depth == 0:
+            factors.append(current)
+            current = ""
+        else:
+            current += ch
+    factors.append(current)
+
+    flattened = []
+    for factor in factors:
+        while _is_wrapped(factor):
+            factor = factor[1:-1]
+        if len(factors) > 1 and "*" in factor:
+            flattened.extend(_canonical_factors(factor).split("*"))
+        else:
+            flattened.append(factor)
+    return "*".join(sorted(flattened))
+
+
+# Returns True if the expression has a "+" or "-" outside parentheses (a leading sign is allowed)
+def _has_top_level_additive(expression):
+    depth = 0
+    for position, ch in enumerate(expression):
+        depth += ch == "("
+        depth -= ch == ")"
+        if ch in "+-" and depth == 0 and position > 0:
+            return True
+    return False
+
+
+# Returns True if the outer parentheses of an expression enclose all of it
+def _is_wrapped(expression):
+    if not (expression.startswith("(") and expression.endswith(")")):
+        return False
+    depth = 0
+    for position, ch in enumerate(expression):
+        depth += ch == "("
+        depth -= ch == ")"
+        if depth == 0 and position < len(expression) - 1:
+            return False
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and refresh the BikeStores sales rollups")
+    parser.add_argument("command", choices=["build", "refresh", "rebuild", "status"])
+    args = parser.parse_args()
+
+    service = RollupService()
+    if args.command == "status":
+        print(service.status())
+    else:
+        print(getattr(service, args.command)())
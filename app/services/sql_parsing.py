@@ -0,0 +1,345 @@
+import re
+
+# Token kinds produced by tokenize()
+STRING = "string"
+NUMBER = "number"
+IDENT = "ident"
+QUOTED_IDENT = "quoted_ident"
+OP = "op"
+
+# Top-level clause keywords recognised by split_clauses(), in the order PostgreSQL expects them
+CLAUSE_KEYWORDS = ["select", "from", "where", "group by", "having", "order by", "limit", "offset"]
+
+# Keywords that introduce constructs split_clauses() does not understand
+UNSUPPORTED_KEYWORDS = {"with", "union", "intersect", "except", "window", "fetch", "for", "into", "returning"}
+
+# Aggregate functions recognised by contains_aggregate()
+AGGREGATE_FUNCTIONS = {
+    "sum", "count", "avg", "min", "max", "string_agg", "array_agg", "json_agg", "jsonb_agg",
+    "json_object_agg", "jsonb_object_agg", "stddev", "stddev_pop", "stddev_samp", "variance",
+    "var_pop", "var_samp", "bit_and", "bit_or", "bool_and", "bool_or", "every", "percentile_cont",
+    "percentile_disc", "mode",
+}
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<ws>\s+)
+    | (?P<comment>--[^\n]*|/\*.*?\*/)
+    | (?P<string>'(?:[^']|'')*')
+    | (?P<quoted_ident>"(?:[^"]|"")*")
+    | (?P<number>\d+(?:\.\d*)?(?:e[+-]?\d+)?|\.\d+)
+    | (?P<ident>[a-z_][a-z0-9_$]*(?:\.(?:[a-z_][a-z0-9_$]*|\*))*)
+    | (?P<op>::|<=|>=|<>|!=|\|\||[-+*/%<>=(),;.\[\]^:])
+    """,
+    re.IGNORECASE | re.VERBOSE | re.DOTALL,
+)
+
+
+# Splits a SQL statement into (kind, value) tokens, dropping whitespace and comments
+def tokenize(sql):
+    """
+    Tokenize a SQL statement into a flat list of tokens.
+
+    Identifiers and keywords are lower-cased; string literals and quoted
+    identifiers keep their original spelling. Qualified names such as
+    ``o.order_date`` are returned as a single identifier token.
+
+    Args:
+        sql (str): The SQL statement to tokenize
+
+    Returns:
+        list: A list of (kind, value) tuples, or None if the text contains
+        characters that are not valid SQL tokens
+    """
+    tokens = []
+    position = 0
+    while position < len(sql):
+        match = _TOKEN_PATTERN.match(sql, position)
+        if match is None:
+            return None
+        position = match.end()
+        kind = match.lastgroup
+        if kind in ("ws", "comment"):
+            continue
+        value = match.group(kind)
+        if kind == IDENT:
+            value = value.lower()
+        tokens.append((kind, value))
+
+    # Drop trailing statement terminators
+    while tokens and tokens[-1] == (OP, ";"):
+        tokens.pop()
+    return tokens
+
+
+# Removes trailing semicolons, and any whitespace or comments around them, from SQL text
+def strip_terminators(sql):
+    """
+    Strip the trailing statement terminator so the SQL can be embedded in another statement.
+
+    Args:
+        sql (str): The SQL statement
+
+    Returns:
+        str: The statement up to its last token that is not a semicolon, or
+        the text unchanged if it cannot be tokenized
+    """
+    end = 0
+    position = 0
+    while position < len(sql):
+        match = _TOKEN_PATTERN.match(sql, position)
+        if match is None:
+            return sql
+        position = match.end()
+        if match.lastgroup not in ("ws", "comment") and match.group() != ";":
+            end = position
+    return sql[:end]
+
+
+# Renders a token list back into a single-line SQL string
+def render(tokens):
+    """
+    Render a token list back into SQL text.
+
+    Args:
+        tokens (list): A list of (kind, value) tuples
+
+    Returns:
+        str: The SQL text
+    """
+    parts = []
+    previous = None
+    for kind, value in tokens:
+        if previous is not None:
+            no_space = (
+                value in (")", ",", "::", ".", "[", "]")
+                or previous[1] in ("(", "::", ".", "[")
+                or (value == "(" and previous[0] == IDENT and previous[1] not in _SPACED_BEFORE_PAREN)
+            )
+            if not no_space:
+                parts.append(" ")
+        parts.append(value)
+        previous = (kind, value)
+    return "".join(parts)
+
+
+# Keywords that keep a space before an opening parenthesis when rendered
+_SPACED_BEFORE_PAREN = {
+    "select", "from", "where", "and", "or", "not", "in", "on", "as", "join", "by",
+    "having", "exists", "then", "else", "when", "values", "any", "all",
+}
+
+
+# Returns True if the token is the given keyword
+def is_keyword(token, keyword):
+    return token[0] == IDENT and token[1] == keyword
+
+
+# Splits a tokenized SELECT statement into its top-level clauses
+def split_clauses(tokens):
+    """
+    Split a tokenized single SELECT statement into its top-level clauses.
+
+    Only clauses at parenthesis depth zero are considered, so subqueries
+    stay inside the clause that contains them.
+
+    Args:
+        tokens (list): Tokens returned by tokenize()
+
+    Returns:
+        dict: Clause keyword ("select", "from", "where", "group by", ...)
+        mapped to the tokens of that clause (keyword excluded), or None if
+        the statement is not a plain SELECT
+    """
+    if not tokens or not is_keyword(tokens[0], "select"):
+        return None
+
+    clauses = {}
+    current = None
+    depth = 0
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token == (OP, "("):
+            depth += 1
+        elif token == (OP, ")"):
+            depth -= 1
+            if depth < 0:
+                return None
+
+        if depth == 0 and token[0] == IDENT:
+            if token[1] in UNSUPPORTED_KEYWORDS:
+                return None
+            keyword = token[1]
+            if keyword in ("group", "order") and index + 1 < len(tokens) and is_keyword(tokens[index + 1], "by"):
+                keyword = f"{keyword} by"
+            if keyword in CLAUSE_KEYWORDS:
+                if keyword in clauses:
+                    return None
+                clauses[keyword] = []
+                current = keyword
+                index += 2 if " " in keyword else 1
+                continue
+
+        if token == (OP, ";"):
+            return None
+        clauses[current].append(token)
+        index += 1
+
+    if depth != 0:
+        return None
+    return clauses
+
+
+# Splits a token list on commas at parenthesis depth zero
+def split_top_level(tokens, separator=(OP, ",")):
+    """
+    Split a token list on a separator token that appears outside parentheses.
+
+    Args:
+        tokens (list): The tokens to split
+        separator (tuple): The separator token, a comma by default
+
+    Returns:
+        list: A list of token lists
+    """
+    parts = [[]]
+    depth = 0
+    for token in tokens:
+        if token == (OP, "("):
+            depth += 1
+        elif token == (OP, ")"):
+            depth -= 1
+        if depth == 0 and token == separator:
+            parts.append([])
+            continue
+        parts[-1].append(token)
+    return parts
+
+
+# Returns the index of the parenthesis that closes the one at start
+def find_closing_paren(tokens, start):
+    depth = 0
+    for index in range(start, len(tokens)):
+        if tokens[index] == (OP, "("):
+            depth += 1
+        elif tokens[index] == (OP, ")"):
+            depth -= 1
+            if depth == 0:
+                return index
+    return None
+
+
+# Splits "expression AS alias" (or "expression alias") into (expression, alias token)
+def strip_alias(tokens):
+    if len(tokens) > 2 and is_keyword(tokens[-2], "as"):
+        return tokens[:-2], tokens[-1]
+    if len(tokens) > 1 and tokens[-1][0] in (IDENT, QUOTED_IDENT) and (tokens[-2] == (OP, ")") or len(tokens) == 2):
+        return tokens[:-1], tokens[-1]
+    return tokens, None
+
+
+# Returns True if any token is a call to an aggregate function
+def contains_aggregate(tokens):
+    return any(
+        token[0] == IDENT and token[1] in AGGREGATE_FUNCTIONS
+        and index + 1 < len(tokens) and tokens[index + 1] == (OP, "(")
+        for index, token in enumerate(tokens)
+    )
+
+
+# Splits ROUND(expression[, digits]) into its argument and digit count
+def unwrap_round(tokens):
+    """
+    Unwrap an expression from ROUND().
+
+    Args:
+        tokens (list): Tokens of a select item without its alias
+
+    Returns:
+        tuple: (expression tokens, digits), with digits None when the
+        expression is not wrapped in ROUND and 0 for ROUND(x); None if the
+        digit count is not a non-negative integer constant
+    """
+    if not tokens or tokens[0] != (IDENT, "round") or find_closing_paren(tokens, 1) != len(tokens) - 1:
+        return tokens, None
+    arguments = split_top_level(tokens[2:-1])
+    if len(arguments) == 1:
+        return arguments[0], 0
+    if len(arguments) == 2 and len(arguments[1]) == 1 and arguments[1][0][0] == NUMBER and arguments[1][0][1].isdigit():
+        return arguments[0], int(arguments[1][0][1])
+    return None
+
+
+# Splits a qualified identifier into (qualifier, column)
+def split_identifier(value):
+    if "." in value:
+        qualifier, _, column = value.rpartition(".")
+        return qualifier, column
+    return None, value
+
+
+# Parses a FROM clause made of tables combined with inner joins
+def parse_inner_joins(tokens):
+    """
+    Parse a FROM clause consisting only of tables combined with inner joins.
+
+    Each join condition must be a single equality between two qualified
+    columns, which is the shape generated queries use for foreign keys.
+
+    Args:
+        tokens (list): Tokens of the FROM clause
+
+    Returns:
+        list: A list of dicts with "table", "alias" and "on" keys, where "on"
+        is None for the first table and a ((alias, column), (alias, column))
+        pair otherwise, or None if the clause has any other shape
+    """
+    segments = [[]]
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token[0] == IDENT and token[1] in ("left", "right", "full", "cross", "natural", "outer", "using", "lateral"):
+            return None
+        if token == (OP, ",") or token == (OP, "("):
+            return None
+        if is_keyword(token, "inner") and index + 1 < len(tokens) and is_keyword(tokens[index + 1], "join"):
+            index += 1
+            token = tokens[index]
+        if is_keyword(token, "join"):
+            segments.append([])
+        else:
+            segments[-1].append(token)
+        index += 1
+
+    tables = []
+    for position, segment in enumerate(segments):
+        on_index = next((i for i, tok in enumerate(segment) if is_keyword(tok, "on")), None)
+        head = segment if on_index is None else segment[:on_index]
+        condition = [] if on_index is None else segment[on_index + 1:]
+
+        if head and head[0][0] == IDENT and "." not in head[0][1]:
+            table = head[0][1]
+        else:
+            return None
+        rest = head[1:]
+        if rest and is_keyword(rest[0], "as"):
+            rest = rest[1:]
+        if len(rest) > 1 or (rest and rest[0][0] != IDENT):
+            return None
+        alias = rest[0][1] if rest else table
+
+        if position == 0:
+            if condition:
+                return None
+            on = None
+        else:
+            if len(condition) != 3 or condition[1] != (OP, "=") or condition[0][0] != IDENT or condition[2][0] != IDENT:
+                return None
+            left = split_identifier(condition[0][1])
+            right = split_identifier(condition[2][1])
+            if left[0] is None or right[0] is None:
+                return None
+            on = (left, right)
+        tables.append({"table": table, "alias": alias, "on": on})
+    return tables
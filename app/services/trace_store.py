@@ -0,0 +1,102 @@
+import os
+import re
+import json
+import time
+import uuid
+import tempfile
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Number of agent traces kept; the oldest are evicted first
+AGENT_TRACE_MAX = int(os.getenv("AGENT_TRACE_MAX", "1000"))
+
+# Directory shared by all worker processes where traces are written (empty keeps them in this process only)
+AGENT_TRACE_DIR = os.getenv("AGENT_TRACE_DIR", "traces")
+
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class TraceStore:
+    """
+    Bounded, thread-safe store of agent traces keyed by trace id.
+
+    Responses carry only the trace id; the steps are fetched on demand.
+    Each trace is written as a JSON file in a shared directory, so any
+    gunicorn worker can return a trace recorded by another one.
+    """
+
+    def __init__(self, directory=AGENT_TRACE_DIR, max_traces=AGENT_TRACE_MAX):
+        self.directory = directory
+        self.max_traces = max_traces
+        self._lock = threading.Lock()
+        self._traces = OrderedDict()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    # Stores the steps of one agent run and returns its trace id
+    def add(self, question, steps):
+        trace_id = uuid.uuid4().hex
+        trace = {
+            "trace_id": trace_id,
+            "question": question,
+            "created_at": time.time(),
+            "steps": steps,
+        }
+        if not self.directory:
+            with self._lock:
+                self._traces[trace_id] = trace
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            return trace_id
+
+        try:
+            # Written under a temporary name so a reader never sees a partial trace
+            descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+                json.dump(trace, f, default=str)
+            os.replace(temporary_path, self._path(trace_id))
+            self._evict()
+        except OSError as e:
+            print(f"Error storing agent trace: {e}")
+        return trace_id
+
+    # Returns a stored trace, or None if it is unknown or has been evicted
+    def get(self, trace_id):
+        if not self.directory:
+            with self._lock:
+                return self._traces.get(trace_id)
+        # Trace ids are hex UUIDs; anything else could name a file outside the directory
+        if not _TRACE_ID.match(trace_id):
+            return None
+        try:
+            with open(self._path(trace_id), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _path(self, trace_id):
+        return os.path.join(self.directory, f"{trace_id}.json")
+
+    # Deletes the oldest trace files beyond max_traces
+    def _evict(self):
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    try:
+                        files.append((entry.stat().st_mtime, entry.path))
+                    except FileNotFoundError:
+                        # Another worker evicted it first
+                        continue
+        if len(files) <= self.max_traces:
+            return
+        files.sort()
+        for _, path in files[:len(files) - self.max_traces]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
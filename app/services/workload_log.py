@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import queue
+import atexit
+import hashlib
+import threading
+from dotenv import load_dotenv
+from ..database.schema import get_schema_as_text
+
+# Load environment variables
+load_dotenv()
+
+# Workload capture settings
+WORKLOAD_LOG_ENABLED = os.getenv("WORKLOAD_LOG_ENABLED", "true").lower() == "true"
+WORKLOAD_LOG_PATH = os.getenv("WORKLOAD_LOG_PATH", "workload.jsonl")
+
+# Entries waiting to be written; beyond this, new entries are dropped rather than slowing requests down
+WORKLOAD_QUEUE_SIZE = 10000
+
+
+# Short hash of the schema text given to the LLM, so captures can be matched to the schema they ran against
+def schema_version():
+    return hashlib.sha1(get_schema_as_text().encode("utf-8")).hexdigest()[:12]
+
+
+class WorkloadLog:
+    """
+    Append-only JSON lines log of served requests.
+
+    record() only enqueues the entry; a background thread does the
+    serialization and file I/O so capture stays off the request path.
+    """
+
+    def __init__(self, path=WORKLOAD_LOG_PATH, enabled=WORKLOAD_LOG_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self.schema_version = schema_version()
+        self.dropped = 0
+        self._queue = None
+        self._thread = None
+        if self.enabled:
+            self._start_writer()
+            atexit.register(self.close)
+            if hasattr(os, "register_at_fork"):
+                # Threads do not survive fork, so each worker process starts its own writer
+                os.register_at_fork(after_in_child=self._start_writer)
+
+    def _start_writer(self):
+        self._queue = queue.Queue(maxsize=WORKLOAD_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._write_loop, name="workload-log", daemon=True)
+        self._thread.start()
+
+    # Queues one request for the log without blocking the caller
+    def record(self, route, question=None, sql_query=None, status=None, row_count=None, database=None, **timings_ms):
+        """
+        Record one served request.
+
+        Args:
+            route (str): The API route that served the request
+            question (str): The natural language question (optional)
+            sql_query (str): The generated or executed SQL (optional)
+            status (str): The response status (optional)
+            row_count (int): Number of rows returned (optional)
+            database (str): Key of the database the request was routed to (optional)
+            **timings_ms: Named timings in milliseconds, e.g. convert_ms, execute_ms, total_ms.
+                total_ms is taken off the current time so "ts" is when the request arrived
+        """
+        if not self.enabled:
+            return
+        entry = {
+            # Arrival time, so replays keep the original spacing instead of adding each request's latency
+            "ts": time.time() - timings_ms.get("total_ms", 0) / 1000,
+            "route": route,
+            "question": question,
+            "sql": sql_query,
+            "status": status,
+            "rows": row_count,
+            "database": database,
+            "schema": self.schema_version,
+        }
+        entry.update({name: round(value, 2) for name, value in timings_ms.items()})
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        # Every gunicorn worker appends to the same file; O_APPEND and one write() of whole lines keep lines intact
+        descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            stopping = False
+            while not stopping:
+                lines = []
+                entry = self._queue.get()
+                # Write once the backlog is drained, not once per entry
+                while True:
+                    if entry is None:
+                        stopping = True
+                        break
+                    lines.append(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+                    try:
+                        entry = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if lines:
+                    os.write(descriptor, "".join(lines).encode("utf-8"))
+        finally:
+            os.close(descriptor)
+
+    # Writes any queued entries and stops the writer thread
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+# Reads a captured workload log into a list of entries, skipping lines that are not valid JSON
+def read_workload(path):
+    entries = []
+    skipped = 0
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                skipped += 1
+    if skipped:
+        print(f"Error reading workload log {path}: skipped {skipped} malformed line(s)")
+    return entries
@@ -0,0 +1,156 @@
+import json
+import time
+import argparse
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from .workload_log import read_workload
+
+# Default address of the running API when replaying against the service
+DEFAULT_API_URL = "http://localhost:5000/api"
+
+PERCENTILES = [50, 90, 95, 99]
+
+
+# Summarizes a list of latencies in milliseconds
+def latency_summary(latencies):
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+    summary = {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 2),
+        "max_ms": round(ordered[-1], 2),
+    }
+    for percentile in PERCENTILES:
+        index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+        summary[f"p{percentile}_ms"] = round(ordered[index], 2)
+    return summary
+
+
+class WorkloadReplayer:
+    def __init__(self, target="direct", api_url=DEFAULT_API_URL, replay_questions=False, workers=8):
+        self.target = target
+        self.api_url = api_url
+        self.replay_questions = replay_questions
+        self.workers = workers
+        self.registry = None
+        self.nl_to_sql_converter = None
+        if target == "direct":
+            from ..database.registry import DatabaseRegistry
+            # Each entry runs against the database it was routed to when captured
+            self.registry = DatabaseRegistry()
+            if replay_questions:
+                from .nl_to_sql_service import NLToSQLConverter
+                self.nl_to_sql_converter = NLToSQLConverter()
+
+    # Replays one captured entry and returns (latency_ms, ok)
+    def _replay_entry(self, entry):
+        started = time.perf_counter()
+        database = entry.get("database")
+        if self.target == "direct" and self.replay_questions:
+            target = self.registry.get(database)
+            sql_query = self.nl_to_sql_converter.convert_to_sql(entry["question"], target.schema_text)
+            ok = sql_query is not None and target.query_service.execute_sql_query(sql_query)["status"] == "success"
+        elif self.target == "direct":
+            result = self.registry.get(database).query_service.execute_sql_query(entry["sql"])
+            ok = result["status"] == "success"
+        elif self.replay_questions:
+            response = requests.post(f"{self.api_url}/query", json={"query": entry["question"], "database": database})
+            ok = response.status_code == 200
+        else:
+            response = requests.post(f"{self.api_url}/execute", json={"sql_query": entry["sql"], "database": database})
+            ok = response.status_code == 200
+        return (time.perf_counter() - started) * 1000, ok
+
+    def replay(self, entries, speed=1.0):
+        """
+        Re-run captured requests and measure their latency.
+
+        Args:
+            entries (list): Entries from read_workload()
+            speed (float): Replay rate relative to the capture, e.g. 2 for twice
+                as fast; 0 sends requests back to back
+
+        Returns:
+            dict: Latency summaries of this run and of the original capture
+        """
+        key = "question" if self.replay_questions else "sql"
+        # The log is written in completion order; requests are replayed in the order they arrived
+        entries = sorted((entry for entry in entries if entry.get(key)), key=lambda entry: entry.get("ts", 0))
+        latencies = []
+        errors = 0
+        lock = threading.Lock()
+
+        def run(entry):
+            nonlocal errors
+            try:
+                latency, ok = self._replay_entry(entry)
+            except Exception:
+                latency, ok = None, False
+            with lock:
+                if latency is not None:
+                    latencies.append(latency)
+                if not ok:
+                    errors += 1
+
+        started = time.perf_counter()
+        first_ts = entries[0]["ts"] if entries else 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for entry in entries:
+                if speed > 0:
+                    # Keep the original spacing between requests, scaled by the replay speed
+                    delay = (entry["ts"] - first_ts) / speed - (time.perf_counter() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+                pool.submit(run, entry)
+
+        original_key = "total_ms" if key == "question" else "execute_ms"
+        return {
+            "target": self.target,
+            "speed": speed,
+            "errors": errors,
+            "wall_seconds": round(time.perf_counter() - started, 2),
+            "replayed": latency_summary(latencies),
+            "captured": latency_summary([entry[original_key] for entry in entries if entry.get(original_key) is not None]),
+        }
+
+
+# Prints percentile changes between a baseline run and the current one
+def compare_runs(baseline, current):
+    lines = [f"{'metric':<10}{'baseline':>12}{'current':>12}{'change':>10}"]
+    for metric in ["mean_ms"] + [f"p{percentile}_ms" for percentile in PERCENTILES] + ["max_ms"]:
+        old = baseline["replayed"].get(metric)
+        new = current["replayed"].get(metric)
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        lines.append(f"{metric:<10}{old:>12}{new:>12}{change:>10}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a captured workload log and report latency percentiles")
+    parser.add_argument("workload_file", help="Workload log written by the API (JSON lines)")
+    parser.add_argument("--target", choices=["direct", "service"], default="direct",
+                        help="Run SQL directly through QueryService or send requests to the running API")
+    parser.add_argument("--api-url", default=DEFAULT_API_URL)
+    parser.add_argument("--questions", action="store_true",
+                        help="Replay the natural language questions (through the LLM) instead of the captured SQL")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay rate relative to capture; 0 for back to back")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--output", help="Write the run summary to this JSON file")
+    parser.add_argument("--compare", help="Baseline run summary (JSON) to compare against")
+    args = parser.parse_args()
+
+    replayer = WorkloadReplayer(args.target, args.api_url, args.questions, args.workers)
+    summary = replayer.replay(read_workload(args.workload_file), args.speed)
+    print(json.dumps(summary, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare_runs(json.load(f), summary))
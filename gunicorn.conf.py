@@ -0,0 +1,39 @@
+import gc
+import os
+import multiprocessing
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Production server settings, used with: gunicorn -c gunicorn.conf.py main:app
+bind = os.getenv("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_WORKERS", str(multiprocessing.cpu_count())))
+
+# Requests mostly wait on the LLM and the database, so each worker also serves several threads
+threads = int(os.getenv("WEB_THREADS", "4"))
+worker_class = "gthread" if threads > 1 else "sync"
+
+# Build the services (schema text, prompt templates, LLM clients, example index) once in the master;
+# workers share them copy-on-write. Database pools and background threads are reset after fork.
+preload_app = True
+
+# Agent runs can take a while; graceful_timeout bounds how long a reload waits for them
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Restart each worker after this many requests to bound memory growth (0 disables)
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+# The pid file makes `kill -HUP $(cat <pidfile>)` reloads easy
+pidfile = os.getenv("WEB_PIDFILE") or None
+accesslog = os.getenv("WEB_ACCESS_LOG") or None
+
+
+# Runs in the master once the preloaded app is ready, before any worker is forked
+def when_ready(server):
+    # Keep the garbage collector from writing to the preloaded objects, which would copy their pages into every worker
+    gc.freeze()
+    server.log.info("Preloaded app frozen for %s worker(s) x %s thread(s)", workers, threads)
@@ -0,0 +1,34 @@
+from app.services.approximate_query import plan_approximate_query
+
+
+def _plan(sql_query):
+    return plan_approximate_query(sql_query, 10, "bernoulli")
+
+
+def test_unaliased_aggregates_with_the_same_name_are_declined():
+    assert _plan("SELECT store_id, SUM(quantity), SUM(list_price) FROM sales_order_items GROUP BY store_id") is None
+    assert _plan("SELECT ROUND(AVG(quantity), 1), ROUND(AVG(list_price), 2) FROM sales_order_items") is None
+
+
+def test_aliased_aggregates_get_their_own_error_columns():
+    sql, info = _plan("SELECT SUM(quantity) AS units, SUM(list_price) revenue FROM sales_order_items")
+    assert info["error_columns"] == {"units": "units_error", "revenue": "revenue_error"}
+    assert "AS units_error" in sql and "AS revenue_error" in sql
+
+
+def test_quoted_alias_is_kept():
+    sql, info = _plan('SELECT COUNT(*) AS "Order Count" FROM sales_orders')
+    assert info["error_columns"] == {"Order Count": "Order Count_error"}
+    assert 'AS "Order Count"' in sql
+
+
+def test_round_is_applied_to_estimate_and_error():
+    sql, info = _plan("SELECT ROUND(AVG(quantity), 2) AS avg_quantity FROM sales_order_items")
+    assert info["error_columns"] == {"avg_quantity": "avg_quantity_error"}
+    assert sql.count("::numeric, 2)") == 2
+    assert _plan("SELECT ROUND(AVG(quantity), -1) AS avg_quantity FROM sales_order_items") is None
+
+
+def test_non_estimable_aggregates_are_declined():
+    assert _plan("SELECT MAX(quantity) AS most FROM sales_order_items") is None
+    assert _plan("SELECT json_object_agg(item_id, quantity) AS items, SUM(quantity) AS units FROM sales_order_items") is None
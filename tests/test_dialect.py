@@ -0,0 +1,40 @@
+import pytest
+from app.database.dialect import UnsupportedDialectFeature, transpile
+
+DATE_COLUMNS = frozenset({"order_date", "shipped_date"})
+
+
+def test_postgres_is_unchanged():
+    sql_query = "SELECT shipped_date - order_date FROM sales_orders"
+    assert transpile(sql_query, "postgresql") == sql_query
+
+
+# SQLite would subtract the text values and return 0 for every row
+def test_sqlite_date_difference_uses_julianday():
+    sql_query = transpile("SELECT AVG(shipped_date - order_date) FROM sales_orders", "sqlite", DATE_COLUMNS)
+    assert "JULIANDAY(shipped_date) - JULIANDAY(order_date)" in sql_query
+
+
+def test_sqlite_extract_day_of_a_difference_is_the_day_count():
+    sql_query = transpile("SELECT EXTRACT(DAY FROM (o.shipped_date - o.order_date)) FROM sales_orders o", "sqlite", DATE_COLUMNS)
+    assert "STRFTIME" not in sql_query and "JULIANDAY(o.shipped_date)" in sql_query
+
+
+def test_sqlite_timestamp_cast_keeps_the_date():
+    assert "DATETIME(order_date)" in transpile("SELECT order_date::timestamp FROM sales_orders", "sqlite", DATE_COLUMNS)
+
+
+@pytest.mark.parametrize("sql_query", [
+    "SELECT order_date + 7 FROM sales_orders",
+    "SELECT * FROM sales_orders WHERE order_date > CURRENT_DATE - INTERVAL '1 year'",
+    "SELECT EXTRACT(MONTH FROM shipped_date - order_date) FROM sales_orders",
+])
+def test_sqlite_rejects_date_arithmetic_it_cannot_express(sql_query):
+    with pytest.raises(UnsupportedDialectFeature):
+        transpile(sql_query, "sqlite", DATE_COLUMNS)
+
+
+def test_numeric_subtraction_is_left_alone():
+    assert transpile("SELECT list_price - discount FROM sales_order_items", "sqlite", DATE_COLUMNS) == (
+        "SELECT list_price - discount FROM sales_order_items"
+    )
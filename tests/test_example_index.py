@@ -0,0 +1,61 @@
+from app.services.example_index import EXAMPLE_MIN_SCORE, ExampleIndex
+
+QUESTIONS = [
+    "How many orders were placed at each store?",
+    "What is the total revenue by year?",
+    "Which products sold the most units?",
+    "List customers from New York",
+]
+
+
+def _index():
+    index = ExampleIndex(path=None)
+    for question in QUESTIONS:
+        index.add(question, "SELECT 1")
+    return index
+
+
+def test_similar_question_is_retrieved():
+    matches = _index().search("total revenue per year")
+    assert [match["question"] for match in matches] == ["What is the total revenue by year?"]
+
+
+# The best keyword match must not pass the threshold just for being the best one
+def test_unrelated_question_is_below_the_threshold():
+    assert _index().search("How many staff are active?") == []
+    assert all(match["score"] < EXAMPLE_MIN_SCORE for match in _index().search("How many staff are active?", min_score=0.0))
+
+
+# Another worker's index sharing the file picks up examples added elsewhere
+def test_changes_from_another_process_are_reloaded(tmp_path):
+    path = str(tmp_path / "examples.json")
+    first, second = ExampleIndex(path=path), ExampleIndex(path=path)
+    first.add(QUESTIONS[1], "SELECT 1")
+    assert [match["question"] for match in second.search("total revenue per year")] == [QUESTIONS[1]]
+
+
+def _add_examples(path, worker):
+    index = ExampleIndex(path=path)
+    for number in range(20):
+        index.add(f"question {worker} number {number}", "SELECT 1")
+
+
+# Workers adding at the same time merge into the shared file instead of overwriting each other
+def test_concurrent_processes_keep_every_addition(tmp_path):
+    import multiprocessing
+    path = str(tmp_path / "examples.json")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_add_examples, args=(path, worker)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert len(ExampleIndex(path=path).list()) == 80
+
+
+def test_unreadable_file_keeps_the_loaded_examples(tmp_path):
+    path = tmp_path / "examples.json"
+    index = ExampleIndex(path=str(path))
+    index.add(QUESTIONS[0], "SELECT 1")
+    path.write_text('[{"id": "abc", "question": ', encoding="utf-8")
+    assert [example["question"] for example in index.list()] == [QUESTIONS[0]]
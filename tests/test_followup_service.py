@@ -0,0 +1,54 @@
+import pytest
+from app.services.followup_service import FollowUpService, looks_like_refinement
+
+COLUMNS = ["store_name", "revenue"]
+
+
+@pytest.mark.parametrize("question", ["only 2018", "sort by revenue", "and for 2017?", "What about Trek?", "top 3"])
+def test_refinements_are_recognised(question):
+    assert looks_like_refinement(question, COLUMNS)
+
+
+@pytest.mark.parametrize("question", ["How many staff are active?", "List all customers from Texas"])
+def test_new_questions_skip_the_follow_up_call(question):
+    assert not looks_like_refinement(question, COLUMNS)
+
+
+class _Converter:
+    def __init__(self):
+        self.calls = 0
+
+    def convert_follow_up(self, *args):
+        self.calls += 1
+        return "SELECT * FROM previous_result"
+
+
+def _service():
+    converter = _Converter()
+    service = FollowUpService(converter)
+    result = {"status": "success", "data": {"records": [{"store_name": "A", "revenue": 1.0}], "columns": COLUMNS, "row_count": 1}}
+    service.remember("s", "revenue by store", "SELECT 1", result)
+    return service, converter
+
+
+def test_new_question_does_not_call_the_llm():
+    service, converter = _service()
+    assert service.answer("s", "How many staff are active?") is None
+    assert converter.calls == 0
+
+
+def test_refine_flag_overrides_the_wording_check():
+    service, converter = _service()
+    assert service.answer("s", "How many staff are active?", refine=True) is not None
+    assert service.answer("s", "only 2018", refine=False) is None
+    assert converter.calls == 1
+
+
+def test_session_does_not_answer_for_another_database():
+    converter = _Converter()
+    service = FollowUpService(converter)
+    result = {"status": "success", "data": {"records": [{"store_name": "A", "revenue": 1.0}], "columns": COLUMNS, "row_count": 1}}
+    service.remember("s", "revenue by store", "SELECT 1", result, "east")
+    assert service.answer("s", "only 2018", database="west") is None
+    assert converter.calls == 0
+    assert service.answer("s", "only 2018", database="east") is not None
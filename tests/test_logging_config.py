@@ -0,0 +1,33 @@
+import json
+import queue
+import logging
+from app.logging_config import JsonFormatter, TEXT_FORMAT, _NonBlockingQueueHandler
+
+
+def _queued_error_record():
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("tests.logging_config")
+    logger.propagate = False
+    handler = _NonBlockingQueueHandler(log_queue)
+    logger.addHandler(handler)
+    try:
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("Query %s failed", 7)
+    finally:
+        logger.removeHandler(handler)
+    return log_queue.get_nowait()
+
+
+# The traceback survives the queue as its own field instead of being folded into the message
+def test_json_formatter_keeps_the_traceback_separate():
+    entry = json.loads(JsonFormatter().format(_queued_error_record()))
+    assert entry["message"] == "Query 7 failed"
+    assert "Traceback" in entry["exc_info"] and "ValueError: boom" in entry["exc_info"]
+
+
+def test_text_formatter_appends_the_traceback():
+    text = logging.Formatter(TEXT_FORMAT).format(_queued_error_record())
+    assert text.splitlines()[0].endswith("Query 7 failed")
+    assert "ValueError: boom" in text
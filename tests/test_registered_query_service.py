@@ -0,0 +1,95 @@
+import json
+from decimal import Decimal
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+from app.services.registered_query_service import (
+    _fetch_frame, _json_value, _load_json, _output_columns, _to_records, advance_partials, merge_partials,
+    plan_incremental_refresh, present_result,
+)
+
+SQL_QUERY = (
+    "SELECT o.store_id, COUNT(*) AS orders, MAX(o.order_status) AS max_status "
+    "FROM sales_orders o GROUP BY o.store_id ORDER BY o.store_id"
+)
+
+
+@pytest.fixture
+def connection():
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        connection.execute(text(
+            "CREATE TABLE sales_orders (order_id INTEGER, order_date TEXT, store_id INTEGER, order_status INTEGER)"
+        ))
+        yield connection
+
+
+def _insert(connection, rows):
+    connection.execute(
+        text("INSERT INTO sales_orders VALUES (:order_id, :order_date, :store_id, :order_status)"),
+        [dict(zip(("order_id", "order_date", "store_id", "order_status"), row)) for row in rows],
+    )
+
+
+# Runs one refresh the way RegisteredQueryService.refresh() does and returns the new stored state
+def _refresh(connection, plan, stored=None):
+    watermark = connection.execute(text("SELECT MAX(order_date) FROM sales_orders")).scalar()
+    stored_watermark, settled = stored or (None, None)
+    settled, merged, _ = advance_partials(
+        plan, lambda sql, parameters: _fetch_frame(connection, sql, parameters), watermark, stored_watermark, settled
+    )
+    return (watermark, settled), merged
+
+
+def _full_result(connection):
+    return _to_records(_fetch_frame(connection, SQL_QUERY))
+
+
+# Orders added after a refresh with the same date as the watermark must still be counted
+def test_rows_at_a_non_unique_watermark_are_merged(connection):
+    plan = plan_incremental_refresh(SQL_QUERY, "order_date")
+    assert "reason" not in plan
+
+    _insert(connection, [(1, "2018-01-01", 1, 4), (2, "2018-01-02", 1, 4), (3, "2018-01-02", 2, 1)])
+    stored, merged = _refresh(connection, plan)
+    assert present_result(plan, merged, ["store_id", "orders", "max_status"]) == _full_result(connection)
+
+    # Same-day orders arrive after the refresh
+    _insert(connection, [(4, "2018-01-02", 2, 3), (5, "2018-01-02", 3, 2)])
+    stored, merged = _refresh(connection, plan, stored)
+    assert present_result(plan, merged, ["store_id", "orders", "max_status"]) == _full_result(connection)
+
+    # A later day moves the watermark; the old boundary day becomes settled
+    _insert(connection, [(6, "2018-01-02", 1, 1), (7, "2018-01-03", 3, 4)])
+    stored, merged = _refresh(connection, plan, stored)
+    assert stored[0] == "2018-01-03"
+    assert present_result(plan, merged, ["store_id", "orders", "max_status"]) == _full_result(connection)
+
+    # A refresh without new rows leaves the result unchanged
+    _, again = _refresh(connection, plan, stored)
+    assert _to_records(again) == _to_records(merged)
+
+
+# Generated SQL usually ends in a semicolon, which is invalid inside the wrapping subquery
+def test_output_columns_ignore_the_terminator(connection):
+    assert _output_columns(connection, SQL_QUERY + " ;\n") == ["store_id", "orders", "max_status"]
+    assert _output_columns(connection, SQL_QUERY + "; -- dashboard") == ["store_id", "orders", "max_status"]
+
+
+# NUMERIC partial sums survive storage as Decimals, so repeated refreshes never drift from the exact total
+def test_numeric_sums_stay_exact_across_refreshes():
+    plan = plan_incremental_refresh(
+        "SELECT o.store_id, SUM(o.amount) AS total, AVG(o.amount) AS average FROM sales_orders o GROUP BY o.store_id"
+    )
+    state = None
+    for _ in range(1000):
+        delta = pd.DataFrame(
+            _load_json(json.dumps([{"_k0": 1, "_a1_sum": Decimal("0.10"), "_a2_sum": Decimal("0.10"), "_a2_count": 1}],
+                                  default=_json_value)),
+            columns=plan["state_columns"],
+        )
+        merged = merge_partials(plan, state, delta)
+        state = pd.DataFrame(_load_json(json.dumps(_to_records(merged), default=_json_value)), columns=plan["state_columns"])
+    [record] = present_result(plan, state, ["store_id", "total", "average"])
+    assert record["total"] == Decimal("100.00")
+    assert record["average"] == Decimal("0.1")
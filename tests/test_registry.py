@@ -0,0 +1,31 @@
+import pytest
+from app.database import connection as connection_module
+from app.database.registry import DatabaseRegistry, InvalidDatabaseKey
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(connection_module, "EMBEDDED_AUTOLOAD", False)
+    registry = DatabaseRegistry()
+    registry.urls = {"east": f"sqlite:///{tmp_path / 'east.sqlite'}", "west": f"sqlite:///{tmp_path / 'west.sqlite'}"}
+    return registry
+
+
+def test_non_string_key_is_rejected(registry):
+    with pytest.raises(InvalidDatabaseKey):
+        registry.get(5)
+    with pytest.raises(KeyError):
+        registry.get("north")
+
+
+# A request still holding an evicted target must not rebuild resources on it that nobody would dispose
+def test_closed_target_resolves_through_the_registry(registry):
+    target = registry.get("east")
+    first = target.connection
+    target.close()
+    assert target.status()["loaded"] == []
+
+    replacement = target.connection
+    assert replacement is not first
+    assert target.status()["loaded"] == []
+    assert registry.get("east").connection is replacement
@@ -0,0 +1,34 @@
+import json
+import datetime
+from decimal import Decimal
+import pandas as pd
+from app.database.result_encoding import build_dataframe_from_values, result_to_json
+
+
+def _result(records):
+    return {"status": "success", "message": "ok", "data": {"records": records, "columns": list(records.columns), "row_count": len(records)}}
+
+
+# The records DataFrame is encoded column by column and spliced into the rest of the result
+def test_records_frame_is_encoded_in_place():
+    frame = build_dataframe_from_values(
+        ["store_id", "revenue", "order_date", "note"],
+        [(1, Decimal("599.99"), datetime.date(2016, 1, 1), None), (2, None, None, 'say "hi"')],
+    )
+    decoded = json.loads(result_to_json(_result(frame)))
+    assert decoded["data"]["records"] == [
+        {"store_id": 1, "revenue": 599.99, "order_date": "2016-01-01", "note": None},
+        {"store_id": 2, "revenue": None, "order_date": None, "note": 'say "hi"'},
+    ]
+    assert decoded["data"]["row_count"] == 2
+    assert decoded["message"] == "ok"
+
+
+def test_duplicate_column_names_collapse_like_a_dict():
+    frame = pd.DataFrame([(1, 2)], columns=["count", "count"])
+    assert json.loads(result_to_json(_result(frame)))["data"]["records"] == [{"count": 2}]
+
+
+def test_results_without_a_frame_are_dumped_as_is():
+    result = {"status": "error", "message": "Error executing query", "data": None}
+    assert json.loads(result_to_json(result)) == result
@@ -0,0 +1,82 @@
+import pytest
+from app.services.rollup_service import plan_rollup_rewrite
+
+REVENUE_QUERY = "SELECT SUM(i.quantity * i.list_price * (1 - i.discount)) AS revenue FROM sales_order_items i"
+
+
+# The exact revenue expression is answered from the revenue measure, in any factor order
+@pytest.mark.parametrize("expression", [
+    "i.quantity * i.list_price * (1 - i.discount)",
+    "(1 - i.discount) * i.list_price * i.quantity",
+    "i.list_price * (i.quantity * (1 - i.discount))",
+])
+def test_revenue_expression_is_rewritten(expression):
+    plan = plan_rollup_rewrite(f"SELECT SUM({expression}) AS revenue FROM sales_order_items i")
+    assert plan is not None
+    assert "sum(rollup_src.revenue)" in plan[0]
+
+
+# Without the parentheses the subtraction binds differently, so the revenue measure does not apply
+@pytest.mark.parametrize("expression", [
+    "1 - i.discount * i.list_price * i.quantity",
+    "i.list_price * i.quantity * 1 - i.discount",
+    "i.list_price * (i.quantity * 1 - i.discount)",
+])
+def test_unparenthesized_subtraction_is_not_rewritten(expression):
+    assert plan_rollup_rewrite(f"SELECT SUM({expression}) AS revenue FROM sales_order_items i") is None
+
+
+def test_gross_revenue_is_rewritten():
+    plan = plan_rollup_rewrite("SELECT SUM(i.list_price * i.quantity) FROM sales_order_items i")
+    assert plan is not None
+    assert "sum(rollup_src.gross_revenue)" in plan[0]
+
+
+# Malformed generated SQL falls through to the database instead of raising
+@pytest.mark.parametrize("sql_query", [
+    "SELECT FROM sales_orders",
+    "SELECT , COUNT(*) FROM sales_orders",
+    "SELECT COUNT( FROM sales_orders",
+])
+def test_malformed_query_is_not_rewritten(sql_query):
+    assert plan_rollup_rewrite(sql_query) is None
+
+
+def test_group_by_is_rewritten():
+    plan = plan_rollup_rewrite("SELECT o.store_id, COUNT(*) FROM sales_orders o GROUP BY o.store_id")
+    assert plan == (
+        "select rollup_src.store_id, coalesce(sum(rollup_src.order_count), 0)::bigint as count "
+        "from rollup_sales_store_month rollup_src group by rollup_src.store_id",
+        "rollup_sales_store_month",
+    )
+
+
+# Dimension tables are joined back onto the rollup, and item-less orders are excluded from item sums
+def test_join_is_rewritten():
+    plan = plan_rollup_rewrite(
+        "SELECT s.store_name, SUM(oi.quantity) AS units FROM sales_orders o "
+        "JOIN sales_order_items oi ON o.order_id = oi.order_id JOIN sales_stores s ON s.store_id = o.store_id "
+        "GROUP BY s.store_name ORDER BY units DESC"
+    )
+    assert plan is not None
+    assert "join sales_stores s on s.store_id = rollup_src.store_id" in plan[0]
+    assert "where rollup_src.item_count > 0" in plan[0]
+    assert "sum(rollup_src.units)" in plan[0]
+
+
+def test_join_on_other_columns_is_not_rewritten():
+    assert plan_rollup_rewrite(
+        "SELECT SUM(oi.quantity) FROM sales_orders o JOIN sales_order_items oi ON o.store_id = oi.item_id"
+    ) is None
+
+
+# Window aggregates keep one row per base row, and FILTER conditions need the base columns
+@pytest.mark.parametrize("sql_query", [
+    "SELECT o.store_id, SUM(oi.quantity) OVER (PARTITION BY o.store_id) FROM sales_orders o "
+    "JOIN sales_order_items oi ON o.order_id = oi.order_id",
+    "SELECT COUNT(*) OVER () FROM sales_orders o",
+    "SELECT SUM(oi.quantity) FILTER (WHERE oi.discount > 0) FROM sales_order_items oi",
+    "SELECT o.store_id, COUNT(*) FILTER (WHERE o.order_status = 4) FROM sales_orders o GROUP BY o.store_id",
+])
+def test_window_and_filter_aggregates_are_not_rewritten(sql_query):
+    assert plan_rollup_rewrite(sql_query) is None
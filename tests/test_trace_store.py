@@ -0,0 +1,27 @@
+from app.services.trace_store import TraceStore
+
+
+# A trace recorded by one worker can be fetched through another worker's store
+def test_trace_is_visible_to_other_processes(tmp_path):
+    first, second = TraceStore(str(tmp_path)), TraceStore(str(tmp_path))
+    trace_id = first.add("How many stores?", [{"tool": "sql_db_query", "duration_ms": 1.5}])
+    assert second.get(trace_id)["steps"] == [{"tool": "sql_db_query", "duration_ms": 1.5}]
+
+
+def test_oldest_traces_are_evicted(tmp_path):
+    store = TraceStore(str(tmp_path), max_traces=2)
+    for number in range(3):
+        store.add(f"question {number}", [])
+    assert len(list(tmp_path.glob("*.json"))) == 2
+
+
+def test_unknown_or_malformed_ids_are_not_found(tmp_path):
+    store = TraceStore(str(tmp_path))
+    assert store.get("0" * 32) is None
+    assert store.get("../examples") is None
+
+
+def test_traces_stay_in_memory_without_a_directory():
+    store = TraceStore(directory="")
+    trace_id = store.add("How many stores?", [])
+    assert store.get(trace_id)["question"] == "How many stores?"
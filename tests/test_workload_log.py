@@ -0,0 +1,29 @@
+from app.services.workload_log import WorkloadLog, read_workload
+from app.services.workload_replay import WorkloadReplayer
+
+
+# Two workers appending large entries to one file never produce torn lines
+def test_writers_sharing_a_file_keep_lines_intact(tmp_path):
+    path = str(tmp_path / "workload.jsonl")
+    logs = [WorkloadLog(path=path, enabled=True) for _ in range(2)]
+    for number in range(200):
+        for worker, log in enumerate(logs):
+            log.record("/execute", None, f"SELECT {'x' * 20000} -- {worker}/{number}", "success", 1, total_ms=1.0)
+    for log in logs:
+        log.close()
+    assert len(read_workload(path)) == 400
+
+
+def test_malformed_lines_are_skipped(tmp_path):
+    path = tmp_path / "workload.jsonl"
+    path.write_text('{"route": "/query", "ts": 1}\n{"route": "/que\n{"route": "/execute", "ts": 2}\n', encoding="utf-8")
+    assert [entry["route"] for entry in read_workload(str(path))] == ["/query", "/execute"]
+
+
+# Entries are logged when they complete but replayed in the order they arrived
+def test_replay_follows_arrival_order():
+    replayer = WorkloadReplayer(target="api", workers=1)
+    replayed = []
+    replayer._replay_entry = lambda entry: replayed.append(entry["sql"]) or (1.0, True)
+    replayer.replay([{"sql": "slow", "ts": 1.0}, {"sql": "fast", "ts": 2.0}, {"sql": "first", "ts": 0.5}], speed=0)
+    assert replayed == ["first", "slow", "fast"]
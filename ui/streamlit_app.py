@@ -43,6 +43,40 @@ st.markdown("""
 # API endpoint URL
 API_URL = "http://localhost:5000/api"
 
+# Displays one query result: the SQL, any notes about how it was answered, and the records
+def show_result(result, index=0):
+    # Display the SQL query
+    st.subheader("Generated SQL Query")
+    st.code(result["sql_query"], language="sql")
+    
+    # Display the results
+    st.subheader("Query Results")
+    
+    data = result.get("data") or {}
+    if data.get("answered_from"):
+        st.info("Answered from the previous result without querying the database.")
+    if data.get("approximate"):
+        approximate = data["approximate"]
+        st.info(f"Estimate from a {approximate['sample_percent']:g}% sample; *_error columns give the "
+                f"{approximate['confidence']:.0%} error bound. The exact result follows.")
+    
+    if result["status"] == "success" and data.get("records"):
+        # Convert to DataFrame and display
+        df = pd.DataFrame(data["records"])
+        st.dataframe(df, use_container_width=True)
+        
+        # Download option
+        csv = df.to_csv(index=False).encode('utf-8')
+        st.download_button(
+            label="Download results as CSV",
+            data=csv,
+            file_name="query_results.csv",
+            mime="text/csv",
+            key=f'download-csv-{index}'
+        )
+    else:
+        st.info(result["message"])
+
 def main():
     st.title("Natural Language to SQL Converter")
     st.markdown("Enter your query in natural language")
@@ -53,9 +87,19 @@ def main():
                            key="nl_query",
                            placeholder="What are the top 5 most selling product?.")
     
+    # Database the query is routed to (blank for the default BikeStores database)
+    database = st.sidebar.text_input("Database", value="", help="Key of a configured regional database")
+    
+    # Show a sampled estimate first for aggregate questions over large tables
+    approximate = st.sidebar.checkbox("Fast approximate answer", help="Estimate from a sample, then show the exact result")
+    
     # Execute button
     execute_clicked = st.button("Execute Query")
     
+    # Start a new conversation so the next question goes to the database
+    if st.button("New Conversation"):
+        st.session_state.pop("session_id", None)
+    
     # Handle button clicks
     if execute_clicked:
         if nl_query:
@@ -63,35 +107,28 @@ def main():
                 # Call API to process the query
                 response = requests.post(
                     f"{API_URL}/query",
-                    json={"query": nl_query}
+                    json={
+                        "query": nl_query,
+                        "session_id": st.session_state.get("session_id"),
+                        "database": database or None,
+                        "approximate": approximate,
+                        "stream_exact": approximate
+                    },
+                    stream=approximate
                 )
                 
                 if response.status_code == 200:
-                    result = response.json()
-                    
-                    # Display the SQL query
-                    st.subheader("Generated SQL Query")
-                    st.code(result["sql_query"], language="sql")
-                    
-                    # Display the results
-                    st.subheader("Query Results")
-                    
-                    if result["status"] == "success" and result["data"] and result["data"]["records"]:
-                        # Convert to DataFrame and display
-                        df = pd.DataFrame(result["data"]["records"])
-                        st.dataframe(df, use_container_width=True)
-                        
-                        # Download option
-                        csv = df.to_csv(index=False).encode('utf-8')
-                        st.download_button(
-                            label="Download results as CSV",
-                            data=csv,
-                            file_name="query_results.csv",
-                            mime="text/csv",
-                            key='download-csv'
-                        )
+                    # Approximate answers are streamed first, followed by the exact result
+                    if response.headers.get("Content-Type", "").startswith("application/x-ndjson"):
+                        results = (json.loads(line) for line in response.iter_lines() if line)
                     else:
-                        st.info(result["message"])
+                        results = [response.json()]
+                    
+                    results_area = st.empty()
+                    for index, result in enumerate(results):
+                        st.session_state["session_id"] = result.get("session_id")
+                        with results_area.container():
+                            show_result(result, index)
                 else:
                     st.error(f"Error: {response.status_code} - {response.text}")
         else: